@@ -1,17 +1,70 @@
+import argparse
 import asyncio
+import os
 import random
+import threading
 
 from flask import Flask, jsonify
 
 app = Flask(__name__)
 
+# Every knob can be set through the environment (for docker-compose) or on
+# the command line (for local benchmark runs). The defaults reproduce the
+# original stand-in: a fixed one second call failing 10% of the time.
+CONFIG = {
+    # fixed, uniform, exponential or lognormal.
+    "LATENCY_DISTRIBUTION": os.getenv(
+        "PROVIDER_LATENCY_DISTRIBUTION", "fixed"
+    ),
+    # Mean latency in seconds; for lognormal, the median.
+    "LATENCY": float(os.getenv("PROVIDER_LATENCY", "1")),
+    # uniform: half-width of the range; lognormal: sigma of the log.
+    "LATENCY_SPREAD": float(os.getenv("PROVIDER_LATENCY_SPREAD", "0.5")),
+    # Upper bound on any single call, so a long tail can't hang a client.
+    "LATENCY_MAX": float(os.getenv("PROVIDER_LATENCY_MAX", "30")),
+    "ERROR_RATE": float(os.getenv("PROVIDER_ERROR_RATE", "0.1")),
+    # Calls served at once; further calls fail straight away with a 503.
+    # 0 means no cap.
+    "MAX_CONCURRENCY": int(os.getenv("PROVIDER_MAX_CONCURRENCY", "0")),
+}
 
-ERROR_RATE = 0.1
+_in_flight = threading.Lock()
+_active = 0
+
+
+def latency() -> float:
+    mean = CONFIG["LATENCY"]
+    spread = CONFIG["LATENCY_SPREAD"]
+    distribution = CONFIG["LATENCY_DISTRIBUTION"]
+    if distribution == "uniform":
+        value = random.uniform(mean - spread, mean + spread)
+    elif distribution == "exponential":
+        value = random.expovariate(1 / mean) if mean > 0 else 0
+    elif distribution == "lognormal":
+        value = mean * random.lognormvariate(0, spread)
+    else:
+        value = mean
+    return min(max(value, 0), CONFIG["LATENCY_MAX"])
+
+
+def _enter() -> bool:
+    global _active
+    with _in_flight:
+        if CONFIG["MAX_CONCURRENCY"] and _active >= CONFIG["MAX_CONCURRENCY"]:
+            return False
+        _active += 1
+        return True
+
+
+def _exit() -> None:
+    global _active
+    with _in_flight:
+        _active -= 1
 
 
 async def random_status():
-    await asyncio.sleep(1)
-    if random.random() < ERROR_RATE:
+    await asyncio.sleep(latency())
+    if random.random() < CONFIG["ERROR_RATE"]:
         return {"data": "failed", "status": 503}
 
     return {"data": "success", "status": 200}
@@ -19,9 +72,44 @@ async def random_status():
 
 @app.route("/", methods=["POST"])
 async def simple_request():
-    data = await random_status()
+    if not _enter():
+        return jsonify({"data": "overloaded", "status": 503})
+    try:
+        data = await random_status()
+    finally:
+        _exit()
     return jsonify(data)
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8010)
+    parser = argparse.ArgumentParser(description="Fake payment provider.")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument(
+        "--latency-distribution",
+        choices=("fixed", "uniform", "exponential", "lognormal"),
+        default=CONFIG["LATENCY_DISTRIBUTION"],
+    )
+    parser.add_argument("--latency", type=float, default=CONFIG["LATENCY"])
+    parser.add_argument(
+        "--latency-spread", type=float, default=CONFIG["LATENCY_SPREAD"]
+    )
+    parser.add_argument(
+        "--latency-max", type=float, default=CONFIG["LATENCY_MAX"]
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=CONFIG["ERROR_RATE"]
+    )
+    parser.add_argument(
+        "--max-concurrency", type=int, default=CONFIG["MAX_CONCURRENCY"]
+    )
+    args = parser.parse_args()
+    CONFIG.update(
+        LATENCY_DISTRIBUTION=args.latency_distribution,
+        LATENCY=args.latency,
+        LATENCY_SPREAD=args.latency_spread,
+        LATENCY_MAX=args.latency_max,
+        ERROR_RATE=args.error_rate,
+        MAX_CONCURRENCY=args.max_concurrency,
+    )
+
+    app.run(host="0.0.0.0", port=args.port, threaded=True)
@@ -42,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "wallets.middleware.MetricsMiddleware",
+    "wallets.middleware.PrimaryPinMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -75,17 +77,70 @@ WSGI_APPLICATION = "wallet.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+DATABASE_POOL = {
+    # off: a connection per request or task.
+    # persistent: each thread keeps its connection for CONN_MAX_AGE seconds
+    # and checks it is alive before reusing it; suits WSGI and Celery.
+    # pool: threads share an in-process pool of MAX_SIZE connections; suits
+    # servers that start a thread per request, such as runserver. Under
+    # ASGI, Django 3.2 runs all sync code on one long-lived thread per
+    # process, so persistent suits it as well.
+    # pgbouncer: persistent connections to a pgbouncer in transaction
+    # pooling mode, without server-side cursors, which it can't route.
+    "MODE": os.getenv("DATABASE_POOL_MODE", "persistent"),
+    "CONN_MAX_AGE": int(os.getenv("DATABASE_CONN_MAX_AGE", "60")),
+    "MAX_SIZE": int(os.getenv("DATABASE_POOL_MAX_SIZE", "20")),
+    # Seconds to wait for a pooled connection before failing the request.
+    "TIMEOUT": float(os.getenv("DATABASE_POOL_TIMEOUT", "10")),
+    # Seconds a pooled connection may sit idle before it is closed.
+    "MAX_IDLE": float(os.getenv("DATABASE_POOL_MAX_IDLE", "300")),
+}
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql_psycopg2",
+        "ENGINE": "wallets.db.postgresql",
         "NAME": os.getenv("DATABASE_NAME", "wallet"),
         "USER": os.getenv("DATABASE_USER", "user"),
         "PASSWORD": os.getenv("DATABASE_PASSWORD", "password"),
         "HOST": os.getenv("DATABASE_HOST", "localhost"),
         "PORT": os.getenv("DATABASE_PORT", "5432"),
+        "CONN_MAX_AGE": (
+            DATABASE_POOL["CONN_MAX_AGE"]
+            if DATABASE_POOL["MODE"] in ("persistent", "pgbouncer")
+            else 0
+        ),
+        "CONN_HEALTH_CHECKS": DATABASE_POOL["MODE"] != "off",
+        "DISABLE_SERVER_SIDE_CURSORS": DATABASE_POOL["MODE"] == "pgbouncer",
     }
 }
 
+if DATABASE_POOL["MODE"] == "pool":
+    DATABASES["default"]["POOL"] = {
+        key: DATABASE_POOL[key] for key in ("MAX_SIZE", "TIMEOUT", "MAX_IDLE")
+    }
+
+# Streaming replicas of default, as comma separated host[:port] entries.
+# Only the views and commands that opt in read from them.
+for number, replica in enumerate(
+    filter(None, os.getenv("DATABASE_REPLICA_HOSTS", "").split(",")), 1
+):
+    host, _, port = replica.strip().partition(":")
+    DATABASES[f"replica{number}"] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["wallets.routers.ReplicaRouter"]
+
+READ_REPLICAS = {
+    # Seconds a client reads from the primary after it wrote; longer than
+    # the replicas usually lag.
+    "STICKY_SECONDS": int(os.getenv("READ_REPLICAS_STICKY_SECONDS", "5")),
+    "COOKIE_NAME": os.getenv("READ_REPLICAS_COOKIE_NAME", "use_primary"),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -115,6 +170,30 @@ CACHES = {
     }
 }
 
+BALANCE_CACHE = {
+    # Seconds a cached balance version is kept in Redis.
+    "TIMEOUT": int(os.getenv("BALANCE_CACHE_TIMEOUT", "86400")),
+    # How long a miss may hold the rebuild lock before others retry.
+    "LOCK_TIMEOUT": float(os.getenv("BALANCE_CACHE_LOCK_TIMEOUT", "2")),
+    # Per-process copies of the most recently read balances.
+    "LOCAL_MAX_ENTRIES": int(
+        os.getenv("BALANCE_CACHE_LOCAL_MAX_ENTRIES", "10000")
+    ),
+}
+
+IDEMPOTENCY = {
+    # Seconds a stored response is kept in Redis; the database copy is
+    # removed by the purge_idempotency_keys command.
+    "RESPONSE_TIMEOUT": int(
+        os.getenv("IDEMPOTENCY_RESPONSE_TIMEOUT", "86400")
+    ),
+    # Upper bound on how long the first request may hold a key; a key
+    # still unfinished after this is taken over by the next request.
+    "LOCK_TIMEOUT": int(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", "60")),
+    # How long a concurrent duplicate waits for the first request.
+    "WAIT_TIMEOUT": float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", "10")),
+}
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
 
@@ -131,44 +210,61 @@ LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs")
 if not os.path.exists(LOG_DIR):
     os.makedirs(LOG_DIR)
 
+# Loggers hand records to the write_behind handler, which queues them for a
+# listener thread that does the formatting and writing. Every process
+# appends JSON events to one shared file under LOG_DIR; rotate it with
+# logrotate or similar, and each process reopens it once it has been moved.
+# In containers, LOG_CONSOLE_FORMAT=json sends the same events to stdout.
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
     "formatters": {
-        "detailed": {
-            "format": "{asctime} {levelname} {message} {name}",
-            "style": "{",
+        "json": {
+            "()": "wallets.log.JsonFormatter",
         },
         "simple": {
             "format": "{levelname} {message}",
             "style": "{",
         },
     },
+    "filters": {
+        # Fraction of high-volume success events kept, e.g. provider calls
+        # that went through. Warnings and errors are never sampled.
+        "sample_successes": {
+            "()": "wallets.log.SuccessSampler",
+            "rate": float(os.getenv("LOG_SUCCESS_SAMPLE_RATE", "1")),
+        },
+    },
     "handlers": {
         "console": {
             "class": "logging.StreamHandler",
-            "formatter": "simple",
+            # simple or json.
+            "formatter": os.getenv("LOG_CONSOLE_FORMAT", "simple"),
         },
         "file": {
-            "class": "logging.FileHandler",
-            "filename": os.path.join(
-                os.path.dirname(os.path.dirname(__file__)),
-                "logs",
-                "django.log",
-            ),
-            "formatter": "detailed",
+            "class": "logging.handlers.WatchedFileHandler",
+            "filename": os.path.join(LOG_DIR, "wallets.log"),
+            "delay": True,
+            "formatter": "json",
+        },
+        "write_behind": {
+            "class": "wallets.log.WriteBehindHandler",
+            "handlers": ["cfg://handlers.console", "cfg://handlers.file"],
+            # Records held before new ones are dropped.
+            "queue_size": int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+            "filters": ["sample_successes"],
         },
     },
     "loggers": {
         "django": {
-            "handlers": ["console", "file"],
+            "handlers": ["write_behind"],
             "level": "INFO",
             "propagate": True,
         },
-        "wallets": {  # Assuming 'wallets' is the name of your Django app
-            "handlers": ["console", "file"],
-            "level": "DEBUG",
-            "propagate": False,  # Prevents log messages from being propagated to the root logger
+        "wallets": {
+            "handlers": ["write_behind"],
+            "level": os.getenv("LOG_LEVEL", "INFO"),
+            "propagate": False,
         },
     },
 }
@@ -195,3 +291,160 @@ REDIS_DB = os.getenv("REDIS_DB", "0")
 
 CELERY_BROKER_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}"
 CELERY_RESULT_BACKEND = f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}"
+
+WITHDRAWAL_SETTLEMENT = {
+    # Due withdrawals claimed and debited per batch.
+    "CHUNK_SIZE": int(os.getenv("WITHDRAWAL_SETTLEMENT_CHUNK_SIZE", "100")),
+    # Seconds between polls for due withdrawals (settle_withdrawals command).
+    "INTERVAL": float(os.getenv("WITHDRAWAL_SETTLEMENT_INTERVAL", "5")),
+    # The beat poller looks this many seconds ahead and queues one
+    # settlement message per due second, so the broker only ever holds the
+    # next window rather than every future withdrawal.
+    "DISPATCH_WINDOW": float(
+        os.getenv("WITHDRAWAL_SETTLEMENT_DISPATCH_WINDOW", "60")
+    ),
+}
+
+BULK_OPERATIONS = {
+    # Largest batch accepted by the bulk endpoints.
+    "MAX_ITEMS": int(os.getenv("BULK_OPERATIONS_MAX_ITEMS", "10000")),
+    # Items validated and written per database transaction.
+    "CHUNK_SIZE": int(os.getenv("BULK_OPERATIONS_CHUNK_SIZE", "500")),
+}
+
+LEDGER = {
+    # Seconds between balance snapshots; balances are read as the latest
+    # snapshot plus the ledger entries posted after it.
+    "SNAPSHOT_INTERVAL": float(os.getenv("LEDGER_SNAPSHOT_INTERVAL", "3600")),
+    # Wallets locked and snapshotted per database transaction.
+    "SNAPSHOT_CHUNK_SIZE": int(os.getenv("LEDGER_SNAPSHOT_CHUNK_SIZE", "500")),
+}
+
+OUTBOX = {
+    # Messages claimed per batch and provider calls a batch has in flight
+    # at once; calls are async, so this is not a thread count.
+    "BATCH_SIZE": int(os.getenv("OUTBOX_BATCH_SIZE", "100")),
+    "CONCURRENCY": int(os.getenv("OUTBOX_CONCURRENCY", "100")),
+    # Calls made for a message before it is dead-lettered.
+    "MAX_ATTEMPTS": int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8")),
+    # Retry n waits about BACKOFF_BASE * 2**n seconds, capped at
+    # BACKOFF_MAX, with jitter.
+    "BACKOFF_BASE": float(os.getenv("OUTBOX_BACKOFF_BASE", "2")),
+    "BACKOFF_MAX": float(os.getenv("OUTBOX_BACKOFF_MAX", "600")),
+    # Seconds a claimed message stays hidden from other dispatchers; longer
+    # than a provider call can take.
+    "LEASE_TIMEOUT": float(os.getenv("OUTBOX_LEASE_TIMEOUT", "30")),
+    # Seconds between beat sweeps for messages due a retry.
+    "POLL_INTERVAL": float(os.getenv("OUTBOX_POLL_INTERVAL", "5")),
+}
+
+ADMIN = {
+    # Days of transactions a changelist shows until a date is picked from
+    # the date hierarchy; 0 shows everything.
+    "DEFAULT_WINDOW_DAYS": int(os.getenv("ADMIN_DEFAULT_WINDOW_DAYS", "7")),
+    # Filtered changelists are counted exactly up to this many rows.
+    "COUNT_LIMIT": int(os.getenv("ADMIN_COUNT_LIMIT", "10000")),
+}
+
+TRANSACTION_PARTITIONS = {
+    # Monthly partitions of Transaction created ahead of time; an insert
+    # into a month without one fails.
+    "MONTHS_AHEAD": int(os.getenv("TRANSACTION_PARTITIONS_MONTHS_AHEAD", "3")),
+    # Seconds between beat runs that create the upcoming partitions.
+    "CREATE_INTERVAL": float(
+        os.getenv("TRANSACTION_PARTITIONS_CREATE_INTERVAL", "3600")
+    ),
+    # Months kept attached besides the current one; older partitions are
+    # archived by archive_transaction_partitions. Fewer attached partitions
+    # mean fewer index probes for lookups by id or uuid.
+    "RETAIN_MONTHS": int(
+        os.getenv("TRANSACTION_PARTITIONS_RETAIN_MONTHS", "12")
+    ),
+    "ARCHIVE_DIR": os.getenv(
+        "TRANSACTION_PARTITIONS_ARCHIVE_DIR",
+        os.path.join(os.path.dirname(os.path.dirname(__file__)), "archive"),
+    ),
+}
+
+CELERY_BEAT_SCHEDULE = {
+    "dispatch-due-withdrawals": {
+        "task": "wallets.tasks.dispatch_withdrawals.dispatch_withdrawals",
+        "schedule": WITHDRAWAL_SETTLEMENT["DISPATCH_WINDOW"],
+    },
+    "snapshot-balances": {
+        "task": "wallets.tasks.snapshot_balances.snapshot_balances",
+        "schedule": LEDGER["SNAPSHOT_INTERVAL"],
+    },
+    "deliver-outbox": {
+        "task": "wallets.tasks.deliver_outbox.deliver_outbox",
+        "schedule": OUTBOX["POLL_INTERVAL"],
+    },
+    "create-transaction-partitions": {
+        "task": "wallets.tasks.create_transaction_partitions."
+        "create_transaction_partitions",
+        "schedule": TRANSACTION_PARTITIONS["CREATE_INTERVAL"],
+    },
+}
+
+THIRD_PARTY_SERVICE = {
+    "URL": os.getenv(
+        "THIRD_PARTY_SERVICE_URL", "http://third_party_service:8010"
+    ),
+    "TIMEOUT": float(os.getenv("THIRD_PARTY_SERVICE_TIMEOUT", "10")),
+    "CONNECT_TIMEOUT": float(
+        os.getenv("THIRD_PARTY_SERVICE_CONNECT_TIMEOUT", "3")
+    ),
+    # Sync client (requests): number of per-host pools kept and the
+    # keep-alive connections held in each of them.
+    "POOL_CONNECTIONS": int(
+        os.getenv("THIRD_PARTY_SERVICE_POOL_CONNECTIONS", "4")
+    ),
+    "POOL_MAXSIZE": int(os.getenv("THIRD_PARTY_SERVICE_POOL_MAXSIZE", "50")),
+    # Async client (httpx): in-flight and idle keep-alive connection caps.
+    "MAX_CONNECTIONS": int(
+        os.getenv("THIRD_PARTY_SERVICE_MAX_CONNECTIONS", "500")
+    ),
+    "MAX_KEEPALIVE_CONNECTIONS": int(
+        os.getenv("THIRD_PARTY_SERVICE_MAX_KEEPALIVE_CONNECTIONS", "100")
+    ),
+}
+
+PROVIDER_CIRCUIT_BREAKER = {
+    # The breaker opens once at least MIN_CALLS calls over the last two
+    # WINDOW-second buckets have failed at FAILURE_RATE or worse, then
+    # rejects calls for RESET_TIMEOUT seconds before letting a probe
+    # through.
+    "FAILURE_RATE": float(
+        os.getenv("PROVIDER_CIRCUIT_BREAKER_FAILURE_RATE", "0.5")
+    ),
+    "MIN_CALLS": int(os.getenv("PROVIDER_CIRCUIT_BREAKER_MIN_CALLS", "20")),
+    "WINDOW": float(os.getenv("PROVIDER_CIRCUIT_BREAKER_WINDOW", "10")),
+    "RESET_TIMEOUT": float(
+        os.getenv("PROVIDER_CIRCUIT_BREAKER_RESET_TIMEOUT", "30")
+    ),
+}
+
+PROVIDER_CONCURRENCY_LIMIT = {
+    # Limit on concurrent provider calls across all processes. It grows by
+    # one per limit's worth of healthy calls and is cut by DECREASE_FACTOR
+    # on a failed or slow call.
+    "INITIAL_LIMIT": int(
+        os.getenv("PROVIDER_CONCURRENCY_LIMIT_INITIAL", "50")
+    ),
+    "MIN_LIMIT": int(os.getenv("PROVIDER_CONCURRENCY_LIMIT_MIN", "2")),
+    "MAX_LIMIT": int(os.getenv("PROVIDER_CONCURRENCY_LIMIT_MAX", "500")),
+    "DECREASE_FACTOR": float(
+        os.getenv("PROVIDER_CONCURRENCY_LIMIT_DECREASE_FACTOR", "0.7")
+    ),
+    "DECREASE_COOLDOWN": float(
+        os.getenv("PROVIDER_CONCURRENCY_LIMIT_DECREASE_COOLDOWN", "1")
+    ),
+    # Calls slower than this count as failures for the limit.
+    "SLOW_CALL_THRESHOLD": float(
+        os.getenv("PROVIDER_CONCURRENCY_LIMIT_SLOW_CALL_THRESHOLD", "3")
+    ),
+    # How long a call waits for a free slot before failing fast.
+    "QUEUE_TIMEOUT": float(
+        os.getenv("PROVIDER_CONCURRENCY_LIMIT_QUEUE_TIMEOUT", "2")
+    ),
+}
@@ -17,7 +17,10 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 
+from wallets.api_views import metrics
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("wallets.urls")),
+    path("metrics", metrics, name="metrics"),
 ]
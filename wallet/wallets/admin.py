@@ -1,8 +1,97 @@
-from django.contrib import admin
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import SEARCH_VAR
+from django.db.models import Q, Subquery
+from django.template.response import TemplateResponse
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.html import format_html
 
-from wallets.models import Transaction, TransactionTask, Wallet
+from wallets.models import (
+    BulkOperation,
+    BulkOperationItem,
+    LedgerEntry,
+    OutboxMessage,
+    Transaction,
+    TransactionTask,
+    Wallet,
+)
+from wallets.pagination import EstimatedCountPaginator
+from wallets.routers import is_pinned, replica_reads
+
+
+def _as_uuid(term):
+    try:
+        return uuid.UUID(term)
+    except ValueError:
+        return None
+
+
+def _id_of(model, **lookup):
+    # A scalar subquery, so the outer query can still use the index on the
+    # foreign key column.
+    return Subquery(model.objects.filter(**lookup).values("id")[:1])
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    # For tables with hundreds of millions of rows. Searches are exact
+    # index lookups instead of icontains scans, counts are estimated or
+    # capped, lists without a picked date are limited to recent rows, and
+    # list pages are read from a replica. search_fields only
+    # turn the search box on and say what search() looks up.
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def search(self, term):
+        # Returns (condition, point). Point lookups go through a unique key
+        # and an index, so they skip the recent-rows window. Without an
+        # override no term matches anything, which costs no query at all.
+        return Q(pk__in=[]), True
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if term:
+            queryset = queryset.filter(self.search(term)[0])
+        window_start = self.window_start(request)
+        if window_start is not None:
+            queryset = queryset.filter(
+                **{f"{self.date_hierarchy}__gte": window_start}
+            )
+        return queryset, False
+
+    def window_start(self, request):
+        days = settings.ADMIN["DEFAULT_WINDOW_DAYS"]
+        if not self.date_hierarchy or not days:
+            return None
+        if any(
+            key.startswith(f"{self.date_hierarchy}__") for key in request.GET
+        ):
+            return None
+        term = request.GET.get(SEARCH_VAR, "").strip()
+        if term and self.search(term)[1]:
+            return None
+        return timezone.now() - timedelta(days=days)
+
+    def changelist_view(self, request, extra_context=None):
+        if self.window_start(request) is not None:
+            extra_context = {
+                "title": f"Select {self.model._meta.verbose_name} to change "
+                f"(last {settings.ADMIN['DEFAULT_WINDOW_DAYS']} days)",
+                **(extra_context or {}),
+            }
+        # Only list pages; actions are POSTed here too and must read what
+        # they are about to change from the primary.
+        if request.method != "GET" or is_pinned(request):
+            return super().changelist_view(request, extra_context)
+        with replica_reads():
+            response = super().changelist_view(request, extra_context)
+            # The date hierarchy queries run while the template renders.
+            if isinstance(response, TemplateResponse):
+                response.render()
+            return response
 
 
 @admin.register(Wallet)
@@ -10,7 +99,16 @@ class WalletAdmin(admin.ModelAdmin):
     list_display = ("uuid_short", "user_link", "balance_display", "created_at")
     search_fields = ("uuid", "user__username")
     list_filter = ("created_at",)
-    readonly_fields = ("uuid", "created_at")
+    list_select_related = ("user",)
+    # Balances only change through the balance services, which also post
+    # the matching ledger entries.
+    readonly_fields = (
+        "uuid",
+        "balance",
+        "reserved_amount",
+        "shard_count",
+        "created_at",
+    )
 
     def uuid_short(self, obj):
         return str(obj.uuid)[:8]
@@ -24,13 +122,16 @@ class WalletAdmin(admin.ModelAdmin):
     user_link.short_description = "User"
 
     def balance_display(self, obj):
-        return f"{obj.balance:,}"
+        return f"{obj.total_balance:,}"
 
     balance_display.short_description = "Balance"
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_total_balance()
+
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(LargeTableAdmin):
     list_display = (
         "uuid_short",
         "wallet_link",
@@ -46,8 +147,12 @@ class TransactionAdmin(admin.ModelAdmin):
         "wallet__user__username",
         "amount",
     )
-    list_filter = ("type", "status", "scheduled_for", "created_at")
+    list_filter = ("type", "status", "scheduled_for")
+    list_select_related = ("wallet",)
     readonly_fields = ("uuid", "created_at")
+    date_hierarchy = "created_at"
+    # Served by the transaction_created_at index.
+    ordering = ("-created_at", "-id")
 
     def uuid_short(self, obj):
         return str(obj.uuid)[:8]
@@ -65,12 +170,25 @@ class TransactionAdmin(admin.ModelAdmin):
 
     amount_formatted.short_description = "Amount"
 
+    def search(self, term):
+        value = _as_uuid(term)
+        if value is not None:
+            # The transaction itself, or every transaction of a wallet.
+            return (
+                Q(uuid=value) | Q(wallet_id=_id_of(Wallet, uuid=value)),
+                True,
+            )
+        if term.isdigit():
+            return Q(amount=int(term)), False
+        return Q(wallet_id=_id_of(Wallet, user__username=term)), True
+
 
 @admin.register(TransactionTask)
 class TransactionTaskAdmin(admin.ModelAdmin):
     list_display = ("get_transaction_uuid", "task_id", "status")
     search_fields = ("transaction__uuid", "task_id")
     list_filter = ("status",)
+    list_select_related = ("transaction",)
     readonly_fields = ("task_id",)
 
     def get_transaction_uuid(self, obj):
@@ -78,3 +196,108 @@ class TransactionTaskAdmin(admin.ModelAdmin):
 
     get_transaction_uuid.admin_order_field = "transaction"
     get_transaction_uuid.short_description = "Transaction UUID"
+
+
+@admin.register(BulkOperation)
+class BulkOperationAdmin(admin.ModelAdmin):
+    list_display = (
+        "uuid",
+        "type",
+        "status",
+        "total_items",
+        "processed_items",
+        "accepted_items",
+        "rejected_items",
+        "created_at",
+    )
+    search_fields = ("uuid",)
+    list_filter = ("type", "status", "created_at")
+    readonly_fields = ("uuid", "created_at", "completed_at")
+
+
+@admin.register(BulkOperationItem)
+class BulkOperationItemAdmin(admin.ModelAdmin):
+    list_display = ("operation", "index", "wallet_uuid", "amount", "status")
+    search_fields = ("operation__uuid", "wallet_uuid")
+    list_filter = ("status",)
+    list_select_related = ("operation",)
+    raw_id_fields = ("operation", "transaction")
+
+
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(LargeTableAdmin):
+    list_display = ("id", "wallet", "account", "amount", "created_at")
+    search_fields = ("wallet__uuid", "transaction__uuid")
+    list_filter = ("account",)
+    # Wallet.__str__ shows the user.
+    list_select_related = ("wallet__user",)
+    raw_id_fields = ("wallet", "transaction")
+
+    def search(self, term):
+        value = _as_uuid(term)
+        if value is None:
+            return Q(pk__in=[]), True
+        return (
+            Q(wallet_id=_id_of(Wallet, uuid=value))
+            | Q(transaction_id=_id_of(Transaction, uuid=value)),
+            True,
+        )
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = (
+        "transaction",
+        "status",
+        "attempts",
+        "next_attempt_at",
+        "updated_at",
+    )
+    search_fields = ("transaction__uuid",)
+    list_filter = ("status",)
+    list_select_related = ("transaction",)
+    raw_id_fields = ("transaction",)
+    readonly_fields = ("attempts", "last_error", "created_at", "updated_at")
+    actions = ("retry_now",)
+
+    def retry_now(self, request, queryset):
+        # Only calls whose transaction is still open go back in the queue,
+        # with a fresh set of attempts. A dead letter's transaction was
+        # failed when it died, and a withdrawal refunded; sending it again
+        # could pay out money already back in the wallet.
+        updated = (
+            queryset.exclude(
+                status__in=(
+                    OutboxMessage.StatusChoices.DELIVERED,
+                    OutboxMessage.StatusChoices.REJECTED,
+                )
+            )
+            .filter(
+                transaction__status__in=(
+                    Transaction.StatusChoices.PENDING,
+                    Transaction.StatusChoices.PROCESSING,
+                )
+            )
+            .update(
+                status=OutboxMessage.StatusChoices.PENDING,
+                attempts=0,
+                next_attempt_at=timezone.now(),
+            )
+        )
+        self.message_user(request, f"{updated} message(s) queued for retry.")
+        skipped = queryset.count() - updated
+        if skipped:
+            self.message_user(
+                request,
+                f"{skipped} message(s) skipped: delivered, rejected or "
+                "their transaction is already finalized.",
+                messages.WARNING,
+            )
+
+    retry_now.short_description = "Retry selected messages now"
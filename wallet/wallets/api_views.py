@@ -3,6 +3,9 @@ from typing import Union
 
 from django.conf import settings
 from django.http import HttpRequest, HttpResponse, HttpResponseNotFound
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from wallets.metrics import registry
 
 
 def swagger_yaml(
@@ -12,3 +15,9 @@ def swagger_yaml(
         os.path.join(settings.BASE_DIR, "wallets/docs/swagger.yml"), "r"
     ) as yaml_file:
         return HttpResponse(yaml_file.read(), content_type="application/yaml")
+
+
+def metrics(request: HttpRequest) -> HttpResponse:
+    return HttpResponse(
+        generate_latest(registry()), content_type=CONTENT_TYPE_LATEST
+    )
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class WalletsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "wallets"
+
+    def ready(self):
+        # Connects the celery task metrics and log flushing.
+        from wallets import signals  # noqa: F401
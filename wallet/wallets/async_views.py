@@ -0,0 +1,117 @@
+import functools
+
+from asgiref.sync import sync_to_async
+from rest_framework import exceptions, serializers, status
+
+from wallets.idempotency import async_idempotent, json_response, request_data
+from wallets.models import Wallet
+from wallets.serializers import (
+    DepositTransactionSerializer,
+    TransactionSerializer,
+    WalletSerializer,
+    WithdrawalSerializer,
+)
+from wallets.services import schedule_withdrawal
+
+# Native async views for the hot endpoints. Django 3.2 has no async ORM, so
+# each view does its database work in a single sync_to_async call and
+# awaits nothing else; under ASGI no thread is held between those hops.
+# The sync views in wallets.views also run under ASGI, except transaction
+# exports, which need WSGI to stream.
+
+NOT_FOUND = {"detail": "Not found."}
+
+
+def async_view(*methods):
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return json_response(
+                    {"detail": f'Method "{request.method}" not allowed.'},
+                    status=status.HTTP_405_METHOD_NOT_ALLOWED,
+                )
+            try:
+                return await view(request, *args, **kwargs)
+            except exceptions.APIException as e:
+                # Malformed or unsupported request bodies.
+                return json_response(
+                    {"detail": e.detail}, status=e.status_code
+                )
+
+        # csrf_exempt() would wrap the coroutine in a sync function; the
+        # DRF views these replace were exempt as well.
+        wrapper.csrf_exempt = True
+        return wrapper
+
+    return decorator
+
+
+@sync_to_async
+def _retrieve_wallet(wallet_uuid):
+    wallet = (
+        Wallet.objects.select_related("user").filter(uuid=wallet_uuid).first()
+    )
+    if wallet is None:
+        return status.HTTP_404_NOT_FOUND, NOT_FOUND
+    return status.HTTP_200_OK, WalletSerializer(wallet).data
+
+
+@sync_to_async
+def _create_deposit(wallet_uuid, data):
+    serializer = DepositTransactionSerializer(
+        data=data, context={"wallet_uuid": wallet_uuid}
+    )
+    try:
+        serializer.is_valid(raise_exception=True)
+        deposit = serializer.save()
+    except serializers.ValidationError as e:
+        return status.HTTP_400_BAD_REQUEST, {"errors": e.detail}
+    except Exception as e:
+        return status.HTTP_500_INTERNAL_SERVER_ERROR, {"errors": str(e)}
+    return status.HTTP_202_ACCEPTED, TransactionSerializer(deposit).data
+
+
+@sync_to_async
+def _schedule_withdrawal(wallet_uuid, data):
+    serializer = WithdrawalSerializer(data=data)
+    if not serializer.is_valid():
+        return status.HTTP_400_BAD_REQUEST, serializer.errors
+
+    wallet = Wallet.objects.filter(uuid=wallet_uuid).first()
+    if wallet is None:
+        return status.HTTP_404_NOT_FOUND, NOT_FOUND
+    try:
+        withdrawal = schedule_withdrawal(wallet, **serializer.validated_data)
+    except serializers.ValidationError as e:
+        return status.HTTP_400_BAD_REQUEST, {"error": e.detail}
+    except ValueError as e:
+        return status.HTTP_400_BAD_REQUEST, {"error": str(e)}
+    return status.HTTP_200_OK, {
+        "message": "Withdrawal scheduled successfully",
+        "uuid": str(withdrawal.uuid),
+    }
+
+
+@async_view("GET")
+async def retrieve_wallet(request, uuid):
+    response_status, data = await _retrieve_wallet(uuid)
+    return json_response(data, status=response_status)
+
+
+@async_view("POST")
+@async_idempotent("CreateDepositView")
+async def create_deposit(request, wallet_uuid):
+    response_status, data = await _create_deposit(
+        wallet_uuid, request_data(request)
+    )
+    return json_response(data, status=response_status)
+
+
+@async_view("POST")
+@async_idempotent("ScheduleWithdrawView")
+async def schedule_withdrawal_view(request, wallet_uuid):
+    response_status, data = await _schedule_withdrawal(
+        wallet_uuid, request_data(request)
+    )
+    return json_response(data, status=response_status)
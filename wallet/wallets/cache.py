@@ -0,0 +1,113 @@
+import logging
+import time
+import uuid
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from wallets.metrics import BALANCE_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# Balances are cached under a per-wallet version token. Writers never touch
+# the cached value itself: they swap the version once their transaction
+# commits, which orphans every older entry at once. An entry is immutable
+# for its version, so a reader can never overwrite fresh data with stale.
+_local = {}
+
+
+def _version_key(wallet_uuid) -> str:
+    return f"wallet_balance_version:{wallet_uuid}"
+
+
+def _entry_key(wallet_uuid, version: str) -> str:
+    return f"wallet_balance:{wallet_uuid}:{version}"
+
+
+def _current_version(wallet_uuid) -> str:
+    version = cache.get(_version_key(wallet_uuid))
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(_version_key(wallet_uuid), version, timeout=None):
+            version = cache.get(_version_key(wallet_uuid))
+    return version
+
+
+def _remember(wallet_uuid, version: str, balance: int) -> None:
+    if len(_local) >= settings.BALANCE_CACHE["LOCAL_MAX_ENTRIES"]:
+        _local.clear()
+    _local[wallet_uuid] = (version, balance)
+
+
+def _load(wallet_uuid, version: str, loader: Callable[[], Optional[int]]):
+    config = settings.BALANCE_CACHE
+    entry_key = _entry_key(wallet_uuid, version)
+    lock_key = f"{entry_key}:lock"
+
+    # Only one process rebuilds a missing entry; the rest wait for it
+    # instead of stampeding the database.
+    if not cache.add(lock_key, 1, timeout=config["LOCK_TIMEOUT"]):
+        deadline = time.monotonic() + config["LOCK_TIMEOUT"]
+        while time.monotonic() < deadline:
+            time.sleep(0.01)
+            balance = cache.get(entry_key)
+            if balance is not None:
+                return balance
+
+    # The version was read before loading, so a commit racing with this
+    # load has already moved readers on to a newer version.
+    balance = loader()
+    if balance is not None:
+        cache.set(entry_key, balance, timeout=config["TIMEOUT"])
+    cache.delete(lock_key)
+    return balance
+
+
+def _cached_balance(wallet_uuid, loader: Callable[[], Optional[int]]):
+    version = _current_version(wallet_uuid)
+
+    local = _local.get(wallet_uuid)
+    if local is not None and local[0] == version:
+        BALANCE_CACHE_LOOKUPS.labels("local").inc()
+        return local[1]
+
+    balance = cache.get(_entry_key(wallet_uuid, version))
+    BALANCE_CACHE_LOOKUPS.labels("miss" if balance is None else "hit").inc()
+    if balance is None:
+        balance = _load(wallet_uuid, version, loader)
+        if balance is None:
+            return None
+
+    _remember(wallet_uuid, version, balance)
+    return balance
+
+
+def get_balance(wallet_uuid, loader: Callable[[], Optional[int]]):
+    # Redis is only the fast path; without it every read goes to the
+    # database, and the local copy is skipped as its version can't be
+    # checked.
+    try:
+        return _cached_balance(wallet_uuid, loader)
+    except Exception:
+        logger.warning("Balance cache unavailable", exc_info=True)
+        return loader()
+
+
+def invalidate_balance(wallet_uuid) -> None:
+    def bump():
+        _local.pop(wallet_uuid, None)
+        # The write has already committed; a failed bump must not turn it
+        # into an error. The entry it would have orphaned expires on its
+        # own after BALANCE_CACHE["TIMEOUT"].
+        try:
+            cache.set(
+                _version_key(wallet_uuid), uuid.uuid4().hex, timeout=None
+            )
+        except Exception:
+            logger.warning("Balance cache unavailable", exc_info=True)
+
+    # Runs right after COMMIT and before the writer returns, so any read
+    # that starts once the write is acknowledged sees the new version.
+    transaction.on_commit(bump)
@@ -0,0 +1,11 @@
+from wallets.clients.circuit_breaker import (
+    CircuitBreaker,
+    ProviderUnavailableError,
+)
+from wallets.clients.concurrency_limiter import ConcurrencyLimiter
+from wallets.clients.third_party import (
+    AsyncThirdPartyClient,
+    ThirdPartyClient,
+    get_async_third_party_client,
+    get_third_party_client,
+)
@@ -0,0 +1,162 @@
+import logging
+import time
+
+from django_redis import get_redis_connection
+
+from wallets.metrics import (
+    PROVIDER_BREAKER_STATE,
+    PROVIDER_BREAKER_TRANSITIONS,
+    PROVIDER_REJECTED_CALLS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderUnavailableError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    # State lives in Redis so every API and celery process sees the same
+    # breaker. "open" expires after reset_timeout; while "tripped" is still
+    # set the breaker is half-open and lets a single probe call through.
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+    STATE_NAMES = {CLOSED: "closed", HALF_OPEN: "half_open", OPEN: "open"}
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float,
+        min_calls: int,
+        window: float,
+        reset_timeout: float,
+        probe_timeout: float,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.probe_timeout = probe_timeout
+        self.prefix = f"circuit_breaker:{name}"
+
+    def _key(self, suffix: str) -> str:
+        return f"{self.prefix}:{suffix}"
+
+    def _transition(self, state: int) -> None:
+        logger.warning(
+            "Circuit breaker %s is now %s",
+            self.name,
+            self.STATE_NAMES[state],
+        )
+        PROVIDER_BREAKER_TRANSITIONS.labels(
+            self.name, self.STATE_NAMES[state]
+        ).inc()
+        PROVIDER_BREAKER_STATE.labels(self.name).set(state)
+
+    def _bucket(self) -> int:
+        return int(time.time() // self.window)
+
+    def state(self) -> int:
+        is_open, tripped = get_redis_connection("default").mget(
+            self._key("open"), self._key("tripped")
+        )
+        state = (
+            self.OPEN
+            if is_open
+            else self.HALF_OPEN if tripped else self.CLOSED
+        )
+        PROVIDER_BREAKER_STATE.labels(self.name).set(state)
+        return state
+
+    def before_call(self) -> bool:
+        # Returns whether this call is the half-open probe; only its
+        # outcome can close the breaker.
+        try:
+            state = self.state()
+            if state == self.HALF_OPEN and get_redis_connection("default").set(
+                self._key("probe"),
+                1,
+                nx=True,
+                px=int(self.probe_timeout * 1000),
+            ):
+                return True
+        except Exception:
+            # Redis trouble must not take the provider path down with it.
+            logger.warning("Circuit breaker state unavailable", exc_info=True)
+            return False
+
+        if state != self.CLOSED:
+            PROVIDER_REJECTED_CALLS.labels(self.name, "breaker_open").inc()
+            raise ProviderUnavailableError(
+                f"Circuit breaker {self.name} is open"
+            )
+        return False
+
+    def record(self, succeeded: bool, probe: bool = False) -> None:
+        try:
+            self._record(succeeded, probe)
+        except Exception:
+            logger.warning("Circuit breaker state unavailable", exc_info=True)
+
+    def _record(self, succeeded: bool, probe: bool) -> None:
+        redis = get_redis_connection("default")
+        if redis.exists(self._key("tripped")):
+            if not succeeded:
+                self._open(redis)
+            elif probe:
+                # Only the probe's success closes the breaker; calls that
+                # were already in flight when it opened say nothing about
+                # whether the provider has recovered. Closed in one step,
+                # "open" included, and counting starts afresh so the
+                # failures that opened it can't trip it again straight away.
+                bucket = self._bucket()
+                pipe = redis.pipeline()
+                pipe.delete(self._key("tripped"))
+                pipe.delete(
+                    self._key("open"),
+                    self._key("probe"),
+                    *(
+                        self._key(f"{counter}:{bucket - offset}")
+                        for counter in ("calls", "failures")
+                        for offset in (0, 1)
+                    ),
+                )
+                closed, _ = pipe.execute()
+                if closed:
+                    self._transition(self.CLOSED)
+            return
+
+        # Failure rate over the current and previous window buckets.
+        bucket = self._bucket()
+        expiry = int(self.window * 2) + 1
+        pipe = redis.pipeline()
+        pipe.incr(self._key(f"calls:{bucket}"))
+        pipe.expire(self._key(f"calls:{bucket}"), expiry)
+        pipe.incrby(self._key(f"failures:{bucket}"), 0 if succeeded else 1)
+        pipe.expire(self._key(f"failures:{bucket}"), expiry)
+        pipe.mget(
+            self._key(f"calls:{bucket - 1}"),
+            self._key(f"failures:{bucket - 1}"),
+        )
+        calls, _, failures, _, previous = pipe.execute()
+        calls += int(previous[0] or 0)
+        failures += int(previous[1] or 0)
+
+        if (
+            not succeeded
+            and calls >= self.min_calls
+            and failures / calls >= self.failure_rate
+        ):
+            self._open(redis)
+
+    def _open(self, redis) -> None:
+        pipe = redis.pipeline()
+        pipe.set(
+            self._key("open"), 1, nx=True, px=int(self.reset_timeout * 1000)
+        )
+        pipe.set(self._key("tripped"), 1)
+        pipe.delete(self._key("probe"))
+        opened, _, _ = pipe.execute()
+        if opened:
+            self._transition(self.OPEN)
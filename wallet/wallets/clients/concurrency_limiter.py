@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import random
+import time
+import uuid
+from typing import Optional
+
+from django_redis import get_redis_connection
+
+from wallets.clients.circuit_breaker import ProviderUnavailableError
+from wallets.metrics import (
+    PROVIDER_CONCURRENCY_LIMIT,
+    PROVIDER_IN_FLIGHT,
+    PROVIDER_REJECTED_CALLS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Leases are members of a sorted set scored by their expiry, so a slot held
+# by a crashed worker frees itself once its lease runs out.
+ACQUIRE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+local limit = tonumber(redis.call('GET', KEYS[2]) or ARGV[4])
+if redis.call('ZCARD', KEYS[1]) < math.floor(limit) then
+    redis.call('ZADD', KEYS[1], ARGV[2], ARGV[3])
+    return 1
+end
+return 0
+"""
+
+# Additive increase of 1 per limit's worth of good calls; multiplicative
+# decrease on a bad one, at most once per cooldown so a burst of failures
+# from calls that were already in flight only counts once.
+RELEASE_SCRIPT = """
+redis.call('ZREM', KEYS[1], ARGV[1])
+local limit = tonumber(redis.call('GET', KEYS[2]) or ARGV[3])
+if ARGV[2] == '1' then
+    limit = math.min(tonumber(ARGV[5]), limit + 1 / limit)
+elseif not redis.call('GET', KEYS[3]) then
+    limit = math.max(tonumber(ARGV[4]), limit * tonumber(ARGV[6]))
+    redis.call('SET', KEYS[3], 1, 'PX', ARGV[7])
+end
+redis.call('SET', KEYS[2], tostring(limit))
+return tostring(limit)
+"""
+
+
+class ConcurrencyLimiter:
+    # AIMD limit on concurrent provider calls, shared by every process.
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        decrease_factor: float,
+        decrease_cooldown: float,
+        queue_timeout: float,
+        lease_timeout: float,
+    ):
+        self.name = name
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+        self.queue_timeout = queue_timeout
+        self.lease_timeout = lease_timeout
+        self.leases_key = f"concurrency_limiter:{name}:leases"
+        self.limit_key = f"concurrency_limiter:{name}:limit"
+        self.cooldown_key = f"concurrency_limiter:{name}:cooldown"
+
+    def _try_acquire(self, token: str) -> Optional[bool]:
+        now = time.time()
+        try:
+            return bool(
+                get_redis_connection("default").eval(
+                    ACQUIRE_SCRIPT,
+                    2,
+                    self.leases_key,
+                    self.limit_key,
+                    now,
+                    now + self.lease_timeout,
+                    token,
+                    self.initial_limit,
+                )
+            )
+        except Exception:
+            # Without Redis the limiter steps aside rather than block calls.
+            logger.warning("Concurrency limiter unavailable", exc_info=True)
+            return None
+
+    def _acquired(self, token: str) -> str:
+        PROVIDER_IN_FLIGHT.labels(self.name).inc()
+        return token
+
+    def _rejected(self):
+        PROVIDER_REJECTED_CALLS.labels(self.name, "concurrency_limit").inc()
+        return ProviderUnavailableError(
+            f"No {self.name} concurrency slot freed up within "
+            f"{self.queue_timeout}s"
+        )
+
+    def _backoff(self) -> float:
+        return random.uniform(0.01, 0.05)
+
+    def acquire(self) -> str:
+        # Waits in line for up to queue_timeout, then fails fast.
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.queue_timeout
+        while True:
+            if self._try_acquire(token) is not False:
+                return self._acquired(token)
+            if time.monotonic() >= deadline:
+                raise self._rejected()
+            time.sleep(self._backoff())
+
+    async def aacquire(self) -> str:
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.queue_timeout
+        while True:
+            if self._try_acquire(token) is not False:
+                return self._acquired(token)
+            if time.monotonic() >= deadline:
+                raise self._rejected()
+            await asyncio.sleep(self._backoff())
+
+    def release(self, token: str, succeeded: bool) -> None:
+        PROVIDER_IN_FLIGHT.labels(self.name).dec()
+        try:
+            limit = get_redis_connection("default").eval(
+                RELEASE_SCRIPT,
+                3,
+                self.leases_key,
+                self.limit_key,
+                self.cooldown_key,
+                token,
+                1 if succeeded else 0,
+                self.initial_limit,
+                self.min_limit,
+                self.max_limit,
+                self.decrease_factor,
+                int(self.decrease_cooldown * 1000),
+            )
+        except Exception:
+            logger.warning("Concurrency limiter unavailable", exc_info=True)
+            return
+        PROVIDER_CONCURRENCY_LIMIT.labels(self.name).set(float(limit))
@@ -0,0 +1,284 @@
+import asyncio
+import os
+import time
+import weakref
+from typing import Any, Dict, Optional
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from wallets.clients.circuit_breaker import CircuitBreaker
+from wallets.clients.concurrency_limiter import ConcurrencyLimiter
+from wallets.metrics import PROVIDER_CALL_DURATION
+
+
+def _payload(
+    wallet_uuid, amount, transaction_type, reference=None
+) -> Dict[str, Any]:
+    payload = {
+        "wallet_uuid": str(wallet_uuid),
+        "amount": amount,
+        "type": transaction_type,
+    }
+    # Lets the provider recognise a retried call it has already applied.
+    if reference is not None:
+        payload["reference"] = str(reference)
+    return payload
+
+
+def _provider_status(response) -> Optional[int]:
+    # The provider reports failures in the body of an HTTP 200.
+    try:
+        return int(response.json().get("status", 200))
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+class _GuardedCall:
+    # Fails fast while the breaker is open, holds a concurrency slot for
+    # the duration of the call and feeds the outcome back to both.
+    def __init__(
+        self,
+        name: str,
+        breaker: Optional[CircuitBreaker],
+        limiter: Optional[ConcurrencyLimiter],
+        slow_call_threshold: float,
+    ):
+        self.name = name
+        self.breaker = breaker
+        self.limiter = limiter
+        self.slow_call_threshold = slow_call_threshold
+        self.status = None
+        self.token = None
+        self.probe = False
+
+    def __enter__(self):
+        if self.breaker is not None:
+            self.probe = self.breaker.before_call()
+        if self.limiter is not None:
+            self.token = self.limiter.acquire()
+        # Time spent queueing for a slot is not the provider's latency.
+        self.started = time.monotonic()
+        return self
+
+    async def __aenter__(self):
+        if self.breaker is not None:
+            self.probe = self.breaker.before_call()
+        if self.limiter is not None:
+            self.token = await self.limiter.aacquire()
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        succeeded = (
+            exc_type is None and self.status is not None and self.status < 500
+        )
+        if exc_type is not None:
+            status = exc_type.__name__
+        else:
+            status = "invalid" if self.status is None else str(self.status)
+        elapsed = time.monotonic() - self.started
+        PROVIDER_CALL_DURATION.labels(self.name, status).observe(elapsed)
+        if self.token is not None:
+            self.limiter.release(
+                self.token,
+                succeeded and elapsed <= self.slow_call_threshold,
+            )
+        if self.breaker is not None:
+            self.breaker.record(succeeded, self.probe)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.__exit__(exc_type, exc, tb)
+
+
+class ThirdPartyClient:
+    def __init__(
+        self,
+        url: str,
+        timeout: float,
+        connect_timeout: float,
+        pool_connections: int,
+        pool_maxsize: int,
+        breaker: Optional[CircuitBreaker] = None,
+        limiter: Optional[ConcurrencyLimiter] = None,
+        slow_call_threshold: Optional[float] = None,
+        name: str = "third_party",
+    ):
+        self.name = name
+        self.url = url
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.breaker = breaker
+        self.limiter = limiter
+        self.slow_call_threshold = slow_call_threshold or timeout
+        self.session = requests.Session()
+        # pool_block keeps the number of sockets per host bounded instead of
+        # opening throwaway connections once the pool is exhausted.
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=True,
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request_transaction(
+        self,
+        wallet_uuid,
+        amount: int,
+        transaction_type: str,
+        api_url: Optional[str] = None,
+        timeout: Optional[float] = None,
+        reference=None,
+    ) -> requests.Response:
+        with _GuardedCall(
+            self.name, self.breaker, self.limiter, self.slow_call_threshold
+        ) as call:
+            response = self.session.post(
+                api_url or self.url,
+                json=_payload(
+                    wallet_uuid, amount, transaction_type, reference
+                ),
+                timeout=(self.connect_timeout, timeout or self.timeout),
+            )
+            response.raise_for_status()
+            call.status = _provider_status(response)
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncThirdPartyClient:
+    def __init__(
+        self,
+        url: str,
+        timeout: float,
+        connect_timeout: float,
+        max_connections: int,
+        max_keepalive_connections: int,
+        breaker: Optional[CircuitBreaker] = None,
+        limiter: Optional[ConcurrencyLimiter] = None,
+        slow_call_threshold: Optional[float] = None,
+        name: str = "third_party",
+    ):
+        self.name = name
+        self.url = url
+        self.timeout = timeout
+        self.breaker = breaker
+        self.limiter = limiter
+        self.slow_call_threshold = slow_call_threshold or timeout
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            ),
+        )
+
+    async def request_transaction(
+        self,
+        wallet_uuid,
+        amount: int,
+        transaction_type: str,
+        api_url: Optional[str] = None,
+        timeout: Optional[float] = None,
+        reference=None,
+    ) -> httpx.Response:
+        async with _GuardedCall(
+            self.name, self.breaker, self.limiter, self.slow_call_threshold
+        ) as call:
+            response = await self.client.post(
+                api_url or self.url,
+                json=_payload(
+                    wallet_uuid, amount, transaction_type, reference
+                ),
+                timeout=timeout or httpx.USE_CLIENT_DEFAULT,
+            )
+            response.raise_for_status()
+            call.status = _provider_status(response)
+        return response
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def _breaker() -> CircuitBreaker:
+    config = settings.PROVIDER_CIRCUIT_BREAKER
+    return CircuitBreaker(
+        name="third_party",
+        failure_rate=config["FAILURE_RATE"],
+        min_calls=config["MIN_CALLS"],
+        window=config["WINDOW"],
+        reset_timeout=config["RESET_TIMEOUT"],
+        probe_timeout=settings.THIRD_PARTY_SERVICE["TIMEOUT"],
+    )
+
+
+def _limiter() -> ConcurrencyLimiter:
+    config = settings.PROVIDER_CONCURRENCY_LIMIT
+    return ConcurrencyLimiter(
+        name="third_party",
+        initial_limit=config["INITIAL_LIMIT"],
+        min_limit=config["MIN_LIMIT"],
+        max_limit=config["MAX_LIMIT"],
+        decrease_factor=config["DECREASE_FACTOR"],
+        decrease_cooldown=config["DECREASE_COOLDOWN"],
+        queue_timeout=config["QUEUE_TIMEOUT"],
+        # A crashed worker's slot is reclaimed once its call would have
+        # timed out anyway.
+        lease_timeout=settings.THIRD_PARTY_SERVICE["TIMEOUT"]
+        + settings.THIRD_PARTY_SERVICE["CONNECT_TIMEOUT"],
+    )
+
+
+_clients: Dict[int, ThirdPartyClient] = {}
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_third_party_client() -> ThirdPartyClient:
+    # Keyed by pid so forked celery/gunicorn workers never share sockets
+    # inherited from the parent.
+    pid = os.getpid()
+    client = _clients.get(pid)
+    if client is None:
+        config = settings.THIRD_PARTY_SERVICE
+        client = ThirdPartyClient(
+            url=config["URL"],
+            timeout=config["TIMEOUT"],
+            connect_timeout=config["CONNECT_TIMEOUT"],
+            pool_connections=config["POOL_CONNECTIONS"],
+            pool_maxsize=config["POOL_MAXSIZE"],
+            breaker=_breaker(),
+            limiter=_limiter(),
+            slow_call_threshold=settings.PROVIDER_CONCURRENCY_LIMIT[
+                "SLOW_CALL_THRESHOLD"
+            ],
+        )
+        _clients.clear()
+        _clients[pid] = client
+    return client
+
+
+def get_async_third_party_client() -> AsyncThirdPartyClient:
+    # httpx connections are bound to the event loop that opened them.
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        config = settings.THIRD_PARTY_SERVICE
+        client = AsyncThirdPartyClient(
+            url=config["URL"],
+            timeout=config["TIMEOUT"],
+            connect_timeout=config["CONNECT_TIMEOUT"],
+            max_connections=config["MAX_CONNECTIONS"],
+            max_keepalive_connections=config["MAX_KEEPALIVE_CONNECTIONS"],
+            breaker=_breaker(),
+            limiter=_limiter(),
+            slow_call_threshold=settings.PROVIDER_CONCURRENCY_LIMIT[
+                "SLOW_CALL_THRESHOLD"
+            ],
+        )
+        _async_clients[loop] = client
+    return client
@@ -0,0 +1,102 @@
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+
+from wallets.metrics import (
+    DB_POOL_CONNECTIONS,
+    DB_POOL_TIMEOUTS,
+    DB_POOL_WAIT,
+)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    # A process-wide set of open connections shared by every thread. At most
+    # max_size are checked out at once; further checkouts wait up to
+    # timeout seconds for one to come back. Idle connections are reused
+    # newest first, so the spares beyond what the load needs age out.
+    def __init__(self, alias, max_size, timeout, max_idle):
+        self.alias = alias
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.pid = os.getpid()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self, connect):
+        # Returns (connection, reused).
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            DB_POOL_TIMEOUTS.labels(self.alias).inc()
+            raise psycopg2.OperationalError(
+                f"No pooled connection to {self.alias} came free within "
+                f"{self.timeout} seconds"
+            )
+        DB_POOL_WAIT.labels(self.alias).observe(time.perf_counter() - started)
+
+        try:
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    connection, released_at = self._idle.pop()
+                DB_POOL_CONNECTIONS.labels(self.alias, "idle").dec()
+                if connection.closed or (
+                    time.monotonic() - released_at > self.max_idle
+                ):
+                    connection.close()
+                    continue
+                DB_POOL_CONNECTIONS.labels(self.alias, "in_use").inc()
+                return connection, True
+            connection = connect()
+        except BaseException:
+            self._slots.release()
+            raise
+        DB_POOL_CONNECTIONS.labels(self.alias, "in_use").inc()
+        return connection, False
+
+    def release(self, connection, discard=False):
+        DB_POOL_CONNECTIONS.labels(self.alias, "in_use").dec()
+        try:
+            if not discard and not connection.closed:
+                # Whatever a caller left open must not leak into the next
+                # checkout.
+                if (
+                    connection.get_transaction_status()
+                    != extensions.TRANSACTION_STATUS_IDLE
+                ):
+                    connection.rollback()
+                with self._lock:
+                    self._idle.append((connection, time.monotonic()))
+                DB_POOL_CONNECTIONS.labels(self.alias, "idle").inc()
+            else:
+                connection.close()
+        except psycopg2.Error:
+            connection.close()
+        finally:
+            self._slots.release()
+
+
+def get_pool(alias, options):
+    # Pools are per process: a forked child must not share its parent's
+    # sockets, so it starts a pool of its own.
+    pool = _pools.get(alias)
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None or pool.pid != os.getpid():
+            pool = _pools[alias] = ConnectionPool(
+                alias,
+                max_size=options["MAX_SIZE"],
+                timeout=options["TIMEOUT"],
+                max_idle=options["MAX_IDLE"],
+            )
+    return pool
@@ -0,0 +1,96 @@
+import os
+import time
+
+from django.db.backends.postgresql import base
+
+from wallets.db.pool import get_pool
+from wallets.metrics import (
+    DB_CONNECT_DURATION,
+    DB_CONNECTIONS_OPENED,
+    DB_HEALTH_CHECK_FAILURES,
+)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    # The stock PostgreSQL backend plus two settings Django 3.2 lacks:
+    #
+    # CONN_HEALTH_CHECKS: a reused connection is checked once before the
+    # first query of each request or task, so a connection the server or a
+    # proxy dropped while idle is replaced instead of failing that query.
+    #
+    # POOL: connections come from an in-process pool shared by every thread
+    # and go back to it when Django closes them. It suits servers that start
+    # a thread per request, such as runserver, where a connection kept for
+    # CONN_MAX_AGE dies with its thread, and it caps the process at MAX_SIZE
+    # connections however many threads it runs. Under ASGI, Django 3.2 runs
+    # all sync code on one thread that lives as long as the process, so a
+    # persistent connection already serves every request there.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+        self.pool = None
+        self.pooled_connection_reused = False
+
+    def get_new_connection(self, conn_params):
+        options = self.settings_dict.get("POOL")
+        if not options:
+            self.pool = None
+            return self.open_connection(conn_params)
+
+        self.pool = get_pool(self.alias, options)
+        connection, self.pooled_connection_reused = self.pool.acquire(
+            lambda: self.open_connection(conn_params)
+        )
+        return connection
+
+    def open_connection(self, conn_params):
+        started = time.perf_counter()
+        connection = super().get_new_connection(conn_params)
+        DB_CONNECT_DURATION.labels(self.alias).observe(
+            time.perf_counter() - started
+        )
+        DB_CONNECTIONS_OPENED.labels(self.alias).inc()
+        return connection
+
+    def connect(self):
+        self.pooled_connection_reused = False
+        super().connect()
+        # A fresh connection needs no check; one handed back out of the
+        # pool may have sat idle for a while.
+        self.health_check_done = not self.pooled_connection_reused
+
+    def _close(self):
+        pool = self.pool
+        if self.connection is None or pool is None:
+            return super()._close()
+        self.pool = None
+        if pool.pid != os.getpid():
+            # Inherited across a fork; the parent still owns the socket.
+            return super()._close()
+        # A connection closed mid-transaction, or after an error, is
+        # dropped rather than handed to someone else.
+        pool.release(
+            self.connection,
+            discard=self.in_atomic_block or self.errors_occurred,
+        )
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        # Runs at the start and end of every request and task.
+        self.health_check_done = False
+
+    def close_if_health_check_failed(self):
+        if (
+            self.connection is None
+            or self.health_check_done
+            or not self.settings_dict.get("CONN_HEALTH_CHECKS")
+        ):
+            return
+        if not self.is_usable():
+            DB_HEALTH_CHECK_FAILURES.labels(self.alias).inc()
+            self.close()
+        self.health_check_done = True
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
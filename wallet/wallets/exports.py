@@ -0,0 +1,78 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Iterable, Iterator
+
+from wallets.models import Transaction, Wallet
+
+EXPORT_FIELDS = (
+    "uuid",
+    "type",
+    "status",
+    "amount",
+    "scheduled_for",
+    "created_at",
+)
+CHUNK_SIZE = 2000
+
+
+def transaction_rows(wallet: Wallet, chunk_size: int = CHUNK_SIZE):
+    # iterator() streams through a server-side cursor, so only one chunk of
+    # rows is ever held in memory. The database is fixed now, as the rows
+    # are read after the view has returned, by the WSGI server's thread.
+    queryset = Transaction.objects.filter(wallet_id=wallet.id)
+    return (
+        queryset.using(queryset.db)
+        .order_by("created_at", "id")
+        .values_list(*EXPORT_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def _serialize(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _batched(lines: Iterable[str], size: int) -> Iterator[str]:
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= size:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+def _csv_lines(rows) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(
+            [_serialize(value) if value is not None else "" for value in row]
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def iter_csv(rows, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    yield ",".join(EXPORT_FIELDS) + "\r\n"
+    yield from _batched(_csv_lines(rows), chunk_size)
+
+
+def iter_ndjson(rows, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    lines = (
+        json.dumps(dict(zip(EXPORT_FIELDS, row)), default=_serialize) + "\n"
+        for row in rows
+    )
+    yield from _batched(lines, chunk_size)
+
+
+EXPORT_FORMATS = {
+    "csv": (iter_csv, "text/csv"),
+    "ndjson": (iter_ndjson, "application/x-ndjson"),
+}
@@ -0,0 +1,305 @@
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from wallets.models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+HEADER = "Idempotency-Key"
+# Returned by _lookup while a concurrent duplicate holds the lock.
+_BUSY = object()
+
+
+def _cache_call(method, *args, default=None, **kwargs):
+    # Redis is only the fast path; the unique constraint on IdempotencyKey
+    # still guards against duplicates when it is unavailable.
+    try:
+        return getattr(cache, method)(*args, **kwargs)
+    except Exception:
+        logger.warning("Idempotency cache unavailable", exc_info=True)
+        return default
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+def request_data(request):
+    # Plain (async) Django views parse the body the way DRF would, so a key
+    # hashes the same whichever kind of view it was first used on.
+    if not hasattr(request, "data"):
+        request.data = Request(
+            request,
+            parsers=[
+                parser() for parser in api_settings.DEFAULT_PARSER_CLASSES
+            ],
+        ).data
+    return request.data
+
+
+def _replay(stored, respond):
+    request_hash, response_status, response_body = stored
+    response = respond(response_body, status=response_status)
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _stored_response(scope, key, cache_key):
+    stored = _cache_call("get", cache_key)
+    if stored is not None:
+        return stored
+
+    record = (
+        IdempotencyKey.objects.filter(
+            scope=scope, key=key, response_status__isnull=False
+        )
+        .values_list("request_hash", "response_status", "response_body")
+        .first()
+    )
+    if record is not None:
+        _cache_call(
+            "set",
+            cache_key,
+            record,
+            timeout=settings.IDEMPOTENCY["RESPONSE_TIMEOUT"],
+        )
+    return record
+
+
+def _wait_for_response(scope, key, cache_key):
+    deadline = time.monotonic() + settings.IDEMPOTENCY["WAIT_TIMEOUT"]
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        stored = _stored_response(scope, key, cache_key)
+        if stored is not None:
+            return stored
+    return None
+
+
+async def _await_response(scope, key, cache_key):
+    # Polls without holding a thread while the duplicate finishes.
+    deadline = time.monotonic() + settings.IDEMPOTENCY["WAIT_TIMEOUT"]
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+        stored = await sync_to_async(_stored_response)(scope, key, cache_key)
+        if stored is not None:
+            return stored
+    return None
+
+
+def _mismatch(respond):
+    return respond(
+        {"error": f"{HEADER} was already used with a different request."},
+        status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+    )
+
+
+def _in_progress(respond):
+    return respond(
+        {"error": f"A request with this {HEADER} is still in progress."},
+        status=status.HTTP_409_CONFLICT,
+    )
+
+
+def _too_long(respond):
+    return respond(
+        {"error": f"{HEADER} is too long."},
+        status=status.HTTP_400_BAD_REQUEST,
+    )
+
+
+def _outcome(stored, request_hash, respond):
+    if stored is None:
+        return _in_progress(respond)
+    return (
+        _replay(stored, respond)
+        if stored[0] == request_hash
+        else _mismatch(respond)
+    )
+
+
+def _request_hash(data):
+    return hashlib.sha256(
+        json.dumps(data, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def _lookup(scope, key, cache_key):
+    # The stored response for this key, _BUSY while a concurrent duplicate
+    # is running, or None once this request holds the lock.
+    stored = _stored_response(scope, key, cache_key)
+    if stored is None and not _cache_call(
+        "add",
+        f"{cache_key}:lock",
+        1,
+        timeout=settings.IDEMPOTENCY["LOCK_TIMEOUT"],
+        default=True,
+    ):
+        return _BUSY
+    return stored
+
+
+def _start(scope, key, request_hash):
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                scope=scope, key=key, request_hash=request_hash
+            )
+    except IntegrityError:
+        return _reclaim(scope, key, request_hash)
+
+
+def _reclaim(scope, key, request_hash):
+    # Takes over a key whose request never finished: its worker crashed or
+    # was killed between _start and _finish. The conditional update lets
+    # only one of several retries win it.
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.IDEMPOTENCY["LOCK_TIMEOUT"])
+    taken = IdempotencyKey.objects.filter(
+        scope=scope,
+        key=key,
+        response_status__isnull=True,
+        started_at__lt=stale,
+    ).update(request_hash=request_hash, started_at=now)
+    if not taken:
+        return None
+    return IdempotencyKey.objects.get(scope=scope, key=key)
+
+
+def _owned(record):
+    # The record, unless a later request has since taken it over.
+    return IdempotencyKey.objects.filter(
+        pk=record.pk, started_at=record.started_at
+    )
+
+
+def _abandon(record, cache_key):
+    _owned(record).delete()
+    _cache_call("delete", f"{cache_key}:lock")
+
+
+def _finish(record, cache_key, request_hash, response_status, data):
+    if response_status >= 500:
+        # Let the client retry server errors with the same key.
+        _owned(record).delete()
+    elif _owned(record).update(
+        response_status=response_status, response_body=data
+    ):
+        _cache_call(
+            "set",
+            cache_key,
+            (request_hash, response_status, data),
+            timeout=settings.IDEMPOTENCY["RESPONSE_TIMEOUT"],
+        )
+    _cache_call("delete", f"{cache_key}:lock")
+
+
+def idempotent(view_method):
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > IdempotencyKey._meta.get_field("key").max_length:
+            return _too_long(Response)
+
+        scope = f"{type(self).__name__}:{request.path}"
+        request_hash = _request_hash(request.data)
+        cache_key = f"idempotency:{scope}:{key}"
+
+        stored = _lookup(scope, key, cache_key)
+        if stored is _BUSY:
+            # A concurrent duplicate is running; wait for its result
+            # instead of racing it to the provider.
+            stored = _wait_for_response(scope, key, cache_key)
+            return _outcome(stored, request_hash, Response)
+        if stored is not None:
+            return _outcome(stored, request_hash, Response)
+
+        record = _start(scope, key, request_hash)
+        if record is None:
+            stored = _wait_for_response(scope, key, cache_key)
+            return _outcome(stored, request_hash, Response)
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            _abandon(record, cache_key)
+            raise
+
+        _finish(
+            record,
+            cache_key,
+            request_hash,
+            response.status_code,
+            response.data,
+        )
+        return response
+
+    return wrapper
+
+
+def async_idempotent(scope_name):
+    # For async function views returning a JsonResponse. scope_name keeps
+    # the scope of the class-based view an endpoint replaced, so keys used
+    # before it was converted still replay.
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return await view(request, *args, **kwargs)
+            if len(key) > IdempotencyKey._meta.get_field("key").max_length:
+                return _too_long(json_response)
+
+            scope = f"{scope_name}:{request.path}"
+            request_hash = _request_hash(request_data(request))
+            cache_key = f"idempotency:{scope}:{key}"
+
+            stored = await sync_to_async(_lookup)(scope, key, cache_key)
+            if stored is _BUSY:
+                stored = await _await_response(scope, key, cache_key)
+                return _outcome(stored, request_hash, json_response)
+            if stored is not None:
+                return _outcome(stored, request_hash, json_response)
+
+            record = await sync_to_async(_start)(scope, key, request_hash)
+            if record is None:
+                stored = await _await_response(scope, key, cache_key)
+                return _outcome(stored, request_hash, json_response)
+
+            try:
+                response = await view(request, *args, **kwargs)
+            except Exception:
+                await sync_to_async(_abandon)(record, cache_key)
+                raise
+
+            await sync_to_async(_finish)(
+                record,
+                cache_key,
+                request_hash,
+                response.status_code,
+                json.loads(response.content),
+            )
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,102 @@
+import copy
+import json
+import logging
+import os
+import queue
+import random
+from datetime import datetime, timezone
+from logging.config import ConvertingList
+from logging.handlers import QueueHandler, QueueListener
+
+from wallets.metrics import LOG_RECORDS_DROPPED
+
+# Attributes every LogRecord has; anything else on a record was passed in
+# through extra= and becomes a field of the JSON event.
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {
+    "message",
+    "asctime",
+}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        event = {
+            "time": datetime.fromtimestamp(
+                record.created, timezone.utc
+            ).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                event[key] = value
+        if record.exc_info:
+            event["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            event["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(event, default=str)
+
+
+class SuccessSampler(logging.Filter):
+    # Keeps a fraction of the records logged with extra={"sampled": True},
+    # for events too frequent to keep every one of. Warnings and errors are
+    # always kept.
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        if not getattr(record, "sampled", False):
+            return True
+        if record.levelno >= logging.WARNING:
+            return True
+        record.sample_rate = self.rate
+        return random.random() < self.rate
+
+
+class WriteBehindHandler(QueueHandler):
+    # Puts records on an in-memory queue that a listener thread drains into
+    # the real handlers, so a slow disk or a full pipe never holds up the
+    # request or task that logged. A full queue drops the record and counts
+    # it rather than waiting.
+    #
+    # The handlers are given as cfg://handlers.<name>, so they have to sort
+    # before this handler's own name in LOGGING to be configured first.
+    def __init__(self, handlers, queue_size=10000):
+        super().__init__(queue.Queue(int(queue_size)))
+        if isinstance(handlers, ConvertingList):
+            handlers = [handlers[i] for i in range(len(handlers))]
+        self.handlers = handlers
+        self._listen()
+        # Threads don't survive a fork, so forked children start their own.
+        os.register_at_fork(after_in_child=self._listen)
+
+    def _listen(self):
+        self.queue = queue.Queue(self.queue.maxsize)
+        self.listener = QueueListener(
+            self.queue, *self.handlers, respect_handler_level=True
+        )
+        self.listener.start()
+
+    def prepare(self, record):
+        # Only the message is resolved here, so its arguments can't change
+        # while the record waits; formatting happens on the listener thread.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+    def close(self):
+        # Writes out whatever is still queued.
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        super().close()
@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from wallets.services.partitions import (
+    archivable_partitions,
+    archive_partition,
+    partition_name,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Detach the Transaction partitions older than --retain-months, "
+        "write each to gzipped CSV under --directory together with the "
+        "tasks and outbox messages of its transactions, and drop them. A "
+        "month that still holds pending or processing transactions is "
+        "skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retain-months",
+            type=int,
+            default=settings.TRANSACTION_PARTITIONS["RETAIN_MONTHS"],
+            help="Months kept attached besides the current one.",
+        )
+        parser.add_argument(
+            "--directory",
+            default=settings.TRANSACTION_PARTITIONS["ARCHIVE_DIR"],
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only list the partitions that would be archived.",
+        )
+
+    def handle(self, *args, **options):
+        if options["retain_months"] < 0:
+            raise CommandError("--retain-months can't be negative")
+
+        skipped = []
+        for month in archivable_partitions(options["retain_months"]):
+            if options["dry_run"]:
+                self.stdout.write(partition_name(month))
+                continue
+            try:
+                archived = archive_partition(month, options["directory"])
+            except ValueError as e:
+                skipped.append(partition_name(month))
+                self.stdout.write(self.style.WARNING(str(e)))
+                continue
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{archived['partition']}: "
+                    f"{archived['transactions']} transactions, "
+                    f"{archived['tasks']} tasks, "
+                    f"{archived['outbox_messages']} outbox messages"
+                )
+            )
+
+        if skipped:
+            raise CommandError(f"Not archived: {', '.join(skipped)}")
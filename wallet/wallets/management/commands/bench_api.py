@@ -0,0 +1,315 @@
+import json
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import httpx
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from wallets.models import Wallet
+
+DEFAULT_MIX = "retrieve=40,balance=30,deposit=12,withdraw=10,cancel=5,create=3"
+
+
+def _parse_mix(value):
+    try:
+        weights = {
+            name.strip(): float(weight)
+            for name, weight in (part.split("=") for part in value.split(","))
+        }
+    except ValueError:
+        raise CommandError("--mix must look like retrieve=50,deposit=50")
+    unknown = set(weights) - set(Workload.OPERATIONS)
+    if unknown:
+        raise CommandError(f"Unknown operations: {', '.join(sorted(unknown))}")
+    return weights
+
+
+def _percentile(values, q):
+    # Nearest-rank percentile over already sorted values.
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+def _summarise(samples, elapsed):
+    latencies = sorted(latency for _, latency in samples)
+    statuses = Counter(status for status, _ in samples)
+    errors = sum(
+        count
+        for status, count in statuses.items()
+        if not str(status).startswith("2")
+    )
+    summary = {
+        "count": len(samples),
+        "errors": errors,
+        "throughput": len(samples) / elapsed if elapsed else 0,
+        "statuses": {str(status): n for status, n in statuses.items()},
+    }
+    if latencies:
+        summary["latency_ms"] = {
+            "mean": sum(latencies) / len(latencies) * 1000,
+            "p50": _percentile(latencies, 0.50) * 1000,
+            "p95": _percentile(latencies, 0.95) * 1000,
+            "p99": _percentile(latencies, 0.99) * 1000,
+            "max": latencies[-1] * 1000,
+        }
+    return summary
+
+
+class Workload:
+    OPERATIONS = (
+        "create",
+        "retrieve",
+        "balance",
+        "deposit",
+        "withdraw",
+        "cancel",
+    )
+
+    def __init__(self, client, wallets, users, withdraw_delay):
+        self.client = client
+        self.wallets = wallets
+        self.users = deque(users)
+        self.withdrawals = deque()
+        self.withdraw_delay = withdraw_delay
+
+    def run(self, operation):
+        response = getattr(self, operation)()
+        return None if response is None else response.status_code
+
+    def create(self):
+        try:
+            user = self.users.popleft()
+        except IndexError:
+            return None
+        return self.client.post("/api/wallets/create/", json={"user": user})
+
+    def retrieve(self):
+        return self.client.get(f"/api/wallets/{random.choice(self.wallets)}/")
+
+    def balance(self):
+        return self.client.get(
+            f"/api/wallets/{random.choice(self.wallets)}/balance/"
+        )
+
+    def deposit(self):
+        return self.client.post(
+            f"/api/wallets/{random.choice(self.wallets)}/deposit",
+            json={"amount": random.randint(1, 1000)},
+            headers={"Idempotency-Key": uuid.uuid4().hex},
+        )
+
+    def withdraw(self):
+        # Scheduled ahead so cancel has pending withdrawals to work with.
+        scheduled_for = timezone.now() + timedelta(seconds=self.withdraw_delay)
+        response = self.client.post(
+            f"/api/wallets/{random.choice(self.wallets)}/withdrawl",
+            json={"amount": 1, "scheduled_for": scheduled_for.isoformat()},
+            headers={"Idempotency-Key": uuid.uuid4().hex},
+        )
+        if response.status_code == 200:
+            self.withdrawals.append(response.json()["uuid"])
+        return response
+
+    def cancel(self):
+        try:
+            withdrawal = self.withdrawals.popleft()
+        except IndexError:
+            return None
+        return self.client.post(
+            "/api/wallets/withdrawl/cancel",
+            json={"transaction_uuid": withdrawal},
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive a running wallet API at a target request rate and report "
+        "throughput and p50/p95/p99 latency per operation as JSON. Requests "
+        "are sent on a fixed schedule and timed from when they were due, so "
+        "a slow server can't hide its queueing delay."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://localhost:8001")
+        parser.add_argument("--rps", type=float, default=50)
+        parser.add_argument(
+            "--duration", type=float, default=30, help="Seconds measured."
+        )
+        parser.add_argument(
+            "--warmup",
+            type=float,
+            default=5,
+            help="Seconds run before measuring starts.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=64,
+            help="Requests in flight at most.",
+        )
+        parser.add_argument(
+            "--mix",
+            default=DEFAULT_MIX,
+            help="Relative weights of the operations to run.",
+        )
+        parser.add_argument(
+            "--wallets",
+            type=int,
+            default=1000,
+            help="Existing wallets to spread the load across.",
+        )
+        parser.add_argument(
+            "--withdraw-delay",
+            type=float,
+            default=3600,
+            help="Seconds ahead withdrawals are scheduled.",
+        )
+        parser.add_argument("--timeout", type=float, default=30)
+        parser.add_argument("--label", default="")
+        parser.add_argument("--output", help="Write the report here.")
+        parser.add_argument(
+            "--baseline",
+            help="Earlier report to compare against; exits non-zero if "
+            "latency or throughput regressed.",
+        )
+        parser.add_argument(
+            "--max-regression",
+            type=float,
+            default=0.2,
+            help="Tolerated relative regression against --baseline.",
+        )
+
+    def handle(self, *args, **options):
+        mix = _parse_mix(options["mix"])
+        # One log line per request would skew the numbers being measured.
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+        wallets = [
+            str(wallet_uuid)
+            for wallet_uuid in Wallet.objects.filter(balance__gt=0)
+            .order_by("?")
+            .values_list("uuid", flat=True)[: options["wallets"]]
+        ]
+        if not wallets:
+            raise CommandError("No funded wallets; run seed_wallets first.")
+
+        seconds = options["warmup"] + options["duration"]
+        total = int(options["rps"] * seconds)
+        operations = random.choices(
+            list(mix), weights=list(mix.values()), k=total
+        )
+        users = self.create_users(operations.count("create"))
+
+        client = httpx.Client(
+            base_url=options["base_url"],
+            timeout=options["timeout"],
+            limits=httpx.Limits(max_connections=options["concurrency"]),
+        )
+        workload = Workload(client, wallets, users, options["withdraw_delay"])
+        samples = {operation: [] for operation in mix}
+        lock = threading.Lock()
+
+        def send(operation, due, measured):
+            try:
+                status = workload.run(operation)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latency = time.perf_counter() - due
+            if status is not None and measured:
+                with lock:
+                    samples[operation].append((status, latency))
+
+        interval = 1 / options["rps"]
+        started = time.perf_counter()
+        measure_from = started + options["warmup"]
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            for i, operation in enumerate(operations):
+                due = started + i * interval
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(send, operation, due, due >= measure_from)
+        elapsed = time.perf_counter() - measure_from
+        client.close()
+
+        report = {
+            "label": options["label"],
+            "started_at": timezone.now().isoformat(),
+            "base_url": options["base_url"],
+            "target_rps": options["rps"],
+            "duration": options["duration"],
+            "concurrency": options["concurrency"],
+            "mix": mix,
+            "total": _summarise(
+                [sample for group in samples.values() for sample in group],
+                elapsed,
+            ),
+            "operations": {
+                operation: _summarise(group, elapsed)
+                for operation, group in samples.items()
+            },
+        }
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output)
+        self.stdout.write(output)
+
+        if options["baseline"]:
+            with open(options["baseline"]) as f:
+                baseline = json.load(f)
+            regressions = self.compare(
+                baseline, report, options["max_regression"]
+            )
+            for regression in regressions:
+                self.stderr.write(regression)
+            if regressions:
+                raise CommandError(
+                    f"{len(regressions)} regression(s) against the baseline"
+                )
+
+    def create_users(self, count):
+        # Users without a wallet, for the create operation.
+        run = uuid.uuid4().hex[:8]
+        users = get_user_model().objects.bulk_create(
+            [
+                get_user_model()(username=f"bench-{run}-{i}", password="!")
+                for i in range(count)
+            ]
+        )
+        return [user.pk for user in users]
+
+    def compare(self, baseline, report, tolerance):
+        regressions = []
+        for name, current in [("total", report["total"])] + list(
+            report["operations"].items()
+        ):
+            previous = (
+                baseline["total"]
+                if name == "total"
+                else baseline["operations"].get(name)
+            )
+            if not previous or "latency_ms" not in previous:
+                continue
+            for metric in ("p95", "p99"):
+                before = previous["latency_ms"][metric]
+                after = current.get("latency_ms", {}).get(metric)
+                if after is not None and after > before * (1 + tolerance):
+                    regressions.append(
+                        f"{name} {metric}: {before:.1f}ms -> {after:.1f}ms"
+                    )
+            if current["throughput"] < previous["throughput"] * (
+                1 - tolerance
+            ):
+                regressions.append(
+                    f"{name} throughput: {previous['throughput']:.1f}/s -> "
+                    f"{current['throughput']:.1f}/s"
+                )
+        return regressions
@@ -0,0 +1,133 @@
+import multiprocessing
+import random
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from wallets.models import Wallet
+from wallets.services.balance import (
+    InsufficientFundsError,
+    credit_wallet,
+    debit_wallet,
+)
+
+
+def _atomic_worker(wallet_id, operations, amount, seed):
+    wallet = Wallet.objects.get(pk=wallet_id)
+    rng = random.Random(seed)
+    credited = debited = rejected = 0
+    for _ in range(operations):
+        with transaction.atomic():
+            if rng.random() < 0.5:
+                credit_wallet(wallet, amount)
+                credited += 1
+                continue
+            try:
+                debit_wallet(wallet, amount)
+                debited += 1
+            except InsufficientFundsError:
+                rejected += 1
+    connections.close_all()
+    return credited, debited, rejected
+
+
+def _naive_worker(wallet_id, operations, amount, seed):
+    # The read-modify-write pattern the services used before, kept for
+    # comparison: it loses updates as soon as processes interleave.
+    rng = random.Random(seed)
+    credited = debited = rejected = 0
+    for _ in range(operations):
+        with transaction.atomic():
+            wallet = Wallet.objects.get(pk=wallet_id)
+            if rng.random() < 0.5:
+                wallet.balance += amount
+                credited += 1
+            elif wallet.balance >= amount:
+                wallet.balance -= amount
+                debited += 1
+            else:
+                rejected += 1
+                continue
+            wallet.save(update_fields=["balance"])
+    connections.close_all()
+    return credited, debited, rejected
+
+
+WORKERS = {"atomic": _atomic_worker, "naive": _naive_worker}
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer a single wallet from many processes and check that the "
+        "final balance matches the sum of the applied operations."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            default="1,2,4,8",
+            help="Comma separated process counts to run, one round each.",
+        )
+        parser.add_argument(
+            "--operations",
+            type=int,
+            default=500,
+            help="Operations per process.",
+        )
+        parser.add_argument("--amount", type=int, default=10)
+        parser.add_argument(
+            "--strategy", choices=sorted(WORKERS), default="atomic"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            rounds = [int(n) for n in options["processes"].split(",")]
+        except ValueError:
+            raise CommandError("--processes must be a list of integers")
+
+        user = get_user_model().objects.create(
+            username=f"bench-{uuid.uuid4().hex[:12]}"
+        )
+        wallet = Wallet.objects.create(user=user)
+        worker = WORKERS[options["strategy"]]
+        amount = options["amount"]
+        failed = False
+
+        # The wallet is kept afterwards: its ledger entries are append-only.
+        self.stdout.write(f"wallet={wallet.uuid}")
+        for processes in rounds:
+            started_with = Wallet.objects.get(pk=wallet.pk).balance
+            jobs = [
+                (wallet.pk, options["operations"], amount, seed)
+                for seed in range(processes)
+            ]
+            # Children must open their own database connections.
+            connections.close_all()
+            context = multiprocessing.get_context("fork")
+            started = time.perf_counter()
+            with context.Pool(processes) as pool:
+                results = pool.starmap(worker, jobs)
+            elapsed = time.perf_counter() - started
+
+            credited = sum(result[0] for result in results)
+            debited = sum(result[1] for result in results)
+            rejected = sum(result[2] for result in results)
+            expected = started_with + (credited - debited) * amount
+            actual = Wallet.objects.get(pk=wallet.pk).balance
+            exact = actual == expected
+            failed = failed or not exact
+
+            self.stdout.write(
+                f"processes={processes} "
+                f"ops={credited + debited + rejected} "
+                f"rejected_debits={rejected} "
+                f"ops_per_sec={(credited + debited + rejected) / elapsed:.0f} "
+                f"expected={expected} actual={actual} "
+                + ("OK" if exact else "LOST UPDATES")
+            )
+
+        if failed:
+            raise CommandError("Final balance did not match the operations")
@@ -0,0 +1,187 @@
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from io import BytesIO
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from prometheus_client import REGISTRY
+
+from wallets.models import Wallet
+
+MODES = ("off", "persistent", "pool")
+
+
+def _percentile(values, q):
+    # Nearest-rank percentile over already sorted values.
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+def _sample(name):
+    return REGISTRY.get_sample_value(name, {"database": DEFAULT_DB_ALIAS}) or 0
+
+
+class Command(BaseCommand):
+    help = (
+        "Send retrieve and deposit requests through the full request cycle "
+        "with each connection mode in turn, and report latency and the "
+        "connections each mode opened as JSON. With --thread-per-request "
+        "every request runs in a thread of its own, as under a "
+        "thread-per-request server such as runserver."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=500,
+            help="Requests of each operation per mode.",
+        )
+        parser.add_argument(
+            "--modes",
+            default=",".join(MODES),
+            help="Comma separated modes to run, from off, persistent, pool.",
+        )
+        parser.add_argument(
+            "--thread-per-request",
+            action="store_true",
+            help="Run each request in a new thread that exits afterwards.",
+        )
+        parser.add_argument("--output", help="Write the report here.")
+
+    def handle(self, *args, **options):
+        modes = [mode.strip() for mode in options["modes"].split(",")]
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f"Unknown modes: {', '.join(sorted(unknown))}")
+        wallets = [
+            str(wallet_uuid)
+            for wallet_uuid in Wallet.objects.filter(balance__gt=0)
+            .order_by("?")
+            .values_list("uuid", flat=True)[:100]
+        ]
+        if not wallets:
+            raise CommandError("No funded wallets; run seed_wallets first.")
+
+        connection = connections[DEFAULT_DB_ALIAS]
+        original = dict(connection.settings_dict)
+        handler = WSGIHandler()
+        report = {
+            "thread_per_request": options["thread_per_request"],
+            "requests": options["requests"],
+            "modes": {},
+        }
+        try:
+            with override_settings(ALLOWED_HOSTS=["testserver"]):
+                for mode in modes:
+                    self.configure(connection, original, mode)
+                    report["modes"][mode] = self.run(
+                        handler,
+                        wallets,
+                        options["requests"],
+                        options["thread_per_request"],
+                    )
+        finally:
+            connection.close()
+            connection.settings_dict.clear()
+            connection.settings_dict.update(original)
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output)
+        self.stdout.write(output)
+
+    def configure(self, connection, original, mode):
+        # The same settings DATABASE_POOL["MODE"] produces, applied to the
+        # live connection; settings are read each time it connects.
+        connection.close()
+        connection.settings_dict.clear()
+        connection.settings_dict.update(original)
+        connection.settings_dict.pop("POOL", None)
+        connection.settings_dict["CONN_MAX_AGE"] = (
+            settings.DATABASE_POOL["CONN_MAX_AGE"]
+            if mode == "persistent"
+            else 0
+        )
+        connection.settings_dict["CONN_HEALTH_CHECKS"] = mode != "off"
+        if mode == "pool":
+            connection.settings_dict["POOL"] = {
+                key: settings.DATABASE_POOL[key]
+                for key in ("MAX_SIZE", "TIMEOUT", "MAX_IDLE")
+            }
+
+    def run(self, handler, wallets, count, thread_per_request):
+        factory = RequestFactory()
+        latencies = {"retrieve": [], "deposit": []}
+        errors = 0
+        opened = _sample("wallet_db_connections_opened_total")
+        connecting = _sample("wallet_db_connect_duration_seconds_sum")
+
+        def environ(operation):
+            wallet = random.choice(wallets)
+            if operation == "retrieve":
+                request = factory.get(f"/api/wallets/{wallet}/")
+            else:
+                request = factory.post(
+                    f"/api/wallets/{wallet}/deposit",
+                    data=json.dumps({"amount": 1}),
+                    content_type="application/json",
+                    HTTP_IDEMPOTENCY_KEY=uuid.uuid4().hex,
+                )
+            # RequestFactory requests skip the handler; the environ doesn't.
+            environ = dict(request.environ)
+            environ["wsgi.input"] = BytesIO(request.body)
+            return environ
+
+        def send(operation):
+            nonlocal errors
+            started = time.perf_counter()
+            response = handler(environ(operation), lambda *args: None)
+            b"".join(response)
+            response.close()
+            latencies[operation].append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+        def send_in_thread(operation):
+            def target():
+                send(operation)
+                # The thread is gone after this, so is its connection.
+                connections.close_all()
+
+            thread = threading.Thread(target=target)
+            thread.start()
+            thread.join()
+
+        operations = ["retrieve", "deposit"] * count
+        random.shuffle(operations)
+        for operation in operations:
+            (send_in_thread if thread_per_request else send)(operation)
+        if not thread_per_request:
+            connections.close_all()
+
+        opened = _sample("wallet_db_connections_opened_total") - opened
+        connecting = (
+            _sample("wallet_db_connect_duration_seconds_sum") - connecting
+        )
+        result = {
+            "errors": errors,
+            "connections_opened": opened,
+            "connect_seconds": connecting,
+        }
+        for operation, values in latencies.items():
+            values.sort()
+            result[operation] = {
+                "mean": sum(values) / len(values) * 1000,
+                "p50": _percentile(values, 0.50) * 1000,
+                "p95": _percentile(values, 0.95) * 1000,
+            }
+        return result
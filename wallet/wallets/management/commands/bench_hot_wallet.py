@@ -0,0 +1,92 @@
+import multiprocessing
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from wallets.models import Transaction, Wallet
+from wallets.services.balance import credit_wallet
+from wallets.services.shards import set_shard_count
+
+
+def _deposit_worker(wallet_id, deposits, amount):
+    # The same writes a settled deposit makes: the transaction row, the
+    # balance change and its ledger entries, all in one transaction.
+    wallet = Wallet.objects.get(pk=wallet_id)
+    for _ in range(deposits):
+        with transaction.atomic():
+            deposit = Transaction.objects.create(
+                wallet=wallet,
+                type=Transaction.TypeChoices.DEPOSIT,
+                amount=amount,
+                status=Transaction.StatusChoices.SUCCESS,
+            )
+            credit_wallet(wallet, amount, transaction=deposit)
+    connections.close_all()
+    return deposits
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare deposit throughput on one hot wallet with its balance on a "
+        "single row and spread across balance shards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=16)
+        parser.add_argument(
+            "--deposits",
+            type=int,
+            default=200,
+            help="Deposits made by each process.",
+        )
+        parser.add_argument("--shards", type=int, default=16)
+        parser.add_argument("--amount", type=int, default=10)
+
+    def handle(self, *args, **options):
+        if options["shards"] < 1:
+            raise CommandError("--shards must be at least 1")
+
+        results = {}
+        for shard_count in (0, options["shards"]):
+            results[shard_count] = self.run(shard_count, options)
+
+        baseline = results[0]
+        sharded = results[options["shards"]]
+        self.stdout.write(f"speedup={sharded / baseline:.2f}x")
+
+    def run(self, shard_count, options):
+        user = get_user_model().objects.create(
+            username=f"bench-{uuid.uuid4().hex[:12]}"
+        )
+        # The wallet is kept afterwards: its ledger entries are append-only.
+        wallet = set_shard_count(Wallet.objects.create(user=user), shard_count)
+        jobs = [(wallet.pk, options["deposits"], options["amount"])] * options[
+            "processes"
+        ]
+
+        # Children must open their own database connections.
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        started = time.perf_counter()
+        with context.Pool(options["processes"]) as pool:
+            deposits = sum(pool.starmap(_deposit_worker, jobs))
+        elapsed = time.perf_counter() - started
+
+        wallet.refresh_from_db()
+        expected = deposits * options["amount"]
+        actual = wallet.total_balance
+        if actual != expected:
+            raise CommandError(
+                f"shards={shard_count}: expected={expected} actual={actual}"
+            )
+
+        throughput = deposits / elapsed
+        self.stdout.write(
+            f"wallet={wallet.uuid} shards={shard_count} "
+            f"processes={options['processes']} deposits={deposits} "
+            f"deposits_per_sec={throughput:.0f}"
+        )
+        return throughput
@@ -0,0 +1,308 @@
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max, Q, Sum
+from django.db.models.functions import TruncSecond
+from django.utils import timezone
+
+from wallets.models import (
+    BalanceSnapshot,
+    LedgerEntry,
+    OutboxMessage,
+    Transaction,
+    Wallet,
+)
+from wallets.pagination import TransactionKeysetPagination
+from wallets.services.partitions import (
+    create_partitions,
+    partition_name,
+    transaction_partitions,
+)
+
+SEED_PREFIX = "plancheck-"
+SEED_BATCH = 1_000_000
+# A sequential scan of a table or partition this small (in 8kB pages) is
+# cheaper than any index and is what the planner should pick.
+SMALL_TABLE_PAGES = 100
+
+
+def _hot_queries(wallet_id, now):
+    # Mirrors the keyset history page (TransactionKeysetPagination), the
+    # outbox and due-withdrawal claims (outbox._claim and
+    # settle_withdrawals._claim), the dispatcher's window and the ledger
+    # snapshot and tail reads (ledger_balances).
+    page_size = TransactionKeysetPagination.page_size
+    pending_withdrawals = Transaction.objects.filter(
+        type=Transaction.TypeChoices.WITHDRAWAL,
+        status=Transaction.StatusChoices.PENDING,
+    )
+    return {
+        "history page": Transaction.objects.filter(wallet_id=wallet_id)
+        .filter(created_at__lte=now)
+        .filter(Q(created_at__lt=now) | Q(id__lt=2**62))
+        .order_by("-created_at", "-id")[: page_size + 1],
+        "outbox claim": OutboxMessage.objects.filter(
+            status=OutboxMessage.StatusChoices.PENDING,
+            next_attempt_at__lte=now,
+        )
+        .select_for_update(skip_locked=True, of=("self",))
+        .order_by("next_attempt_at")[:100],
+        "due withdrawal claim": pending_withdrawals.filter(
+            scheduled_for__lte=now
+        )
+        .select_for_update(skip_locked=True, of=("self",))
+        .order_by("scheduled_for")[:100],
+        "dispatch window": pending_withdrawals.filter(
+            scheduled_for__lt=now + timedelta(minutes=1)
+        )
+        .annotate(due_at=TruncSecond("scheduled_for"))
+        .values_list("due_at", flat=True)
+        .distinct()
+        .order_by("due_at"),
+        "balance snapshot": BalanceSnapshot.objects.filter(
+            wallet_id__in=[wallet_id]
+        )
+        .order_by("wallet_id", "-created_at")
+        .distinct("wallet_id")
+        .values_list("wallet_id", "balance", "last_entry_id"),
+        "ledger tail": LedgerEntry.objects.filter(
+            account=LedgerEntry.AccountChoices.WALLET,
+            wallet_id=wallet_id,
+            id__gt=0,
+        )
+        .values("wallet_id")
+        .annotate(total=Sum("amount"), last_entry_id=Max("id"))
+        .values_list("wallet_id", "total", "last_entry_id"),
+        "transaction by uuid": Transaction.objects.filter(uuid=uuid.uuid4()),
+    }
+
+
+def _walk(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _walk(child)
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the hot queries and fail if any of them scans a table or "
+        "partition sequentially; each query lists the indexes it uses and "
+        "how many partitions it read. With --seed, first fills the "
+        "database with synthetic wallets and transactions; only use a "
+        "scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            metavar="ROWS",
+            help="Insert this many synthetic transactions first, "
+            "e.g. 10000000.",
+        )
+        parser.add_argument(
+            "--wallets",
+            type=int,
+            default=100_000,
+            help="Number of synthetic wallets to spread --seed rows over.",
+        )
+        parser.add_argument(
+            "--cleanup",
+            action="store_true",
+            help="Delete the synthetic data once the check has run.",
+        )
+
+    def handle(self, *args, **options):
+        if options["seed"]:
+            self._seed(options["wallets"], options["seed"])
+
+        wallet_id = (
+            Wallet.objects.filter(user__username__startswith=SEED_PREFIX)
+            .values_list("id", flat=True)
+            .first()
+            or Wallet.objects.values_list("id", flat=True).first()
+        )
+        if wallet_id is None:
+            raise CommandError("No wallets to check against, use --seed.")
+
+        partitions = {
+            partition_name(month) for month in transaction_partitions()
+        }
+        tables = {
+            model._meta.db_table
+            for model in (
+                Transaction,
+                OutboxMessage,
+                LedgerEntry,
+                BalanceSnapshot,
+            )
+        } | partitions
+        failures = []
+        # The claims lock what they select even under EXPLAIN; the
+        # transaction releases those locks as soon as the check is done.
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT relname FROM pg_class "
+                "WHERE relname = ANY(%s) AND relpages < %s",
+                [list(tables), SMALL_TABLE_PAGES],
+            )
+            small = {name for name, in cursor.fetchall()}
+            # Each partition has its own copy of every index; they are
+            # reported under the name of the index on the table.
+            cursor.execute(
+                "SELECT c.relname, p.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relkind = 'I'"
+            )
+            parent_indexes = dict(cursor.fetchall())
+            for name, queryset in _hot_queries(
+                wallet_id, timezone.now()
+            ).items():
+                sql, params = queryset.query.sql_with_params()
+                # Run, not just planned, so partitions the executor skipped
+                # (pruned at run time, or never reached under a LIMIT) are
+                # told apart from those it read.
+                cursor.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", params)
+                nodes = list(_walk(cursor.fetchone()[0][0]["Plan"]))
+                seq_scans = [
+                    node
+                    for node in nodes
+                    if node["Node Type"] == "Seq Scan"
+                    and node.get("Relation Name") in tables - small
+                ]
+                planned = {
+                    node["Relation Name"]
+                    for node in nodes
+                    if node.get("Relation Name") in partitions
+                }
+                read = {
+                    node["Relation Name"]
+                    for node in nodes
+                    if node.get("Relation Name") in partitions
+                    and node["Actual Loops"]
+                }
+                indexes = sorted(
+                    {
+                        parent_indexes.get(
+                            node["Index Name"], node["Index Name"]
+                        )
+                        for node in nodes
+                        if "Index Name" in node
+                    }
+                )
+                if seq_scans:
+                    failures.append(name)
+                    self.stdout.write(
+                        self.style.ERROR(f"{name}: sequential scan")
+                    )
+                elif planned:
+                    self.stdout.write(
+                        self.style.SUCCESS(
+                            f"{name}: {', '.join(indexes)} "
+                            f"({len(read)} of {len(planned)} partitions read)"
+                        )
+                    )
+                else:
+                    self.stdout.write(
+                        self.style.SUCCESS(f"{name}: {', '.join(indexes)}")
+                    )
+
+        if options["cleanup"]:
+            self._cleanup()
+
+        if failures:
+            raise CommandError(f"Sequential scan in: {', '.join(failures)}")
+
+    def _seed(self, wallets, rows):
+        user_table = Wallet._meta.get_field("user").related_model._meta
+        started = time.perf_counter()
+        create_partitions(since=timezone.now() - timedelta(days=365))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {user_table.db_table} (password, is_superuser, "
+                "username, first_name, last_name, email, is_staff, "
+                "is_active, date_joined) "
+                "SELECT '!', false, %s || g, '', '', '', false, true, now() "
+                "FROM generate_series(1, %s) g",
+                [f"{SEED_PREFIX}{uuid.uuid4().hex[:8]}-", wallets],
+            )
+            cursor.execute(
+                f"INSERT INTO {Wallet._meta.db_table} (uuid, balance, "
+                "reserved_amount, shard_count, created_at, user_id) "
+                "SELECT gen_random_uuid(), 1000000, 0, 0, now(), u.id "
+                f"FROM {user_table.db_table} u "
+                f"LEFT JOIN {Wallet._meta.db_table} w ON w.user_id = u.id "
+                "WHERE u.username LIKE %s AND w.id IS NULL",
+                [f"{SEED_PREFIX}%"],
+            )
+        self.stdout.write(f"Seeded {wallets} wallets")
+
+        for offset in range(0, rows, SEED_BATCH):
+            batch = min(SEED_BATCH, rows - offset)
+            with transaction.atomic(), connection.cursor() as cursor:
+                # Roughly half deposits, half withdrawals; 1% of withdrawals
+                # still pending and due somewhere within +/- 15 days.
+                cursor.execute(
+                    "WITH seeded AS ("
+                    f"  SELECT array_agg(w.id) AS ids "
+                    f"  FROM {Wallet._meta.db_table} w "
+                    f"  JOIN {user_table.db_table} u ON u.id = w.user_id "
+                    "   WHERE u.username LIKE %s"
+                    "), generated AS ("
+                    "  SELECT CASE WHEN random() < 0.5 THEN 'D' ELSE 'W' END "
+                    "         AS type, "
+                    "         now() - random() * interval '365 days' "
+                    "         AS created_at, "
+                    "         seeded.ids[1 + g %% array_length(seeded.ids, 1)]"
+                    "         AS wallet_id "
+                    "  FROM generate_series(1, %s) g, seeded"
+                    ") "
+                    f"INSERT INTO {Transaction._meta.db_table} (uuid, type, "
+                    "scheduled_for, status, amount, created_at, wallet_id) "
+                    "SELECT gen_random_uuid(), type, "
+                    "       CASE WHEN type = 'W' THEN now() + "
+                    "       (random() - 0.5) * interval '30 days' END, "
+                    "       CASE WHEN type = 'W' AND random() < 0.01 THEN 'P' "
+                    "            WHEN random() < 0.1 THEN 'F' ELSE 'S' END, "
+                    "       1 + (random() * 10000)::bigint, created_at, "
+                    "       wallet_id "
+                    "FROM generated",
+                    [f"{SEED_PREFIX}%", batch],
+                )
+            self.stdout.write(
+                f"Seeded {offset + batch}/{rows} transactions "
+                f"({time.perf_counter() - started:.0f}s)"
+            )
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Transaction._meta.db_table}")
+            cursor.execute(f"ANALYZE {Wallet._meta.db_table}")
+
+    def _cleanup(self):
+        user_table = Wallet._meta.get_field("user").related_model._meta
+        seeded_wallets = (
+            f"SELECT w.id FROM {Wallet._meta.db_table} w "
+            f"JOIN {user_table.db_table} u ON u.id = w.user_id "
+            "WHERE u.username LIKE %s"
+        )
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {Transaction._meta.db_table} "
+                f"WHERE wallet_id IN ({seeded_wallets})",
+                [f"{SEED_PREFIX}%"],
+            )
+            cursor.execute(
+                f"DELETE FROM {Wallet._meta.db_table} "
+                f"WHERE id IN ({seeded_wallets})",
+                [f"{SEED_PREFIX}%"],
+            )
+            cursor.execute(
+                f"DELETE FROM {user_table.db_table} WHERE username LIKE %s",
+                [f"{SEED_PREFIX}%"],
+            )
+        self.stdout.write("Removed synthetic data")
@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from wallets.services.partitions import (
+    create_partitions,
+    partition_name,
+    transaction_partitions,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the monthly Transaction partitions from the current month "
+        "to --months-ahead months from now, or from --days-back days ago "
+        "for backdated rows, and list the partitions attached."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=settings.TRANSACTION_PARTITIONS["MONTHS_AHEAD"],
+        )
+        parser.add_argument(
+            "--days-back",
+            type=int,
+            default=0,
+            help="Also cover months this many days in the past.",
+        )
+
+    def handle(self, *args, **options):
+        created = create_partitions(
+            options["months_ahead"],
+            since=timezone.now() - timedelta(days=options["days_back"]),
+        )
+        for name in created:
+            self.stdout.write(self.style.SUCCESS(f"Created {name}"))
+        months = transaction_partitions()
+        self.stdout.write(
+            f"{len(months)} partitions attached: "
+            f"{partition_name(months[0])} to {partition_name(months[-1])}"
+            if months
+            else "No partitions attached."
+        )
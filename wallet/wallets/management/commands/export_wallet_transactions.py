@@ -0,0 +1,49 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from wallets.exports import CHUNK_SIZE, EXPORT_FORMATS, transaction_rows
+from wallets.models import Wallet
+from wallets.routers import replica_reads
+
+
+class Command(BaseCommand):
+    help = "Stream a wallet's full transaction history as CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("wallet_uuid")
+        parser.add_argument(
+            "--format", choices=sorted(EXPORT_FORMATS), default="csv"
+        )
+        parser.add_argument(
+            "--output", help="File to write to instead of stdout."
+        )
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        with replica_reads():
+            self.export(options)
+
+    def export(self, options):
+        try:
+            wallet = Wallet.objects.get(uuid=options["wallet_uuid"])
+        except Wallet.DoesNotExist:
+            raise CommandError("Wallet not found")
+
+        render, _ = EXPORT_FORMATS[options["format"]]
+        chunks = render(
+            transaction_rows(wallet, options["chunk_size"]),
+            options["chunk_size"],
+        )
+
+        output = (
+            open(options["output"], "w", newline="")
+            if options["output"]
+            else sys.stdout
+        )
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
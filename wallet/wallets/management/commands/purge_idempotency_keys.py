@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from wallets.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete idempotency keys older than the retention window."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-hours",
+            type=int,
+            default=24,
+            help="Keys created before this many hours ago are removed.",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options["older_than_hours"])
+        deleted, _ = IdempotencyKey.objects.filter(
+            created_at__lt=cutoff
+        ).delete()
+        self.stdout.write(f"Deleted {deleted} idempotency key(s).")
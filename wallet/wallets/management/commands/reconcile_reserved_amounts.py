@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from wallets.models import Transaction, Wallet
+
+
+def _pending_total(wallet_ref):
+    return Coalesce(
+        Subquery(
+            Transaction.objects.filter(
+                wallet=wallet_ref,
+                type=Transaction.TypeChoices.WITHDRAWAL,
+                status=Transaction.StatusChoices.PENDING,
+            )
+            .values("wallet")
+            .annotate(total=Sum("amount"))
+            .values("total")
+        ),
+        Value(0),
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute Wallet.reserved_amount from pending withdrawals and "
+        "report wallets that drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Overwrite drifted reserved amounts with the recomputed sum.",
+        )
+
+    def handle(self, *args, **options):
+        drifted = (
+            Wallet.objects.annotate(expected=_pending_total(OuterRef("pk")))
+            .exclude(reserved_amount=F("expected"))
+            .values_list("id", "uuid", "reserved_amount", "expected")
+        )
+
+        count = 0
+        for wallet_id, wallet_uuid, reserved, expected in drifted.iterator():
+            count += 1
+            self.stdout.write(
+                f"{wallet_uuid}: reserved_amount={reserved} "
+                f"pending={expected} drift={reserved - expected}"
+            )
+            if options["fix"]:
+                # Lock the wallet before summing: reserve/release update the
+                # same row, so no concurrent change can slip in between.
+                with transaction.atomic():
+                    Wallet.objects.select_for_update().filter(
+                        id=wallet_id
+                    ).first()
+                    Wallet.objects.filter(id=wallet_id).update(
+                        reserved_amount=_pending_total(wallet_id)
+                    )
+
+        if not count:
+            self.stdout.write(self.style.SUCCESS("No drift found."))
+        elif options["fix"]:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {count} wallet(s)."))
+        else:
+            self.stdout.write(
+                self.style.WARNING(f"{count} wallet(s) drifted.")
+            )
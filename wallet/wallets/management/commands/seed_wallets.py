@@ -0,0 +1,149 @@
+import random
+import time
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from wallets.models import Transaction, Wallet
+from wallets.services.ledger import post_entries
+from wallets.services.partitions import create_partitions
+
+# Distinct from check_query_plans' prefix, whose --cleanup must not remove
+# these wallets.
+SEED_PREFIX = "loadseed-"
+
+
+def _history(rng, transactions):
+    # A plausible history: withdrawals never take a wallet below zero and a
+    # few transactions failed or were cancelled along the way.
+    balance, history = 0, []
+    for _ in range(transactions):
+        if balance and rng.random() < 0.4:
+            kind = Transaction.TypeChoices.WITHDRAWAL
+            amount = rng.randint(1, balance)
+        else:
+            kind = Transaction.TypeChoices.DEPOSIT
+            amount = rng.randint(100, 100_000)
+
+        roll = rng.random()
+        if roll < 0.03:
+            status = Transaction.StatusChoices.FAILED
+        elif roll < 0.05 and kind == Transaction.TypeChoices.WITHDRAWAL:
+            status = Transaction.StatusChoices.CANCELED
+        else:
+            status = Transaction.StatusChoices.SUCCESS
+            balance += (
+                amount if kind == Transaction.TypeChoices.DEPOSIT else -amount
+            )
+        history.append((kind, amount, status))
+    return balance, history
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed wallets with a settled transaction history, for benchmarks. "
+        "Balances and ledger entries agree, so audit_ledger stays clean."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--wallets", type=int, default=10_000)
+        parser.add_argument(
+            "--transactions",
+            type=int,
+            default=50,
+            help="Transactions per wallet.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Wallets written per database transaction.",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=365,
+            help="Spread transaction timestamps over this many past days.",
+        )
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        if options["wallets"] < 1 or options["batch_size"] < 1:
+            raise CommandError("--wallets and --batch-size must be positive")
+
+        # Backdated rows need a partition for every month they land in.
+        create_partitions(
+            since=timezone.now() - timedelta(days=options["days"])
+        )
+        rng = random.Random(options["seed"])
+        run = uuid.uuid4().hex[:8]
+        started = time.perf_counter()
+        seeded = created = 0
+        while seeded < options["wallets"]:
+            size = min(options["batch_size"], options["wallets"] - seeded)
+            created += self.seed_batch(
+                rng, run, seeded, size, options["transactions"], options
+            )
+            seeded += size
+            self.stdout.write(f"wallets={seeded} transactions={created}")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"run={run} wallets={seeded} transactions={created} "
+            f"seconds={elapsed:.1f}"
+        )
+
+    def seed_batch(self, rng, run, offset, size, transactions, options):
+        histories = [_history(rng, transactions) for _ in range(size)]
+        with transaction.atomic():
+            users = get_user_model().objects.bulk_create(
+                [
+                    get_user_model()(
+                        username=f"{SEED_PREFIX}{run}-{offset + i}",
+                        password="!",
+                    )
+                    for i in range(size)
+                ]
+            )
+            wallets = Wallet.objects.bulk_create(
+                [
+                    Wallet(user=user, balance=balance)
+                    for user, (balance, _) in zip(users, histories)
+                ]
+            )
+            rows = Transaction.objects.bulk_create(
+                [
+                    Transaction(
+                        wallet=wallet, type=kind, amount=amount, status=status
+                    )
+                    for wallet, (_, history) in zip(wallets, histories)
+                    for kind, amount, status in history
+                ],
+                batch_size=5000,
+            )
+            post_entries(
+                (
+                    row.wallet,
+                    (
+                        row.amount
+                        if row.type == Transaction.TypeChoices.DEPOSIT
+                        else -row.amount
+                    ),
+                    row,
+                )
+                for row in rows
+                if row.status == Transaction.StatusChoices.SUCCESS
+            )
+            # created_at is auto_now_add, so backdate it afterwards.
+            Transaction.objects.filter(id__in=[row.id for row in rows]).update(
+                created_at=RawSQL(
+                    "now() - random() * %s::interval",
+                    (f"{options['days']} days",),
+                )
+            )
+        return len(rows)
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from wallets.models import Wallet
+from wallets.services.shards import set_shard_count
+
+
+class Command(BaseCommand):
+    help = (
+        "Spread a hot wallet's balance across N sub-counters so concurrent "
+        "deposits stop queueing on its row; 0 folds it back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("wallet_uuid")
+        parser.add_argument("shard_count", type=int)
+
+    def handle(self, *args, **options):
+        wallet = Wallet.objects.filter(uuid=options["wallet_uuid"]).first()
+        if wallet is None:
+            raise CommandError("Wallet not found")
+        try:
+            set_shard_count(wallet, options["shard_count"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{wallet.uuid}: shard_count={wallet.shard_count} "
+                f"balance={wallet.total_balance}"
+            )
+        )
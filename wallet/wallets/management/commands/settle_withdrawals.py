@@ -0,0 +1,63 @@
+import multiprocessing
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from wallets.services.settle_withdrawals import settle_due_withdrawals
+
+
+def _run(chunk_size, interval, once):
+    while True:
+        while settle_due_withdrawals(chunk_size):
+            pass
+        if once:
+            break
+        time.sleep(interval)
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Settle due withdrawals in batches. Several workers (or several "
+        "copies of this command) can run side by side; each claims its "
+        "own chunk with SELECT ... FOR UPDATE SKIP LOCKED."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=1)
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=settings.WITHDRAWAL_SETTLEMENT["CHUNK_SIZE"],
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.WITHDRAWAL_SETTLEMENT["INTERVAL"],
+            help="Seconds to sleep once no due withdrawals are left.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no due withdrawals are left.",
+        )
+
+    def handle(self, *args, **options):
+        job = (options["chunk_size"], options["interval"], options["once"])
+        if options["workers"] == 1:
+            _run(*job)
+            return
+
+        # Children must open their own database connections.
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        workers = [
+            context.Process(target=_run, args=job)
+            for _ in range(options["workers"])
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
@@ -0,0 +1,179 @@
+import atexit
+import multiprocessing.util
+import os
+
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    multiprocess,
+)
+
+# Latency buckets in seconds, from a cached read up to a provider timeout.
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+)
+
+
+PROVIDER_BREAKER_STATE = Gauge(
+    "wallet_provider_breaker_state",
+    "Provider circuit breaker state: 0 closed, 1 half-open, 2 open.",
+    ["breaker"],
+    multiprocess_mode="livemax",
+)
+PROVIDER_BREAKER_TRANSITIONS = Counter(
+    "wallet_provider_breaker_transitions_total",
+    "Provider circuit breaker state changes.",
+    ["breaker", "state"],
+)
+PROVIDER_REJECTED_CALLS = Counter(
+    "wallet_provider_rejected_calls_total",
+    "Provider calls refused before they were sent.",
+    ["breaker", "reason"],
+)
+PROVIDER_IN_FLIGHT = Gauge(
+    "wallet_provider_in_flight",
+    "Provider calls currently holding a concurrency slot.",
+    ["limiter"],
+    multiprocess_mode="livesum",
+)
+PROVIDER_CONCURRENCY_LIMIT = Gauge(
+    "wallet_provider_concurrency_limit",
+    "Current adaptive limit on concurrent provider calls.",
+    ["limiter"],
+    multiprocess_mode="livemax",
+)
+PROVIDER_CALL_DURATION = Histogram(
+    "wallet_provider_call_duration_seconds",
+    "Provider call latency, from sending the request to its outcome.",
+    ["provider", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "wallet_http_request_duration_seconds",
+    "Time spent serving a request, by view.",
+    ["view", "method", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_REQUEST_DB_QUERIES = Histogram(
+    "wallet_http_request_db_queries",
+    "Database queries made while serving a request.",
+    ["view"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+HTTP_REQUEST_DB_DURATION = Histogram(
+    "wallet_http_request_db_duration_seconds",
+    "Time spent in database queries while serving a request.",
+    ["view"],
+    buckets=LATENCY_BUCKETS,
+)
+
+CELERY_TASK_QUEUE_LAG = Histogram(
+    "wallet_celery_task_queue_lag_seconds",
+    "Delay between when a task was due (its ETA, or when it was sent) and "
+    "when a worker started it.",
+    ["task"],
+    buckets=LATENCY_BUCKETS + (60, 300),
+)
+CELERY_TASK_DURATION = Histogram(
+    "wallet_celery_task_duration_seconds",
+    "Task run time.",
+    ["task", "state"],
+    buckets=LATENCY_BUCKETS + (60, 300),
+)
+
+BALANCE_CACHE_LOOKUPS = Counter(
+    "wallet_balance_cache_lookups_total",
+    "Balance cache reads by where they were answered: local (in-process), "
+    "hit (shared cache) or miss (database).",
+    ["result"],
+)
+
+OUTBOX_DELIVERIES = Counter(
+    "wallet_outbox_deliveries_total",
+    "Outbox delivery attempts by result.",
+    ["result"],
+)
+
+LOG_RECORDS_DROPPED = Counter(
+    "wallet_log_records_dropped_total",
+    "Log records dropped because the write-behind queue was full.",
+)
+
+DB_CONNECTIONS_OPENED = Counter(
+    "wallet_db_connections_opened_total",
+    "New database connections, by alias.",
+    ["database"],
+)
+DB_CONNECT_DURATION = Histogram(
+    "wallet_db_connect_duration_seconds",
+    "Time taken to open a database connection.",
+    ["database"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_HEALTH_CHECK_FAILURES = Counter(
+    "wallet_db_health_check_failures_total",
+    "Reused database connections found broken and replaced.",
+    ["database"],
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "wallet_db_pool_connections",
+    "Connections held by the in-process pool, by state (in_use or idle).",
+    ["database", "state"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_WAIT = Histogram(
+    "wallet_db_pool_wait_seconds",
+    "Time spent waiting for a pooled connection.",
+    ["database"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_POOL_TIMEOUTS = Counter(
+    "wallet_db_pool_timeouts_total",
+    "Checkouts that gave up waiting for a pooled connection.",
+    ["database"],
+)
+
+
+def registry():
+    # With PROMETHEUS_MULTIPROC_DIR set, every process writes its samples
+    # there; merge them rather than report only the process that answered.
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    merged = CollectorRegistry()
+    multiprocess.MultiProcessCollector(merged)
+    return merged
+
+
+def mark_process_dead(pid=None):
+    # Drops the live gauges of a process that has exited.
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid or os.getpid())
+
+
+def _mark_process_dead_on_exit(_):
+    multiprocessing.util.Finalize(None, mark_process_dead, exitpriority=0)
+
+
+# Covers processes that exit normally, such as uvicorn workers. Children
+# forked by multiprocessing end with os._exit(), which skips atexit but
+# still runs its finalizers; celery pool processes are handled in
+# wallets.signals.
+atexit.register(mark_process_dead)
+multiprocessing.util.register_after_fork(
+    mark_process_dead, _mark_process_dead_on_exit
+)
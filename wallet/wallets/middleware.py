@@ -0,0 +1,110 @@
+import asyncio
+import contextvars
+import time
+
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from wallets.metrics import (
+    HTTP_REQUEST_DB_DURATION,
+    HTTP_REQUEST_DB_QUERIES,
+    HTTP_REQUEST_DURATION,
+)
+from wallets.routers import pin_to_primary
+
+# The current request's query timer. A context variable rather than a
+# per-connection execute_wrapper, because async views run their queries in
+# sync_to_async threads that have their own connections but inherit the
+# request's context.
+_current_timer = contextvars.ContextVar("query_timer", default=None)
+
+
+class _QueryTimer:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+def _time_query(execute, sql, params, many, context):
+    timer = _current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.duration += time.perf_counter() - started
+        timer.count += 1
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    # At the front, so execute_wrapper() blocks that are open while the
+    # connection is made still pop their own wrapper on exit.
+    connection.execute_wrappers.insert(0, _time_query)
+
+
+class MetricsMiddleware:
+    # Outermost middleware, so the latency covers the whole stack. Works
+    # without DEBUG, and natively under ASGI so async views stay async.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        timer = _QueryTimer()
+        token = _current_timer.set(timer)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+        self.observe(request, response, time.perf_counter() - started, timer)
+        return response
+
+    async def __acall__(self, request):
+        timer = _QueryTimer()
+        token = _current_timer.set(timer)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+        self.observe(request, response, time.perf_counter() - started, timer)
+        return response
+
+    def observe(self, request, response, elapsed, timer):
+        # Label by route rather than path to keep the series bounded.
+        match = request.resolver_match
+        view = match.view_name if match else "unmatched"
+        HTTP_REQUEST_DURATION.labels(
+            view, request.method, response.status_code
+        ).observe(elapsed)
+        HTTP_REQUEST_DB_QUERIES.labels(view).observe(timer.count)
+        HTTP_REQUEST_DB_DURATION.labels(view).observe(timer.duration)
+
+
+class PrimaryPinMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return pin_to_primary(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return pin_to_primary(request, await self.get_response(request))
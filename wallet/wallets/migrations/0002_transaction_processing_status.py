@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 17:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallets', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='status',
+            field=models.CharField(choices=[('P', 'PENDING'), ('R', 'PROCESSING'), ('S', 'SUCCESS'), ('F', 'FAILED'), ('C', 'CANCELED')], db_index=True, default='P', max_length=1),
+        ),
+    ]
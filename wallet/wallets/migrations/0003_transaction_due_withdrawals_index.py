@@ -0,0 +1,17 @@
+# Generated by Django 3.2 on 2026-10-18 17:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallets', '0002_transaction_processing_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('status', 'P'), ('type', 'W')), fields=['scheduled_for'], name='transaction_due_withdrawals'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.2 on 2026-10-18 17:57
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_reserved_amount(apps, schema_editor):
+    Transaction = apps.get_model('wallets', 'Transaction')
+    Wallet = apps.get_model('wallets', 'Wallet')
+    pending = (
+        Transaction.objects.filter(
+            wallet=OuterRef('pk'), type='W', status='P'
+        )
+        .values('wallet')
+        .annotate(total=Sum('amount'))
+        .values('total')
+    )
+    Wallet.objects.update(
+        reserved_amount=Coalesce(Subquery(pending), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallets', '0003_transaction_due_withdrawals_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallet',
+            name='reserved_amount',
+            field=models.BigIntegerField(default=0, help_text="Sum of the wallet's pending withdrawals."),
+        ),
+        migrations.RunPython(
+            backfill_reserved_amount, migrations.RunPython.noop
+        ),
+    ]
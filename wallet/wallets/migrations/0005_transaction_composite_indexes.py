@@ -0,0 +1,42 @@
+# Generated by Django 3.2 on 2026-10-18 17:59
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    # Build the new indexes without blocking writes, before the single
+    # column ones they replace are dropped.
+    atomic = False
+
+    dependencies = [
+        ('wallets', '0004_wallet_reserved_amount'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['wallet', 'type', 'status'], name='transaction_wallet_type_stat'),
+        ),
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['wallet', 'type', '-created_at'], name='transaction_wallet_type_date'),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='status',
+            field=models.CharField(choices=[('P', 'PENDING'), ('R', 'PROCESSING'), ('S', 'SUCCESS'), ('F', 'FAILED'), ('C', 'CANCELED')], default='P', max_length=1),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='type',
+            field=models.CharField(choices=[('D', 'DEPOSIT'), ('W', 'WITHDRAWAL')], max_length=1),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='wallet',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='wallets.wallet'),
+        ),
+    ]
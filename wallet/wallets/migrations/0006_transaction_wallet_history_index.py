@@ -0,0 +1,20 @@
+# Generated by Django 3.2 on 2026-10-18 18:02
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('wallets', '0005_transaction_composite_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['wallet', '-created_at', '-id'], name='transaction_wallet_history'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.2 on 2026-10-18 18:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallets', '0007_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BulkOperation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', models.UUIDField(default=uuid.uuid4, unique=True)),
+                ('type', models.CharField(choices=[('D', 'DEPOSIT'), ('W', 'WITHDRAWAL')], max_length=1)),
+                ('status', models.CharField(choices=[('P', 'PENDING'), ('R', 'PROCESSING'), ('S', 'COMPLETED')], default='P', max_length=1)),
+                ('total_items', models.PositiveIntegerField(default=0)),
+                ('processed_items', models.PositiveIntegerField(default=0)),
+                ('accepted_items', models.PositiveIntegerField(default=0)),
+                ('rejected_items', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BulkOperationItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('wallet_uuid', models.UUIDField()),
+                ('amount', models.BigIntegerField()),
+                ('scheduled_for', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('P', 'PENDING'), ('A', 'ACCEPTED'), ('R', 'REJECTED')], default='P', max_length=1)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('operation', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='wallets.bulkoperation')),
+                ('transaction', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bulk_item', to='wallets.transaction')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='bulkoperationitem',
+            constraint=models.UniqueConstraint(fields=('operation', 'index'), name='unique_bulk_item_index'),
+        ),
+    ]
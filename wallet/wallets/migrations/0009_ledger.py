@@ -0,0 +1,78 @@
+# Generated by Django 3.2 on 2026-10-18 18:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def post_opening_balances(apps, schema_editor):
+    LedgerEntry = apps.get_model('wallets', 'LedgerEntry')
+    Wallet = apps.get_model('wallets', 'Wallet')
+    entries = []
+    for wallet_id, balance in (
+        Wallet.objects.exclude(balance=0).values_list('id', 'balance').iterator()
+    ):
+        entries += [
+            LedgerEntry(wallet_id=wallet_id, account='W', amount=balance),
+            LedgerEntry(wallet_id=wallet_id, account='P', amount=-balance),
+        ]
+    LedgerEntry.objects.bulk_create(entries, batch_size=2000)
+
+
+APPEND_ONLY_SQL = """
+CREATE FUNCTION wallets_ledgerentry_append_only() RETURNS trigger AS $$
+BEGIN
+    RAISE EXCEPTION 'wallets_ledgerentry is append-only';
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER wallets_ledgerentry_append_only
+    BEFORE UPDATE OR DELETE ON wallets_ledgerentry
+    FOR EACH ROW EXECUTE FUNCTION wallets_ledgerentry_append_only();
+"""
+
+DROP_APPEND_ONLY_SQL = """
+DROP TRIGGER wallets_ledgerentry_append_only ON wallets_ledgerentry;
+DROP FUNCTION wallets_ledgerentry_append_only();
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallets', '0008_bulkoperation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('account', models.CharField(choices=[('W', 'WALLET'), ('P', 'PROVIDER')], max_length=1)),
+                ('amount', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to='wallets.transaction')),
+                ('wallet', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to='wallets.wallet')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.BigIntegerField()),
+                ('last_entry_id', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('wallet', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='wallets.wallet')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(fields=['wallet', 'account', 'id'], name='ledger_wallet_account'),
+        ),
+        migrations.AddIndex(
+            model_name='balancesnapshot',
+            index=models.Index(fields=['wallet', '-created_at'], name='balance_snapshot_wallet_date'),
+        ),
+        migrations.RunPython(
+            post_opening_balances, migrations.RunPython.noop
+        ),
+        migrations.RunSQL(APPEND_ONLY_SQL, DROP_APPEND_ONLY_SQL),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2 on 2026-10-18 18:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallets', '0009_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallet',
+            name='shard_count',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Balance sub-counters that credits are spread across; 0 keeps the whole balance on this row.'),
+        ),
+        migrations.CreateModel(
+            name='WalletBalanceShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('balance', models.BigIntegerField(default=0)),
+                ('wallet', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='balance_shards', to='wallets.wallet')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='walletbalanceshard',
+            constraint=models.UniqueConstraint(fields=('wallet', 'shard'), name='unique_wallet_balance_shard'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 3.2 on 2026-10-18 18:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Q
+from django.utils import timezone
+
+
+def backfill_outbox(apps, schema_editor):
+    # Provider calls still owed: deposits not yet settled and withdrawals
+    # already debited but not yet confirmed.
+    Transaction = apps.get_model('wallets', 'Transaction')
+    OutboxMessage = apps.get_model('wallets', 'OutboxMessage')
+    now = timezone.now()
+    owed = Transaction.objects.filter(
+        Q(type='D', status__in=('P', 'R')) | Q(type='W', status='R')
+    ).values_list('id', flat=True)
+    OutboxMessage.objects.bulk_create(
+        [
+            OutboxMessage(transaction_id=transaction_id, next_attempt_at=now)
+            for transaction_id in owed.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallets', '0010_walletbalanceshard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('P', 'PENDING'), ('S', 'DELIVERED'), ('R', 'REJECTED'), ('D', 'DEAD')], default='P', max_length=1)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField()),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('transaction', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='outbox_message', to='wallets.transaction')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='outboxmessage',
+            index=models.Index(condition=models.Q(status='P'), fields=['next_attempt_at'], name='outbox_due_messages'),
+        ),
+        migrations.RunPython(backfill_outbox, migrations.RunPython.noop),
+    ]
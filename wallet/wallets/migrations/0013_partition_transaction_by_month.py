@@ -0,0 +1,166 @@
+# Generated by Django 3.2 on 2026-10-18 18:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+# Swaps wallets_transaction for a copy partitioned by month of created_at,
+# with a partition for every month from the oldest row to three months
+# ahead. Run it in a maintenance window: the copy holds an exclusive lock
+# on the table for as long as it takes.
+PARTITION_TRANSACTIONS = """
+ALTER TABLE wallets_transaction RENAME TO wallets_transaction_unpartitioned;
+
+CREATE TABLE wallets_transaction (
+    id bigint NOT NULL DEFAULT nextval('wallets_transaction_id_seq'),
+    uuid uuid NOT NULL,
+    type varchar(1) NOT NULL,
+    scheduled_for timestamp with time zone NULL,
+    status varchar(1) NOT NULL,
+    amount bigint NOT NULL,
+    created_at timestamp with time zone NOT NULL,
+    wallet_id bigint NULL
+) PARTITION BY RANGE (created_at);
+
+DO $$
+DECLARE
+    month timestamp;
+BEGIN
+    FOR month IN
+        SELECT generate_series(
+            date_trunc('month', coalesce(oldest, now()) AT TIME ZONE 'UTC'),
+            date_trunc('month', now() AT TIME ZONE 'UTC')
+                + interval '3 months',
+            interval '1 month'
+        )
+        FROM (
+            SELECT min(created_at) AS oldest
+            FROM wallets_transaction_unpartitioned
+        ) rows
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF wallets_transaction '
+            'FOR VALUES FROM (%L) TO (%L)',
+            'wallets_transaction_p' || to_char(month, 'YYYY_MM'),
+            month AT TIME ZONE 'UTC',
+            (month + interval '1 month') AT TIME ZONE 'UTC'
+        );
+    END LOOP;
+END
+$$;
+
+INSERT INTO wallets_transaction
+SELECT id, uuid, type, scheduled_for, status, amount, created_at, wallet_id
+FROM wallets_transaction_unpartitioned;
+
+ALTER SEQUENCE wallets_transaction_id_seq OWNED BY wallets_transaction.id;
+DROP TABLE wallets_transaction_unpartitioned;
+
+ALTER TABLE wallets_transaction
+    ADD CONSTRAINT wallets_transaction_pkey PRIMARY KEY (id, created_at),
+    ADD CONSTRAINT transaction_uuid_created_at UNIQUE (uuid, created_at),
+    ADD CONSTRAINT wallets_transaction_wallet_id_f5bd9420_fk_wallets_wallet_id
+        FOREIGN KEY (wallet_id) REFERENCES wallets_wallet (id)
+        DEFERRABLE INITIALLY DEFERRED;
+
+CREATE INDEX transaction_wallet_type_stat
+    ON wallets_transaction (wallet_id, type, status);
+CREATE INDEX transaction_wallet_type_date
+    ON wallets_transaction (wallet_id, type, created_at DESC);
+CREATE INDEX transaction_wallet_history
+    ON wallets_transaction (wallet_id, created_at DESC, id DESC);
+CREATE INDEX transaction_due_withdrawals
+    ON wallets_transaction (scheduled_for)
+    WHERE status = 'P' AND type = 'W';
+CREATE INDEX transaction_created_at
+    ON wallets_transaction (created_at DESC, id DESC);
+"""
+
+UNPARTITION_TRANSACTIONS = """
+ALTER TABLE wallets_transaction RENAME TO wallets_transaction_partitioned;
+
+CREATE TABLE wallets_transaction (
+    id bigint NOT NULL DEFAULT nextval('wallets_transaction_id_seq'),
+    uuid uuid NOT NULL,
+    type varchar(1) NOT NULL,
+    scheduled_for timestamp with time zone NULL,
+    status varchar(1) NOT NULL,
+    amount bigint NOT NULL,
+    created_at timestamp with time zone NOT NULL,
+    wallet_id bigint NULL
+);
+
+INSERT INTO wallets_transaction
+SELECT id, uuid, type, scheduled_for, status, amount, created_at, wallet_id
+FROM wallets_transaction_partitioned;
+
+ALTER SEQUENCE wallets_transaction_id_seq OWNED BY wallets_transaction.id;
+DROP TABLE wallets_transaction_partitioned;
+
+ALTER TABLE wallets_transaction
+    ADD CONSTRAINT wallets_transaction_pkey PRIMARY KEY (id),
+    ADD CONSTRAINT wallets_transaction_uuid_key UNIQUE (uuid),
+    ADD CONSTRAINT wallets_transaction_wallet_id_f5bd9420_fk_wallets_wallet_id
+        FOREIGN KEY (wallet_id) REFERENCES wallets_wallet (id)
+        DEFERRABLE INITIALLY DEFERRED;
+
+CREATE INDEX transaction_wallet_type_stat
+    ON wallets_transaction (wallet_id, type, status);
+CREATE INDEX transaction_wallet_type_date
+    ON wallets_transaction (wallet_id, type, created_at DESC);
+CREATE INDEX transaction_wallet_history
+    ON wallets_transaction (wallet_id, created_at DESC, id DESC);
+CREATE INDEX transaction_due_withdrawals
+    ON wallets_transaction (scheduled_for)
+    WHERE status = 'P' AND type = 'W';
+CREATE INDEX transaction_created_at
+    ON wallets_transaction (created_at DESC, id DESC);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallets', '0012_transaction_created_at_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bulkoperationitem',
+            name='transaction',
+            field=models.OneToOneField(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bulk_item', to='wallets.transaction'),
+        ),
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='transaction',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to='wallets.transaction'),
+        ),
+        migrations.AlterField(
+            model_name='outboxmessage',
+            name='transaction',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='outbox_message', to='wallets.transaction'),
+        ),
+        migrations.AlterField(
+            model_name='transactiontask',
+            name='transaction',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='task', to='wallets.transaction'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    PARTITION_TRANSACTIONS, UNPARTITION_TRANSACTIONS
+                ),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='transaction',
+                    name='uuid',
+                    field=models.UUIDField(default=uuid.uuid4),
+                ),
+                migrations.AddConstraint(
+                    model_name='transaction',
+                    constraint=models.UniqueConstraint(fields=('uuid', 'created_at'), name='transaction_uuid_created_at'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2 on 2026-10-18 18:57
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallets', '0013_partition_transaction_by_month'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='started_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
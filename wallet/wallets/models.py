@@ -1,11 +1,33 @@
 import uuid
 
 from django.conf import settings
-from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
+
+from wallets import cache as balance_cache
+
+
+class WalletQuerySet(models.QuerySet):
+    def with_total_balance(self):
+        # Sums the shards in the same query, so total_balance doesn't issue
+        # one of its own per wallet.
+        shards = (
+            WalletBalanceShard.objects.filter(wallet=OuterRef("pk"))
+            .values("wallet")
+            .annotate(total=Sum("balance"))
+            .values("total")
+        )
+        return self.annotate(
+            shard_total=Coalesce(
+                Subquery(shards), 0, output_field=models.BigIntegerField()
+            )
+        )
 
 
 class Wallet(models.Model):
@@ -19,19 +41,45 @@ class Wallet(models.Model):
     )
 
     balance = models.BigIntegerField(default=0)
+    reserved_amount = models.BigIntegerField(
+        default=0,
+        help_text="Sum of the wallet's pending withdrawals.",
+    )
+    shard_count = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Balance sub-counters that credits are spread across; "
+        "0 keeps the whole balance on this row.",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
-    def set_balance_cache(self):
-        cache_key = f"wallet_balance_{self.uuid}"
-        cache.set(cache_key, self.balance, timeout=None)
+    objects = WalletQuerySet.as_manager()
+
+    @property
+    def total_balance(self):
+        if not self.shard_count:
+            return self.balance
+        if hasattr(self, "shard_total"):
+            return self.balance + self.shard_total
+        shards = self.balance_shards.aggregate(total=Sum("balance"))
+        return self.balance + (shards["total"] or 0)
 
-    def get_balance_cache(self):
-        cache_key = f"wallet_balance_{self.uuid}"
-        balance = cache.get(cache_key)
-        if balance is None:
-            self.set_balance_cache()
-            balance = self.balance
-        return balance
+    @classmethod
+    def get_cached_balance(cls, wallet_uuid):
+        def load():
+            # Always the primary: a lagging replica would cache a balance
+            # older than the version it is stored under.
+            wallet = (
+                cls.objects.using(DEFAULT_DB_ALIAS)
+                .with_total_balance()
+                .filter(uuid=wallet_uuid)
+                .first()
+            )
+            return wallet.total_balance if wallet else None
+
+        return balance_cache.get_balance(wallet_uuid, load)
+
+    def invalidate_balance_cache(self):
+        balance_cache.invalidate_balance(self.uuid)
 
     def clean(self):
         existing_wallet = Wallet.objects.filter(user=self.user).first()
@@ -42,9 +90,35 @@ class Wallet(models.Model):
         return f"Wallet {self.uuid} - User: {self.user}"
 
 
+class WalletBalanceShard(models.Model):
+    # Part of a hot wallet's balance. Credits land on a random shard so
+    # concurrent deposits don't queue on the wallet row.
+    # Covered by the unique constraint in Meta, which leads with wallet.
+    wallet = models.ForeignKey(
+        Wallet,
+        related_name="balance_shards",
+        on_delete=models.CASCADE,
+        db_index=False,
+    )
+    shard = models.PositiveSmallIntegerField()
+    balance = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["wallet", "shard"], name="unique_wallet_balance_shard"
+            ),
+        ]
+
+
 class Transaction(models.Model):
+    # Range partitioned by month of created_at (see migration 0013), so the
+    # primary key and every unique constraint in the database include
+    # created_at. Rows referencing a transaction can't have a database
+    # foreign key to it; their relations are declared without one.
     class StatusChoices(models.TextChoices):
         PENDING = "P", ("PENDING")
+        PROCESSING = "R", ("PROCESSING")
         SUCCESS = "S", ("SUCCESS")
         FAILED = "F", ("FAILED")
         CANCELED = "C", ("CANCELED")
@@ -53,27 +127,57 @@ class Transaction(models.Model):
         DEPOSIT = "D", ("DEPOSIT")
         WITHDRAWAL = "W", ("WITHDRAWAL")
 
-    uuid = models.UUIDField(default=uuid.uuid4, unique=True)
+    # Covered by the unique constraint in Meta, which leads with uuid.
+    uuid = models.UUIDField(default=uuid.uuid4)
+    # Covered by the composite indexes in Meta, which all lead with wallet.
     wallet = models.ForeignKey(
         Wallet,
         related_name="transactions",
         on_delete=models.CASCADE,
         null=True,
-        db_index=True,
-    )
-    type = models.CharField(
-        max_length=1, choices=TypeChoices.choices, db_index=True
+        db_index=False,
     )
+    type = models.CharField(max_length=1, choices=TypeChoices.choices)
     scheduled_for = models.DateTimeField(null=True, blank=True)
     status = models.CharField(
         max_length=1,
         choices=StatusChoices.choices,
         default=StatusChoices.PENDING,
-        db_index=True,
     )
     amount = models.BigIntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["wallet", "type", "status"],
+                name="transaction_wallet_type_stat",
+            ),
+            models.Index(
+                fields=["wallet", "type", "-created_at"],
+                name="transaction_wallet_type_date",
+            ),
+            models.Index(
+                fields=["wallet", "-created_at", "-id"],
+                name="transaction_wallet_history",
+            ),
+            models.Index(
+                fields=["scheduled_for"],
+                name="transaction_due_withdrawals",
+                condition=models.Q(status="P", type="W"),
+            ),
+            models.Index(
+                fields=["-created_at", "-id"],
+                name="transaction_created_at",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["uuid", "created_at"],
+                name="transaction_uuid_created_at",
+            ),
+        ]
+
 
 class TransactionTask(models.Model):
     class StatusChoices(models.TextChoices):
@@ -86,6 +190,7 @@ class TransactionTask(models.Model):
         on_delete=models.CASCADE,
         related_name="task",
         db_index=True,
+        db_constraint=False,
     )
     task_id = models.CharField(max_length=255)
     status = models.CharField(
@@ -96,6 +201,189 @@ class TransactionTask(models.Model):
     )
 
 
+class OutboxMessage(models.Model):
+    # A provider call owed for a transaction, written in the same database
+    # transaction as the state change that requires it.
+    class StatusChoices(models.TextChoices):
+        PENDING = "P", ("PENDING")
+        DELIVERED = "S", ("DELIVERED")
+        REJECTED = "R", ("REJECTED")
+        DEAD = "D", ("DEAD")
+
+    transaction = models.OneToOneField(
+        Transaction,
+        related_name="outbox_message",
+        on_delete=models.CASCADE,
+        db_constraint=False,
+    )
+    status = models.CharField(
+        max_length=1,
+        choices=StatusChoices.choices,
+        default=StatusChoices.PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField()
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at"],
+                name="outbox_due_messages",
+                condition=models.Q(status="P"),
+            ),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    scope = models.CharField(max_length=255)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    # Both stay empty while the first request is still being processed.
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(
+        null=True, blank=True, encoder=DjangoJSONEncoder
+    )
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # When the request now holding the key started. A key still without a
+    # response LOCK_TIMEOUT seconds later was left by a request that died,
+    # and is taken over by the next one.
+    started_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["scope", "key"], name="unique_idempotency_key"
+            ),
+        ]
+
+
+class LedgerEntry(models.Model):
+    # Every balance change is posted as two entries that sum to zero: one
+    # against the wallet and one against the provider clearing account.
+    class AccountChoices(models.TextChoices):
+        WALLET = "W", ("WALLET")
+        PROVIDER = "P", ("PROVIDER")
+
+    id = models.BigAutoField(primary_key=True)
+    # Covered by the ledger_wallet_account index in Meta.
+    wallet = models.ForeignKey(
+        Wallet,
+        related_name="ledger_entries",
+        on_delete=models.PROTECT,
+        db_index=False,
+    )
+    account = models.CharField(max_length=1, choices=AccountChoices.choices)
+    amount = models.BigIntegerField()
+    # Kept when the transaction's partition is archived, as the reference
+    # into the archive.
+    transaction = models.ForeignKey(
+        Transaction,
+        related_name="ledger_entries",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        db_constraint=False,
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["wallet", "account", "id"],
+                name="ledger_wallet_account",
+            ),
+        ]
+
+
+class BalanceSnapshot(models.Model):
+    # A wallet's ledger balance up to and including last_entry_id; the
+    # current balance is the latest snapshot plus the entries after it.
+    wallet = models.ForeignKey(
+        Wallet,
+        related_name="balance_snapshots",
+        on_delete=models.CASCADE,
+        db_index=False,
+    )
+    balance = models.BigIntegerField()
+    last_entry_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["wallet", "-created_at"],
+                name="balance_snapshot_wallet_date",
+            ),
+        ]
+
+
+class BulkOperation(models.Model):
+    class StatusChoices(models.TextChoices):
+        PENDING = "P", ("PENDING")
+        PROCESSING = "R", ("PROCESSING")
+        COMPLETED = "S", ("COMPLETED")
+
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True)
+    type = models.CharField(
+        max_length=1, choices=Transaction.TypeChoices.choices
+    )
+    status = models.CharField(
+        max_length=1,
+        choices=StatusChoices.choices,
+        default=StatusChoices.PENDING,
+    )
+    total_items = models.PositiveIntegerField(default=0)
+    processed_items = models.PositiveIntegerField(default=0)
+    accepted_items = models.PositiveIntegerField(default=0)
+    rejected_items = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+
+class BulkOperationItem(models.Model):
+    class StatusChoices(models.TextChoices):
+        PENDING = "P", ("PENDING")
+        ACCEPTED = "A", ("ACCEPTED")
+        REJECTED = "R", ("REJECTED")
+
+    # Covered by the unique constraint in Meta, which leads with operation.
+    operation = models.ForeignKey(
+        BulkOperation,
+        related_name="items",
+        on_delete=models.CASCADE,
+        db_index=False,
+    )
+    # Position of the instruction in the submitted batch.
+    index = models.PositiveIntegerField()
+    wallet_uuid = models.UUIDField()
+    amount = models.BigIntegerField()
+    scheduled_for = models.DateTimeField(null=True, blank=True)
+    status = models.CharField(
+        max_length=1,
+        choices=StatusChoices.choices,
+        default=StatusChoices.PENDING,
+    )
+    error = models.CharField(max_length=255, blank=True)
+    transaction = models.OneToOneField(
+        Transaction,
+        related_name="bulk_item",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_constraint=False,
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["operation", "index"], name="unique_bulk_item_index"
+            ),
+        ]
+
+
 @receiver(post_save, sender=Wallet)
-def update_balance_cache(sender, instance, **kwargs):
-    instance.set_balance_cache()
+def invalidate_balance_cache(sender, instance, **kwargs):
+    instance.invalidate_balance_cache()
@@ -0,0 +1,156 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class TransactionKeysetPagination(BasePagination):
+    # Keyset pagination over (created_at, id), newest first. Every page is
+    # a bounded index range scan, however deep the client pages.
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by("-created_at", "-id")
+        position = self.decode_cursor(request)
+        if position is not None:
+            created_at, pk = position
+            queryset = queryset.filter(created_at__lte=created_at).filter(
+                Q(created_at__lt=created_at) | Q(id__lt=pk)
+            )
+
+        results = list(queryset[: self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        results = results[: self.page_size]
+        self.next_position = (
+            (results[-1].created_at, results[-1].id) if self.has_next else None
+        )
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(
+                request.query_params.get(
+                    self.page_size_query_param, self.page_size
+                )
+            )
+        except ValueError:
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            created_at, pk = (
+                base64.urlsafe_b64decode(encoded.encode()).decode().split("|")
+            )
+            return datetime.fromisoformat(created_at), int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        created_at, pk = position
+        return base64.urlsafe_b64encode(
+            f"{created_at.isoformat()}|{pk}".encode()
+        ).decode()
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.next_position),
+        )
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
+
+
+class BulkOperationItemPagination(TransactionKeysetPagination):
+    # Items are paged by their position in the submitted batch.
+    page_size = 500
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by("index")
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(index__gt=position)
+
+        results = list(queryset[: self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        results = results[: self.page_size]
+        self.next_position = results[-1].index if self.has_next else None
+        return results
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            return int(encoded)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        return str(position)
+
+
+def estimated_count(queryset):
+    # The planner's row estimate, kept current by autovacuum's ANALYZE. A
+    # partitioned table holds no rows itself; its partitions are summed.
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            "SELECT sum(greatest(c.reltuples, 0)) FROM pg_class c "
+            "WHERE c.relkind <> 'p' AND (c.oid = %s::regclass OR c.oid IN ("
+            "  SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass"
+            "))",
+            [queryset.model._meta.db_table] * 2,
+        )
+        row = cursor.fetchone()
+    return int(row[0] or 0)
+
+
+class EstimatedCountPaginator(Paginator):
+    # For admin changelists over tables too large to COUNT(*). An
+    # unfiltered list is sized from the planner's estimate; a filtered one
+    # is counted exactly, but only up to COUNT_LIMIT rows, past which the
+    # last pages are simply not linked.
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN["COUNT_LIMIT"]
+        if not self.object_list.query.where:
+            estimate = estimated_count(self.object_list)
+            if estimate > limit:
+                return estimate
+        return self.object_list[: limit + 1].count()
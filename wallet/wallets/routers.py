@@ -0,0 +1,97 @@
+import asyncio
+import contextvars
+import functools
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# The replica reads are sent to, inside a replica_reads() block. A context
+# variable, so it follows async views into their sync_to_async threads.
+_read_database = contextvars.ContextVar("read_database", default=None)
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS", "TRACE")
+
+
+def replica_aliases():
+    return [
+        alias for alias in settings.DATABASES if alias.startswith("replica")
+    ]
+
+
+def is_pinned(request):
+    return settings.READ_REPLICAS["COOKIE_NAME"] in request.COOKIES
+
+
+def pin_to_primary(request, response):
+    # After a successful write the client reads from the primary for a
+    # while, so it never misses its own change on a replica that is behind.
+    if (
+        request.method not in SAFE_METHODS
+        and response.status_code < 400
+        and replica_aliases()
+    ):
+        response.set_cookie(
+            settings.READ_REPLICAS["COOKIE_NAME"],
+            "1",
+            max_age=settings.READ_REPLICAS["STICKY_SECONDS"],
+            httponly=True,
+            samesite="Lax",
+        )
+    return response
+
+
+@contextmanager
+def replica_reads():
+    # One replica for the whole block: switching between replicas that lag
+    # by different amounts could make reads go back in time.
+    aliases = replica_aliases()
+    token = _read_database.set(random.choice(aliases) if aliases else None)
+    try:
+        yield
+    finally:
+        _read_database.reset(token)
+
+
+def read_from_replica(view):
+    # For views that only read. Pinned clients keep reading the primary.
+    if asyncio.iscoroutinefunction(view):
+
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if is_pinned(request):
+                return await view(request, *args, **kwargs)
+            with replica_reads():
+                return await view(request, *args, **kwargs)
+
+    else:
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if is_pinned(request):
+                return view(request, *args, **kwargs)
+            with replica_reads():
+                return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+class ReplicaRouter:
+    # Reads go to a replica only inside replica_reads(), and never from
+    # within a transaction on the primary, where they must see its writes.
+    def db_for_read(self, model, **hints):
+        alias = _read_database.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db in replica_aliases() else None
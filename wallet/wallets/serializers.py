@@ -1,14 +1,19 @@
-import requests
+from django.conf import settings
 from django.utils import timezone
 from rest_framework import serializers
 
-from wallets.models import Transaction, Wallet
-from wallets.services import deposit
+from wallets.models import (
+    BulkOperation,
+    BulkOperationItem,
+    Transaction,
+    Wallet,
+)
+from wallets.services import reserve_deposit
 
 
 class TransactionSerializer(serializers.ModelSerializer):
     transaction_type_display = serializers.CharField(
-        source="get_transaction_type_display", read_only=True
+        source="get_type_display", read_only=True
     )
 
     class Meta:
@@ -31,9 +36,8 @@ class TransactionSerializer(serializers.ModelSerializer):
 
 
 class WalletSerializer(serializers.ModelSerializer):
+    balance = serializers.SerializerMethodField()
     user_name = serializers.SerializerMethodField()
-    deposit_transactions = serializers.SerializerMethodField()
-    withdrawal_transactions = serializers.SerializerMethodField()
 
     class Meta:
         model = Wallet
@@ -42,15 +46,11 @@ class WalletSerializer(serializers.ModelSerializer):
             "balance",
             "user",
             "user_name",
-            "deposit_transactions",
-            "withdrawal_transactions",
         )
         read_only_fields = (
             "uuid",
             "balance",
             "user_name",
-            "deposit_transactions",
-            "withdrawal_transactions",
         )
         extra_kwargs = {"user": {"write_only": True}}
 
@@ -62,20 +62,22 @@ class WalletSerializer(serializers.ModelSerializer):
             )
         return data
 
+    def get_balance(self, obj):
+        return Wallet.get_cached_balance(obj.uuid)
+
     def get_user_name(self, obj):
         return obj.user.username if obj.user else None
 
-    def get_deposit_transactions(self, obj):
-        return TransactionSerializer(
-            obj.transactions.filter(type=Transaction.TypeChoices.DEPOSIT),
-            many=True,
-        ).data
 
-    def get_withdrawal_transactions(self, obj):
-        return TransactionSerializer(
-            obj.transactions.filter(type=Transaction.TypeChoices.WITHDRAWAL),
-            many=True,
-        ).data
+class TransactionFilterSerializer(serializers.Serializer):
+    type = serializers.ChoiceField(
+        choices=Transaction.TypeChoices.choices, required=False
+    )
+    status = serializers.ChoiceField(
+        choices=Transaction.StatusChoices.choices, required=False
+    )
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
 
 
 class WithdrawalSerializer(serializers.Serializer):
@@ -113,17 +115,69 @@ class DepositTransactionSerializer(serializers.Serializer):
         return data
 
     def create(self, validated_data):
-        wallet = validated_data.get("wallet")
-        amount = validated_data["amount"]
-        try:
-            result = deposit(wallet.uuid, amount)
-            if result["status"] == 200:
-                Transaction.objects.create(
-                    wallet=wallet,
-                    type=Transaction.TypeChoices.DEPOSIT,
-                    amount=amount,
-                    status=Transaction.StatusChoices.SUCCESS,
-                )
-            return result
-        except requests.exceptions.RequestException as e:
-            raise serializers.ValidationError(str(e))
+        return reserve_deposit(
+            validated_data["wallet"], validated_data["amount"]
+        )
+
+
+class BulkInstructionSerializer(serializers.Serializer):
+    wallet = serializers.UUIDField()
+    amount = serializers.IntegerField(min_value=1)
+    scheduled_for = serializers.DateTimeField(required=False)
+
+    def validate_scheduled_for(self, value):
+        if value < timezone.now():
+            raise serializers.ValidationError(
+                "The scheduled time must be in the future."
+            )
+        return value
+
+
+class BulkOperationRequestSerializer(serializers.Serializer):
+    # Wallets are looked up once per chunk while the batch is processed, so
+    # an unknown wallet only rejects its own item.
+    items = BulkInstructionSerializer(
+        many=True,
+        allow_empty=False,
+        max_length=settings.BULK_OPERATIONS["MAX_ITEMS"],
+    )
+
+
+class BulkOperationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BulkOperation
+        fields = (
+            "uuid",
+            "type",
+            "status",
+            "total_items",
+            "processed_items",
+            "accepted_items",
+            "rejected_items",
+            "created_at",
+            "completed_at",
+        )
+        read_only_fields = fields
+
+
+class BulkOperationItemSerializer(serializers.ModelSerializer):
+    transaction_uuid = serializers.UUIDField(
+        source="transaction.uuid", read_only=True, default=None
+    )
+    transaction_status = serializers.CharField(
+        source="transaction.status", read_only=True, default=None
+    )
+
+    class Meta:
+        model = BulkOperationItem
+        fields = (
+            "index",
+            "wallet_uuid",
+            "amount",
+            "scheduled_for",
+            "status",
+            "error",
+            "transaction_uuid",
+            "transaction_status",
+        )
+        read_only_fields = fields
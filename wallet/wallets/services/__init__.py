@@ -1,2 +1,44 @@
-from wallets.services.deposit import deposit
+from wallets.services.balance import (
+    InsufficientFundsError,
+    consolidate_shards,
+    credit_wallet,
+    credit_wallets,
+    debit_wallet,
+    release_funds,
+    reserve_funds,
+)
+from wallets.services.bulk_operations import (
+    create_bulk_operation,
+    process_bulk_operation,
+)
+from wallets.services.cancel_withdrawal import cancel_withdrawal
+from wallets.services.deposit import (
+    reserve_deposit,
+    settle_deposit,
+    settle_deposits,
+)
+from wallets.services.dispatch_withdrawals import dispatch_due_withdrawals
+from wallets.services.ledger import (
+    ledger_balance,
+    ledger_balances,
+    post_entries,
+    snapshot_balances,
+)
+from wallets.services.outbox import (
+    deliver_outbox,
+    enqueue_provider_calls,
+    finish_transactions,
+)
+from wallets.services.partitions import (
+    archivable_partitions,
+    archive_partition,
+    create_partitions,
+    detached_partitions,
+    transaction_partitions,
+)
 from wallets.services.schedule_withdrawal import schedule_withdrawal
+from wallets.services.shards import set_shard_count
+from wallets.services.settle_withdrawals import (
+    settle_due_withdrawals,
+    settle_withdrawal,
+)
@@ -0,0 +1,229 @@
+import random
+from collections import defaultdict
+from typing import List, Optional
+
+from django.db import connection
+from django.db.models import F
+
+from wallets.models import Transaction, Wallet, WalletBalanceShard
+from wallets.services.ledger import post_entries
+
+
+class InsufficientFundsError(ValueError):
+    pass
+
+
+def _check_amount(amount: int) -> None:
+    if amount <= 0:
+        raise ValueError("Amount must be positive")
+
+
+def _update_wallet(wallet: Wallet, changes: str, condition: str, params):
+    table = connection.ops.quote_name(Wallet._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET {changes} WHERE id = %s{condition} "
+            "RETURNING balance, reserved_amount",
+            params,
+        )
+        row = cursor.fetchone()
+    if row is None:
+        return False
+
+    wallet.balance, wallet.reserved_amount = row
+    wallet.invalidate_balance_cache()
+    return True
+
+
+def _credit_shard(wallet: Wallet, amount: int) -> bool:
+    # Lands only while the wallet still has the shard. The key share lock
+    # waits out a set_shard_count in progress, so a credit routed by a
+    # stale shard_count can't reach a shard after it has been swept; the
+    # caller credits the wallet row instead.
+    table = connection.ops.quote_name(Wallet._meta.db_table)
+    shard_table = connection.ops.quote_name(WalletBalanceShard._meta.db_table)
+    shard = random.randrange(wallet.shard_count)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {shard_table} SET balance = balance + %s "
+            f"WHERE wallet_id = %s AND shard = %s AND EXISTS ("
+            f"  SELECT 1 FROM {table} WHERE id = %s AND shard_count > %s "
+            f"  FOR KEY SHARE"
+            f")",
+            [amount, wallet.pk, shard, wallet.pk, shard],
+        )
+        credited = cursor.rowcount > 0
+    if credited:
+        wallet.invalidate_balance_cache()
+    return credited
+
+
+def _debit_shard(wallet: Wallet, amount: int) -> bool:
+    shards = list(range(wallet.shard_count))
+    random.shuffle(shards)
+    for shard in shards:
+        if WalletBalanceShard.objects.filter(
+            wallet_id=wallet.pk, shard=shard, balance__gte=amount
+        ).update(balance=F("balance") - amount):
+            wallet.invalidate_balance_cache()
+            return True
+    return False
+
+
+def consolidate_shards(wallet: Wallet) -> int:
+    # Moves every shard's balance back onto the wallet row in one
+    # statement, for debits no single shard can cover.
+    table = connection.ops.quote_name(Wallet._meta.db_table)
+    shard_table = connection.ops.quote_name(WalletBalanceShard._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"WITH locked AS ("
+            f"  SELECT id, balance FROM {shard_table} "
+            f"  WHERE wallet_id = %s AND balance <> 0 ORDER BY id FOR UPDATE"
+            f"), swept AS ("
+            f"  UPDATE {shard_table} SET balance = 0 FROM locked "
+            f"  WHERE {shard_table}.id = locked.id RETURNING locked.balance"
+            f") "
+            f"UPDATE {table} SET balance = balance + "
+            f"(SELECT COALESCE(SUM(balance), 0) FROM swept) "
+            f"WHERE id = %s RETURNING balance, reserved_amount",
+            [wallet.pk, wallet.pk],
+        )
+        wallet.balance, wallet.reserved_amount = cursor.fetchone()
+    wallet.invalidate_balance_cache()
+    return wallet.balance
+
+
+def credit_wallet(
+    wallet: Wallet, amount: int, transaction: Optional[Transaction] = None
+) -> int:
+    _check_amount(amount)
+    if not (wallet.shard_count and _credit_shard(wallet, amount)):
+        _update_wallet(
+            wallet, "balance = balance + %s", "", [amount, wallet.pk]
+        )
+    post_entries([(wallet, amount, transaction)])
+    return wallet.balance
+
+
+def _debit_row(wallet: Wallet, amount: int, reserved: bool) -> bool:
+    changes = "balance = balance - %s"
+    params = [amount]
+    if reserved:
+        changes += ", reserved_amount = reserved_amount - %s"
+        params.append(amount)
+    return _update_wallet(
+        wallet, changes, " AND balance >= %s", params + [wallet.pk, amount]
+    )
+
+
+def debit_wallet(
+    wallet: Wallet,
+    amount: int,
+    reserved: bool = False,
+    transaction: Optional[Transaction] = None,
+) -> int:
+    # ``reserved`` debits consume a reservation made by reserve_funds.
+    _check_amount(amount)
+    debited = _debit_row(wallet, amount, reserved)
+    if not debited and wallet.shard_count:
+        if _debit_shard(wallet, amount):
+            debited = True
+            if reserved:
+                release_funds(wallet, amount)
+        else:
+            consolidate_shards(wallet)
+            debited = _debit_row(wallet, amount, reserved)
+
+    if not debited:
+        raise InsufficientFundsError("Insufficient funds")
+    post_entries([(wallet, -amount, transaction)])
+    return wallet.balance
+
+
+def reserve_funds(wallet: Wallet, amount: int) -> int:
+    _check_amount(amount)
+    available = "balance"
+    params = [amount, wallet.pk]
+    if wallet.shard_count:
+        shard_table = connection.ops.quote_name(
+            WalletBalanceShard._meta.db_table
+        )
+        available += (
+            f" + (SELECT COALESCE(SUM(balance), 0) FROM {shard_table} "
+            f"WHERE wallet_id = %s)"
+        )
+        params.append(wallet.pk)
+
+    if not _update_wallet(
+        wallet,
+        "reserved_amount = reserved_amount + %s",
+        f" AND {available} - reserved_amount >= %s",
+        params + [amount],
+    ):
+        raise InsufficientFundsError("Insufficient funds")
+    return wallet.reserved_amount
+
+
+def release_funds(wallet: Wallet, amount: int) -> int:
+    _check_amount(amount)
+    _update_wallet(
+        wallet,
+        "reserved_amount = reserved_amount - %s",
+        "",
+        [amount, wallet.pk],
+    )
+    return wallet.reserved_amount
+
+
+def _credit_rows(credits) -> None:
+    wallets = {wallet.pk: wallet for wallet in credits}
+    table = connection.ops.quote_name(Wallet._meta.db_table)
+    values = ", ".join(["(%s, %s)"] * len(credits))
+    params = []
+    for wallet, amount in credits.items():
+        params += [wallet.pk, amount]
+
+    with connection.cursor() as cursor:
+        # The UPDATE locks rows in whatever order its plan visits them, so
+        # take the locks in id order first; concurrent dispatchers crediting
+        # overlapping wallets then queue instead of deadlocking.
+        cursor.execute(
+            f"SELECT id FROM {table} WHERE id = ANY(%s) ORDER BY id "
+            f"FOR UPDATE",
+            [sorted(wallets)],
+        )
+        cursor.execute(
+            f"UPDATE {table} SET balance = {table}.balance + delta.amount "
+            f"FROM (VALUES {values}) AS delta (id, amount) "
+            f"WHERE {table}.id = delta.id "
+            f"RETURNING {table}.id, balance, reserved_amount",
+            params,
+        )
+        for wallet_id, balance, reserved_amount in cursor.fetchall():
+            wallet = wallets[wallet_id]
+            wallet.balance, wallet.reserved_amount = balance, reserved_amount
+            wallet.invalidate_balance_cache()
+
+
+def credit_wallets(transactions: List[Transaction]) -> None:
+    # Credits each transaction's amount to its wallet, with one statement
+    # for all unsharded wallets.
+    if not transactions:
+        return
+    credits = defaultdict(int)
+    # Shards are credited in wallet order so concurrent workers never
+    # deadlock.
+    for source in sorted(transactions, key=lambda row: row.wallet.pk):
+        _check_amount(source.amount)
+        if not (
+            source.wallet.shard_count
+            and _credit_shard(source.wallet, source.amount)
+        ):
+            credits[source.wallet] += source.amount
+    if credits:
+        _credit_rows(credits)
+
+    post_entries(
+        (source.wallet, source.amount, source) for source in transactions
+    )
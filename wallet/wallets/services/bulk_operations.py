@@ -0,0 +1,168 @@
+from collections import defaultdict
+from typing import Dict, List
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from wallets.models import (
+    BulkOperation,
+    BulkOperationItem,
+    Transaction,
+    Wallet,
+)
+from wallets.services.balance import InsufficientFundsError, reserve_funds
+from wallets.services.outbox import enqueue_provider_calls
+from wallets.tasks.process_bulk_operation import (
+    process_bulk_operation as process_bulk_operation_task,
+)
+from wallets.tasks.settle_withdrawals import settle_withdrawals
+
+
+def create_bulk_operation(operation_type: str, items: List[dict]):
+    with transaction.atomic():
+        operation = BulkOperation.objects.create(
+            type=operation_type, total_items=len(items)
+        )
+        BulkOperationItem.objects.bulk_create(
+            [
+                BulkOperationItem(
+                    operation=operation,
+                    index=index,
+                    wallet_uuid=item["wallet"],
+                    amount=item["amount"],
+                    scheduled_for=item.get("scheduled_for"),
+                )
+                for index, item in enumerate(items)
+            ],
+            batch_size=settings.BULK_OPERATIONS["CHUNK_SIZE"],
+        )
+        transaction.on_commit(
+            lambda: process_bulk_operation_task.delay(
+                operation_id=operation.id
+            )
+        )
+
+    return operation
+
+
+def _reject(item: BulkOperationItem, error: str) -> None:
+    item.status = BulkOperationItem.StatusChoices.REJECTED
+    item.error = error
+
+
+def _reserve_withdrawals(
+    items_by_wallet: Dict[Wallet, List[BulkOperationItem]]
+) -> List[BulkOperationItem]:
+    accepted = []
+    # Reserve in wallet order so concurrent workers never deadlock.
+    for wallet in sorted(items_by_wallet, key=lambda wallet: wallet.id):
+        items = items_by_wallet[wallet]
+        try:
+            # One statement per wallet when it can cover the whole batch.
+            reserve_funds(wallet, sum(item.amount for item in items))
+            accepted.extend(items)
+            continue
+        except InsufficientFundsError:
+            pass
+
+        for item in items:
+            try:
+                reserve_funds(wallet, item.amount)
+                accepted.append(item)
+            except InsufficientFundsError:
+                _reject(
+                    item, "Insufficient funds considering pending withdrawals"
+                )
+    return accepted
+
+
+def _process_chunk(operation: BulkOperation, chunk_size: int) -> int:
+    is_deposit = operation.type == Transaction.TypeChoices.DEPOSIT
+    now = timezone.now()
+
+    with transaction.atomic():
+        items = list(
+            operation.items.select_for_update(skip_locked=True)
+            .filter(status=BulkOperationItem.StatusChoices.PENDING)
+            .order_by("index")[:chunk_size]
+        )
+        if not items:
+            return 0
+
+        wallets = Wallet.objects.in_bulk(
+            {item.wallet_uuid for item in items}, field_name="uuid"
+        )
+        items_by_wallet = defaultdict(list)
+        for item in items:
+            wallet = wallets.get(item.wallet_uuid)
+            if wallet is None:
+                _reject(item, "Wallet not found")
+            else:
+                items_by_wallet[wallet].append(item)
+
+        if is_deposit:
+            accepted = [
+                item for items in items_by_wallet.values() for item in items
+            ]
+        else:
+            accepted = _reserve_withdrawals(items_by_wallet)
+
+        transactions = Transaction.objects.bulk_create(
+            [
+                Transaction(
+                    wallet=wallets[item.wallet_uuid],
+                    type=operation.type,
+                    amount=item.amount,
+                    scheduled_for=(
+                        None if is_deposit else item.scheduled_for or now
+                    ),
+                    status=Transaction.StatusChoices.PENDING,
+                )
+                for item in accepted
+            ]
+        )
+        for item, new_transaction in zip(accepted, transactions):
+            item.status = BulkOperationItem.StatusChoices.ACCEPTED
+            item.transaction = new_transaction
+
+        BulkOperationItem.objects.bulk_update(
+            items, ["status", "error", "transaction"]
+        )
+        BulkOperation.objects.filter(id=operation.id).update(
+            processed_items=F("processed_items") + len(items),
+            accepted_items=F("accepted_items") + len(accepted),
+            rejected_items=F("rejected_items") + len(items) - len(accepted),
+        )
+
+        if is_deposit:
+            enqueue_provider_calls(transactions)
+        elif any(item.scheduled_for is None for item in accepted):
+            # Withdrawals without a schedule are due now; don't leave them
+            # waiting for the next dispatch window.
+            transaction.on_commit(settle_withdrawals.delay)
+
+    return len(items)
+
+
+def process_bulk_operation(operation_id: int) -> BulkOperation:
+    BulkOperation.objects.filter(
+        id=operation_id, status=BulkOperation.StatusChoices.PENDING
+    ).update(status=BulkOperation.StatusChoices.PROCESSING)
+    operation = BulkOperation.objects.get(id=operation_id)
+
+    chunk_size = settings.BULK_OPERATIONS["CHUNK_SIZE"]
+    while _process_chunk(operation, chunk_size):
+        pass
+
+    # Another worker may still hold a locked chunk; it finishes the
+    # operation once the last item has been processed.
+    BulkOperation.objects.filter(
+        id=operation.id, processed_items=F("total_items")
+    ).exclude(status=BulkOperation.StatusChoices.COMPLETED).update(
+        status=BulkOperation.StatusChoices.COMPLETED,
+        completed_at=timezone.now(),
+    )
+    operation.refresh_from_db()
+    return operation
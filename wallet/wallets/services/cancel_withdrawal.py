@@ -0,0 +1,30 @@
+from django.db import transaction
+
+from wallets.models import Transaction, TransactionTask
+from wallets.services.balance import release_funds
+
+
+def cancel_withdrawal(transaction_uuid: str) -> Transaction:
+    withdrawal = Transaction.objects.select_related("wallet").get(
+        uuid=transaction_uuid
+    )
+
+    # The scheduler only ever settles PENDING rows, so cancelling is a
+    # conditional status change; there is no queued task to revoke.
+    with transaction.atomic():
+        cancelled = Transaction.objects.filter(
+            id=withdrawal.id,
+            type=Transaction.TypeChoices.WITHDRAWAL,
+            status=Transaction.StatusChoices.PENDING,
+        ).update(status=Transaction.StatusChoices.CANCELED)
+        if not cancelled:
+            raise ValueError("Only pending transactions can be cancelled")
+
+        release_funds(withdrawal.wallet, withdrawal.amount)
+
+        TransactionTask.objects.filter(transaction_id=withdrawal.id).update(
+            status=TransactionTask.StatusChoices.FAILED
+        )
+
+    withdrawal.status = Transaction.StatusChoices.CANCELED
+    return withdrawal
@@ -1,47 +1,30 @@
-import threading
-from typing import Dict
+from typing import List
 
 from django.db import transaction
-from rest_framework import status
 
 from wallets.models import Transaction, Wallet
-from wallets.utils import request_third_party_transaction
+from wallets.services.outbox import deliver_outbox, enqueue_provider_calls
 
-lock = threading.Lock()
 
+def reserve_deposit(wallet: Wallet, amount: int) -> Transaction:
+    with transaction.atomic():
+        new_transaction = Transaction.objects.create(
+            wallet=wallet,
+            type=Transaction.TypeChoices.DEPOSIT,
+            amount=amount,
+            status=Transaction.StatusChoices.PENDING,
+        )
+        enqueue_provider_calls([new_transaction])
 
-def deposit(wallet_uuid: str, amount: int) -> Dict[str, int]:
-    wallet = Wallet.objects.get(uuid=wallet_uuid)
+    return new_transaction
 
-    response = request_third_party_transaction(wallet, amount, "deposit")
-    third_party_data = response.json()
-    third_party_status = third_party_data.get("status")
 
-    with transaction.atomic():
-        if third_party_status == status.HTTP_200_OK:
-            wallet.balance += amount
-            wallet.save()
-            wallet.set_balance_cache()
-
-            Transaction.objects.create(
-                wallet=wallet,
-                type=Transaction.TypeChoices.DEPOSIT,
-                amount=amount,
-                status=Transaction.StatusChoices.SUCCESS,
-            )
-            return {
-                "message": "Deposit successful",
-                "current_amount": wallet.balance,
-                "status": status.HTTP_200_OK,
-            }
-        else:
-            Transaction.objects.create(
-                wallet=wallet,
-                type=Transaction.TypeChoices.DEPOSIT,
-                amount=amount,
-                status=Transaction.StatusChoices.FAILED,
-            )
-            return {
-                "message": "Failed to deposit",
-                "status": third_party_status,
-            }
+# Deposits are settled by the outbox now; these drain any process_deposit(s)
+# messages queued before it was introduced.
+def settle_deposit(transaction_id: int) -> Transaction:
+    deliver_outbox(transaction_ids=[transaction_id])
+    return Transaction.objects.get(id=transaction_id)
+
+
+def settle_deposits(transaction_ids: List[int]) -> int:
+    return deliver_outbox(transaction_ids=transaction_ids)
@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db.models.functions import TruncSecond
+from django.utils import timezone
+
+from wallets.models import Transaction
+from wallets.tasks.settle_withdrawals import settle_withdrawals
+
+
+def dispatch_due_withdrawals(
+    window: Optional[float] = None, now: Optional[datetime] = None
+) -> int:
+    window = window or settings.WITHDRAWAL_SETTLEMENT["DISPATCH_WINDOW"]
+    now = now or timezone.now()
+
+    # Served by the partial index on pending withdrawals; only the distinct
+    # due seconds inside the window are read, never the rows themselves.
+    due_times = (
+        Transaction.objects.filter(
+            type=Transaction.TypeChoices.WITHDRAWAL,
+            status=Transaction.StatusChoices.PENDING,
+            scheduled_for__lt=now + timedelta(seconds=window),
+        )
+        .annotate(due_at=TruncSecond("scheduled_for"))
+        .values_list("due_at", flat=True)
+        .distinct()
+        .order_by("due_at")
+    )
+
+    # At most one message per second of the window, however many
+    # withdrawals are scheduled; everything overdue goes out right away.
+    dispatched = 0
+    overdue = False
+    for due_at in due_times:
+        # Fire at the end of the second so every row in it is due.
+        eta = due_at + timedelta(seconds=1)
+        if eta <= now:
+            overdue = True
+            continue
+        settle_withdrawals.apply_async(eta=eta)
+        dispatched += 1
+    if overdue:
+        settle_withdrawals.delay()
+        dispatched += 1
+
+    return dispatched
@@ -0,0 +1,143 @@
+from functools import reduce
+from operator import or_
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q, Sum
+
+from wallets.models import (
+    BalanceSnapshot,
+    LedgerEntry,
+    Transaction,
+    Wallet,
+    WalletBalanceShard,
+)
+
+
+def post_entries(
+    movements: Iterable[Tuple[Wallet, int, Optional[Transaction]]]
+) -> None:
+    # Callers update the wallet row, or one of its balance shards, first so
+    # a row lock is held while the entries are inserted; snapshot_balances
+    # relies on that.
+    entries = []
+    for wallet, amount, source in movements:
+        entries += [
+            LedgerEntry(
+                wallet=wallet,
+                account=LedgerEntry.AccountChoices.WALLET,
+                amount=amount,
+                transaction=source,
+            ),
+            LedgerEntry(
+                wallet=wallet,
+                account=LedgerEntry.AccountChoices.PROVIDER,
+                amount=-amount,
+                transaction=source,
+            ),
+        ]
+    LedgerEntry.objects.bulk_create(entries)
+
+
+def ledger_balances(
+    wallet_ids: List[int], use_snapshots: bool = True
+) -> Dict[int, Tuple[int, int]]:
+    # Maps each wallet id to (balance, last entry id) as of its latest
+    # snapshot plus the entries posted after it.
+    balances = {wallet_id: (0, 0) for wallet_id in wallet_ids}
+    if not wallet_ids:
+        return balances
+
+    if use_snapshots:
+        snapshots = (
+            BalanceSnapshot.objects.filter(wallet_id__in=wallet_ids)
+            .order_by("wallet_id", "-created_at")
+            .distinct("wallet_id")
+            .values_list("wallet_id", "balance", "last_entry_id")
+        )
+        for wallet_id, balance, last_entry_id in snapshots:
+            balances[wallet_id] = (balance, last_entry_id)
+
+    tails = (
+        LedgerEntry.objects.filter(account=LedgerEntry.AccountChoices.WALLET)
+        .filter(
+            reduce(
+                or_,
+                [
+                    Q(wallet_id=wallet_id, id__gt=last_entry_id)
+                    for wallet_id, (_, last_entry_id) in balances.items()
+                ],
+            )
+        )
+        .values("wallet_id")
+        .annotate(total=Sum("amount"), last_entry_id=Max("id"))
+        .values_list("wallet_id", "total", "last_entry_id")
+    )
+    for wallet_id, total, last_entry_id in tails:
+        balances[wallet_id] = (balances[wallet_id][0] + total, last_entry_id)
+    return balances
+
+
+def ledger_balance(wallet: Wallet, until=None) -> int:
+    snapshots = wallet.balance_snapshots.order_by("-created_at")
+    entries = wallet.ledger_entries.filter(
+        account=LedgerEntry.AccountChoices.WALLET
+    )
+    if until is not None:
+        snapshots = snapshots.filter(created_at__lte=until)
+        entries = entries.filter(created_at__lte=until)
+
+    snapshot = snapshots.first()
+    if snapshot is not None:
+        entries = entries.filter(id__gt=snapshot.last_entry_id)
+    total = entries.aggregate(total=Sum("amount"))["total"] or 0
+    return (snapshot.balance if snapshot else 0) + total
+
+
+def snapshot_balances(chunk_size: Optional[int] = None) -> int:
+    chunk_size = chunk_size or settings.LEDGER["SNAPSHOT_CHUNK_SIZE"]
+    watermark = (
+        BalanceSnapshot.objects.aggregate(last=Max("last_entry_id"))["last"]
+        or 0
+    )
+    wallet_ids = sorted(
+        LedgerEntry.objects.filter(
+            id__gt=watermark, account=LedgerEntry.AccountChoices.WALLET
+        )
+        .values_list("wallet_id", flat=True)
+        .distinct()
+    )
+
+    created = 0
+    for start in range(0, len(wallet_ids), chunk_size):
+        chunk = wallet_ids[start : start + chunk_size]
+        with transaction.atomic():
+            # Once the wallet and shard rows are locked no entry for them is
+            # still uncommitted, so nothing can later appear below
+            # last_entry_id. Shards go first, as in consolidate_shards.
+            list(
+                WalletBalanceShard.objects.select_for_update()
+                .filter(wallet_id__in=chunk)
+                .order_by("id")
+                .values_list("id", flat=True)
+            )
+            list(
+                Wallet.objects.select_for_update()
+                .filter(id__in=chunk)
+                .order_by("id")
+                .values_list("id", flat=True)
+            )
+            balances = ledger_balances(chunk)
+            snapshots = [
+                BalanceSnapshot(
+                    wallet_id=wallet_id,
+                    balance=balance,
+                    last_entry_id=last_entry_id,
+                )
+                for wallet_id, (balance, last_entry_id) in balances.items()
+                if last_entry_id
+            ]
+            BalanceSnapshot.objects.bulk_create(snapshots)
+        created += len(snapshots)
+    return created
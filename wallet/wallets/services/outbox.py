@@ -0,0 +1,218 @@
+import asyncio
+import os
+import random
+import threading
+from datetime import timedelta
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from wallets.metrics import OUTBOX_DELIVERIES
+from wallets.models import OutboxMessage, Transaction, TransactionTask
+from wallets.services.balance import credit_wallets
+from wallets.tasks.deliver_outbox import deliver_outbox as deliver_outbox_task
+from wallets.utils import arequest_third_party_transaction
+
+PROVIDER_TRANSACTION_TYPES = {
+    Transaction.TypeChoices.DEPOSIT: "deposit",
+    Transaction.TypeChoices.WITHDRAWAL: "withdrawal",
+}
+
+
+def finish_transactions(transaction_ids: List[int], succeeded: bool) -> None:
+    if not transaction_ids:
+        return
+
+    Transaction.objects.filter(id__in=transaction_ids).update(
+        status=(
+            Transaction.StatusChoices.SUCCESS
+            if succeeded
+            else Transaction.StatusChoices.FAILED
+        )
+    )
+    # Withdrawals scheduled before batching still have a celery task row.
+    TransactionTask.objects.filter(transaction_id__in=transaction_ids).update(
+        status=(
+            TransactionTask.StatusChoices.SUCCESS
+            if succeeded
+            else TransactionTask.StatusChoices.FAILED
+        )
+    )
+
+
+def enqueue_provider_calls(
+    transactions: List[Transaction], dispatch: bool = True
+) -> None:
+    # Must run inside the transaction that created or claimed them, so the
+    # provider call is recorded if and only if that state change commits.
+    if not transactions:
+        return
+
+    now = timezone.now()
+    OutboxMessage.objects.bulk_create(
+        [
+            OutboxMessage(transaction=pending, next_attempt_at=now)
+            for pending in transactions
+        ]
+    )
+    if dispatch:
+        transaction_ids = [pending.id for pending in transactions]
+        transaction.on_commit(
+            lambda: deliver_outbox_task.delay(transaction_ids=transaction_ids)
+        )
+
+
+def _backoff(attempts: int) -> timedelta:
+    # Exponential backoff with equal jitter: half the delay is fixed, the
+    # other half random, so retries from one outage spread out.
+    config = settings.OUTBOX
+    delay = min(config["BACKOFF_MAX"], config["BACKOFF_BASE"] * 2**attempts)
+    return timedelta(seconds=delay / 2 + random.uniform(0, delay / 2))
+
+
+def _claim(limit: int, transaction_ids=None) -> List[OutboxMessage]:
+    now = timezone.now()
+    with transaction.atomic():
+        queryset = OutboxMessage.objects.filter(
+            status=OutboxMessage.StatusChoices.PENDING,
+            next_attempt_at__lte=now,
+        )
+        if transaction_ids is not None:
+            queryset = queryset.filter(transaction_id__in=transaction_ids)
+        messages = list(
+            queryset.select_for_update(skip_locked=True, of=("self",))
+            .select_related("transaction__wallet")
+            .order_by("next_attempt_at")[:limit]
+        )
+
+        # Hide the claimed messages from other dispatchers for the length
+        # of a call; if this one dies they become due again by themselves.
+        lease = timedelta(seconds=settings.OUTBOX["LEASE_TIMEOUT"])
+        OutboxMessage.objects.filter(
+            id__in=[message.id for message in messages]
+        ).update(attempts=F("attempts") + 1, next_attempt_at=now + lease)
+    for message in messages:
+        message.attempts += 1
+    return messages
+
+
+async def _deliver(message: OutboxMessage, slots) -> Tuple[str, str]:
+    pending = message.transaction
+    try:
+        async with slots:
+            response = await arequest_third_party_transaction(
+                pending.wallet,
+                pending.amount,
+                PROVIDER_TRANSACTION_TYPES[pending.type],
+                reference=pending.uuid,
+            )
+        status_code = int(response.json().get("status", 200))
+    except Exception as e:
+        return OutboxMessage.StatusChoices.PENDING, str(e)
+
+    if status_code == 200:
+        return OutboxMessage.StatusChoices.DELIVERED, ""
+    error = f"Provider returned status {status_code}"
+    if status_code >= 500:
+        return OutboxMessage.StatusChoices.PENDING, error
+    return OutboxMessage.StatusChoices.REJECTED, error
+
+
+async def _deliver_all(messages: List[OutboxMessage]):
+    # The whole batch is in flight at once on one event loop instead of a
+    # thread per call, so a slow provider costs sockets, not threads.
+    slots = asyncio.Semaphore(settings.OUTBOX["CONCURRENCY"])
+    return await asyncio.gather(
+        *(_deliver(message, slots) for message in messages)
+    )
+
+
+_loops = threading.local()
+
+
+def _event_loop() -> asyncio.AbstractEventLoop:
+    # One loop per worker thread for the life of the worker, so the async
+    # client bound to it keeps its connections from batch to batch. Keyed
+    # by pid as well: a forked worker must not reuse its parent's sockets.
+    pid = os.getpid()
+    if getattr(_loops, "pid", None) != pid or _loops.loop.is_closed():
+        _loops.pid = pid
+        _loops.loop = asyncio.new_event_loop()
+    return _loops.loop
+
+
+def _apply(messages: List[OutboxMessage], outcomes) -> None:
+    now = timezone.now()
+    with transaction.atomic():
+        # A call that outlived its lease may have been claimed again by
+        # another dispatcher; only the latest attempt settles the message.
+        current = dict(
+            OutboxMessage.objects.select_for_update()
+            .filter(
+                id__in=[message.id for message in messages],
+                status=OutboxMessage.StatusChoices.PENDING,
+            )
+            .values_list("id", "attempts")
+        )
+
+        owned, delivered, failed = [], [], []
+        for message, (status, error) in zip(messages, outcomes):
+            if current.get(message.id) != message.attempts:
+                continue
+            if (
+                status == OutboxMessage.StatusChoices.PENDING
+                and message.attempts >= settings.OUTBOX["MAX_ATTEMPTS"]
+            ):
+                status = OutboxMessage.StatusChoices.DEAD
+            message.status = status
+            message.last_error = error
+            message.updated_at = now
+            owned.append(message)
+            OUTBOX_DELIVERIES.labels(
+                "retry"
+                if status == OutboxMessage.StatusChoices.PENDING
+                else OutboxMessage.StatusChoices(status).label.lower()
+            ).inc()
+            if status == OutboxMessage.StatusChoices.PENDING:
+                message.next_attempt_at = now + _backoff(message.attempts)
+            elif status == OutboxMessage.StatusChoices.DELIVERED:
+                delivered.append(message.transaction)
+            else:
+                failed.append(message.transaction)
+
+        finish_transactions([pending.id for pending in delivered], True)
+        finish_transactions([pending.id for pending in failed], False)
+        # Deposits are credited once the provider has taken the money;
+        # withdrawals were debited when claimed and are refunded on failure.
+        credit_wallets(
+            [
+                pending
+                for pending in delivered
+                if pending.type == Transaction.TypeChoices.DEPOSIT
+            ]
+            + [
+                pending
+                for pending in failed
+                if pending.type == Transaction.TypeChoices.WITHDRAWAL
+            ]
+        )
+        OutboxMessage.objects.bulk_update(
+            owned, ["status", "last_error", "next_attempt_at", "updated_at"]
+        )
+
+
+def deliver_outbox(limit: Optional[int] = None, transaction_ids=None) -> int:
+    if transaction_ids is not None:
+        if not transaction_ids:
+            return 0
+        limit = limit or len(transaction_ids)
+    messages = _claim(limit or settings.OUTBOX["BATCH_SIZE"], transaction_ids)
+    if not messages:
+        return 0
+
+    outcomes = _event_loop().run_until_complete(_deliver_all(messages))
+    _apply(messages, outcomes)
+    return len(messages)
@@ -0,0 +1,187 @@
+import gzip
+import os
+from datetime import date, datetime, timezone
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone as django_timezone
+
+from wallets.models import OutboxMessage, Transaction, TransactionTask
+
+# Partitions are named after their month, e.g. wallets_transaction_p2026_10.
+PARTITION_PREFIX = f"{Transaction._meta.db_table}_p"
+
+
+def _add_months(month: date, months: int) -> date:
+    months += month.year * 12 + month.month - 1
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def _bound(month: date) -> datetime:
+    # Partition bounds are midnight UTC on the first of the month.
+    return datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+
+
+def month_of(value: datetime) -> date:
+    value = value.astimezone(timezone.utc)
+    return date(value.year, value.month, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARTITION_PREFIX}{month:%Y_%m}"
+
+
+def _months(names) -> List[date]:
+    return sorted(
+        datetime.strptime(name[len(PARTITION_PREFIX) :], "%Y_%m").date()
+        for name in names
+    )
+
+
+def transaction_partitions() -> List[date]:
+    # Months with a partition attached, oldest first.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass",
+            [Transaction._meta.db_table],
+        )
+        return _months(name for name, in cursor.fetchall())
+
+
+def detached_partitions() -> List[date]:
+    # Months detached by an archive run that failed before dropping them.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relname FROM pg_class "
+            "WHERE relkind = 'r' AND NOT relispartition AND relname ~ %s",
+            [f"^{PARTITION_PREFIX}[0-9]{{4}}_[0-9]{{2}}$"],
+        )
+        return _months(name for name, in cursor.fetchall())
+
+
+def create_partitions(
+    months_ahead: Optional[int] = None, since: Optional[datetime] = None
+) -> List[str]:
+    # Makes sure a partition exists for every month from since (by default
+    # the current one) to months_ahead months from now. An insert into a
+    # month without a partition fails, so this runs well ahead of need.
+    if months_ahead is None:
+        months_ahead = settings.TRANSACTION_PARTITIONS["MONTHS_AHEAD"]
+    now = month_of(django_timezone.now())
+    month = month_of(since) if since else now
+    last = _add_months(now, months_ahead)
+    existing = set(transaction_partitions())
+
+    created = []
+    with connection.cursor() as cursor:
+        while month <= last:
+            if month not in existing:
+                cursor.execute(
+                    f'CREATE TABLE IF NOT EXISTS "{partition_name(month)}" '
+                    f'PARTITION OF "{Transaction._meta.db_table}" '
+                    "FOR VALUES FROM (%s) TO (%s)",
+                    [_bound(month), _bound(_add_months(month, 1))],
+                )
+                created.append(partition_name(month))
+            month = _add_months(month, 1)
+    return created
+
+
+def archivable_partitions(retain_months: Optional[int] = None) -> List[date]:
+    # Months older than the retained ones, oldest first, along with any
+    # left detached by an earlier run.
+    if retain_months is None:
+        retain_months = settings.TRANSACTION_PARTITIONS["RETAIN_MONTHS"]
+    cutoff = _add_months(month_of(django_timezone.now()), -retain_months)
+    return sorted(
+        {month for month in transaction_partitions() if month < cutoff}
+        | set(detached_partitions())
+    )
+
+
+def _copy(cursor, query: str, path: str) -> int:
+    # Written under a temporary name and renamed once complete, so a file
+    # with the final name is always a whole archive.
+    partial = f"{path}.partial"
+    with gzip.open(partial, "wb") as f:
+        cursor.copy_expert(
+            f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", f
+        )
+        rows = cursor.rowcount
+    os.replace(partial, path)
+    return rows
+
+
+def archive_partition(month: date, directory: str) -> dict:
+    # Detaches the month's partition, writes it to gzipped CSV along with
+    # the tasks and outbox messages of its transactions, then drops them
+    # all. Ledger entries and bulk operation items keep their transaction
+    # ids, which now refer into the archive. DETACH ... CONCURRENTLY and
+    # pg_inherits.inhdetachpending need PostgreSQL 14 or later.
+    name = partition_name(month)
+    table = Transaction._meta.db_table
+    unfinished = Transaction.objects.filter(
+        created_at__gte=_bound(month),
+        created_at__lt=_bound(_add_months(month, 1)),
+        status__in=(
+            Transaction.StatusChoices.PENDING,
+            Transaction.StatusChoices.PROCESSING,
+        ),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT i.inhdetachpending FROM pg_inherits i "
+            "WHERE i.inhrelid = to_regclass(%s) "
+            "AND i.inhparent = %s::regclass",
+            [name, table],
+        )
+        attached = cursor.fetchone()
+        if attached is not None:
+            if not attached[0] and unfinished.exists():
+                raise ValueError(
+                    f"{name} still holds pending or processing transactions"
+                )
+            # CONCURRENTLY waits out running queries instead of blocking
+            # new ones on the parent; an interrupted detach is finished off
+            # on the next run.
+            cursor.execute(
+                f'ALTER TABLE "{table}" DETACH PARTITION "{name}" '
+                + ("FINALIZE" if attached[0] else "CONCURRENTLY")
+            )
+        elif month not in detached_partitions():
+            raise ValueError(f"No partition {name} to archive")
+
+        os.makedirs(directory, exist_ok=True)
+        ids = f'SELECT id FROM "{name}"'
+        archived = {
+            "partition": name,
+            "transactions": _copy(
+                cursor,
+                f'SELECT * FROM "{name}"',
+                os.path.join(directory, f"{name}.csv.gz"),
+            ),
+            "tasks": _copy(
+                cursor,
+                f'SELECT * FROM "{TransactionTask._meta.db_table}" '
+                f"WHERE transaction_id IN ({ids})",
+                os.path.join(directory, f"{name}_tasks.csv.gz"),
+            ),
+            "outbox_messages": _copy(
+                cursor,
+                f'SELECT * FROM "{OutboxMessage._meta.db_table}" '
+                f"WHERE transaction_id IN ({ids})",
+                os.path.join(directory, f"{name}_outbox.csv.gz"),
+            ),
+        }
+
+        with transaction.atomic():
+            for model in (TransactionTask, OutboxMessage):
+                cursor.execute(
+                    f'DELETE FROM "{model._meta.db_table}" '
+                    f"WHERE transaction_id IN ({ids})"
+                )
+            cursor.execute(f'DROP TABLE "{name}"')
+    return archived
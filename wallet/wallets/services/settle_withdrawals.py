@@ -0,0 +1,82 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from wallets.models import Transaction
+from wallets.services.balance import (
+    InsufficientFundsError,
+    debit_wallet,
+    release_funds,
+)
+from wallets.services.outbox import (
+    deliver_outbox,
+    enqueue_provider_calls,
+    finish_transactions,
+)
+
+
+def _claim(queryset, limit: int) -> Tuple[List[Transaction], int]:
+    with transaction.atomic():
+        # SKIP LOCKED lets parallel workers each take a disjoint chunk; only
+        # the transaction rows are locked, never the wallets.
+        due = list(
+            queryset.select_for_update(skip_locked=True, of=("self",))
+            .select_related("wallet")
+            .filter(
+                type=Transaction.TypeChoices.WITHDRAWAL,
+                status=Transaction.StatusChoices.PENDING,
+            )
+            .order_by("scheduled_for")[:limit]
+        )
+
+        claimed, rejected = [], []
+        # Debit in wallet order so concurrent workers never deadlock.
+        for withdrawal in sorted(due, key=lambda w: w.wallet_id):
+            try:
+                debit_wallet(
+                    withdrawal.wallet,
+                    withdrawal.amount,
+                    reserved=True,
+                    transaction=withdrawal,
+                )
+                claimed.append(withdrawal)
+            except InsufficientFundsError:
+                release_funds(withdrawal.wallet, withdrawal.amount)
+                rejected.append(withdrawal)
+
+        Transaction.objects.filter(
+            id__in=[withdrawal.id for withdrawal in claimed]
+        ).update(status=Transaction.StatusChoices.PROCESSING)
+        finish_transactions([withdrawal.id for withdrawal in rejected], False)
+        # The provider call commits with the debit and is made inline below;
+        # a crash before it is made leaves the message to be retried.
+        enqueue_provider_calls(claimed, dispatch=False)
+
+    return claimed, len(due)
+
+
+def settle_due_withdrawals(
+    chunk_size: Optional[int] = None, now: Optional[datetime] = None
+) -> int:
+    chunk_size = chunk_size or settings.WITHDRAWAL_SETTLEMENT["CHUNK_SIZE"]
+    withdrawals, taken = _claim(
+        Transaction.objects.filter(scheduled_for__lte=now or timezone.now()),
+        chunk_size,
+    )
+    deliver_outbox(
+        transaction_ids=[withdrawal.id for withdrawal in withdrawals]
+    )
+    return taken
+
+
+def settle_withdrawal(transaction_id: int) -> int:
+    withdrawals, taken = _claim(
+        Transaction.objects.filter(id=transaction_id), 1
+    )
+    deliver_outbox(
+        transaction_ids=[withdrawal.id for withdrawal in withdrawals]
+    )
+    return taken
@@ -0,0 +1,35 @@
+from django.db import transaction
+
+from wallets.models import Wallet, WalletBalanceShard
+from wallets.services.balance import consolidate_shards
+
+
+def set_shard_count(wallet: Wallet, shard_count: int) -> Wallet:
+    if shard_count < 0:
+        raise ValueError("Shard count cannot be negative")
+
+    with transaction.atomic():
+        # Shards go first, as in consolidate_shards. The wallet lock is
+        # held until commit: credits routed by the old count wait on it and
+        # then go to the wallet row rather than a shard being swept. Rows
+        # beyond a lowered count are left in place for consolidate_shards.
+        list(
+            WalletBalanceShard.objects.select_for_update()
+            .filter(wallet_id=wallet.pk)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        Wallet.objects.select_for_update().get(pk=wallet.pk)
+        WalletBalanceShard.objects.bulk_create(
+            [
+                WalletBalanceShard(wallet=wallet, shard=shard)
+                for shard in range(shard_count)
+            ],
+            ignore_conflicts=True,
+        )
+        Wallet.objects.filter(pk=wallet.pk).update(shard_count=shard_count)
+        wallet.shard_count = shard_count
+        if not shard_count:
+            consolidate_shards(wallet)
+
+    return wallet
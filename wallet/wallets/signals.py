@@ -0,0 +1,68 @@
+import logging
+import os
+import time
+from datetime import datetime
+
+from celery import signals
+from prometheus_client import start_http_server
+
+from wallets.metrics import (
+    CELERY_TASK_DURATION,
+    CELERY_TASK_QUEUE_LAG,
+    mark_process_dead,
+    registry,
+)
+
+_started = {}
+
+
+@signals.before_task_publish.connect
+def stamp_published_at(headers=None, **kwargs):
+    # Tasks without an ETA were due the moment they were sent.
+    if headers is not None:
+        headers.setdefault("published_at", time.time())
+
+
+@signals.task_prerun.connect
+def observe_queue_lag(task_id=None, task=None, **kwargs):
+    now = time.time()
+    _started[task_id] = time.perf_counter()
+
+    eta = task.request.eta
+    if eta:
+        due = datetime.fromisoformat(eta).timestamp()
+    else:
+        due = getattr(task.request, "published_at", None)
+    if due is not None:
+        CELERY_TASK_QUEUE_LAG.labels(task.name).observe(max(0, now - due))
+
+
+@signals.task_postrun.connect
+def observe_run_time(task_id=None, task=None, state=None, **kwargs):
+    started = _started.pop(task_id, None)
+    if started is not None:
+        CELERY_TASK_DURATION.labels(task.name, state or "UNKNOWN").observe(
+            time.perf_counter() - started
+        )
+
+
+@signals.worker_init.connect
+def serve_metrics(**kwargs):
+    # Workers have no /metrics view of their own; the main process serves
+    # the merged samples of its pool processes instead.
+    port = os.getenv("CELERY_METRICS_PORT")
+    if port:
+        start_http_server(int(port), registry=registry())
+
+
+@signals.worker_process_shutdown.connect
+def drop_live_gauges(pid=None, **kwargs):
+    # Pool processes skip the atexit hook in wallets.metrics.
+    mark_process_dead(pid)
+
+
+@signals.worker_process_shutdown.connect
+def flush_logs(**kwargs):
+    # Pool processes end with os._exit(), skipping the atexit hook that
+    # would otherwise drain the write-behind log queue.
+    logging.shutdown()
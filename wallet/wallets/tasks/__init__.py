@@ -1 +1,11 @@
-from wallets.tasks.process_withdrawal import process_withdrawal
\ No newline at end of file
+from wallets.tasks.create_transaction_partitions import (
+    create_transaction_partitions,
+)
+from wallets.tasks.deliver_outbox import deliver_outbox
+from wallets.tasks.dispatch_withdrawals import dispatch_withdrawals
+from wallets.tasks.process_bulk_operation import process_bulk_operation
+from wallets.tasks.process_deposit import process_deposit
+from wallets.tasks.process_deposits import process_deposits
+from wallets.tasks.process_withdrawal import process_withdrawal
+from wallets.tasks.settle_withdrawals import settle_withdrawals
+from wallets.tasks.snapshot_balances import snapshot_balances
@@ -0,0 +1,9 @@
+from celery import shared_task
+
+
+@shared_task(bind=True)
+def create_transaction_partitions(self, **kwargs):
+    # wallets.services imports wallets.tasks, so import it lazily.
+    from wallets.services.partitions import create_partitions
+
+    create_partitions()
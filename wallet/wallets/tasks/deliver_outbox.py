@@ -0,0 +1,15 @@
+from celery import shared_task
+
+
+@shared_task(bind=True)
+def deliver_outbox(self, **kwargs):
+    # wallets.services imports wallets.tasks, so import it lazily.
+    from wallets.services.outbox import deliver_outbox
+
+    transaction_ids = kwargs.get("transaction_ids")
+    if transaction_ids is not None:
+        deliver_outbox(transaction_ids=transaction_ids)
+        return
+
+    while deliver_outbox():
+        pass
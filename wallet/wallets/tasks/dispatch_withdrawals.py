@@ -0,0 +1,11 @@
+from celery import shared_task
+
+
+@shared_task(bind=True)
+def dispatch_withdrawals(self, **kwargs):
+    # wallets.services imports wallets.tasks, so import it lazily.
+    from wallets.services.dispatch_withdrawals import (
+        dispatch_due_withdrawals,
+    )
+
+    dispatch_due_withdrawals()
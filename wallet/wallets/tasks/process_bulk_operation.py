@@ -0,0 +1,9 @@
+from celery import shared_task
+
+
+@shared_task(bind=True)
+def process_bulk_operation(self, **kwargs):
+    # wallets.services imports wallets.tasks, so import it lazily.
+    from wallets.services.bulk_operations import process_bulk_operation
+
+    process_bulk_operation(kwargs.get("operation_id"))
@@ -0,0 +1,9 @@
+from celery import shared_task
+
+
+@shared_task(bind=True)
+def process_deposit(self, **kwargs):
+    # wallets.services imports wallets.tasks, so import it lazily.
+    from wallets.services.deposit import settle_deposit
+
+    settle_deposit(kwargs.get("transaction_id"))
@@ -0,0 +1,9 @@
+from celery import shared_task
+
+
+@shared_task(bind=True)
+def process_deposits(self, **kwargs):
+    # wallets.services imports wallets.tasks, so import it lazily.
+    from wallets.services.deposit import settle_deposits
+
+    settle_deposits(kwargs.get("transaction_ids", []))
@@ -0,0 +1,10 @@
+from celery import shared_task
+
+
+@shared_task(bind=True)
+def settle_withdrawals(self, **kwargs):
+    # wallets.services imports wallets.tasks, so import it lazily.
+    from wallets.services.settle_withdrawals import settle_due_withdrawals
+
+    while settle_due_withdrawals():
+        pass
@@ -0,0 +1,9 @@
+from celery import shared_task
+
+
+@shared_task(bind=True)
+def snapshot_balances(self, **kwargs):
+    # wallets.services imports wallets.tasks, so import it lazily.
+    from wallets.services.ledger import snapshot_balances
+
+    snapshot_balances()
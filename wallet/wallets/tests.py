@@ -0,0 +1,669 @@
+import time
+import uuid
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db.models import F
+from django.test import (
+    AsyncClient,
+    RequestFactory,
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from wallets import cache as balance_cache
+from wallets.admin import LargeTableAdmin
+from wallets.clients import get_async_third_party_client
+from wallets.clients.circuit_breaker import (
+    CircuitBreaker,
+    ProviderUnavailableError,
+)
+from wallets.models import (
+    BulkOperation,
+    BulkOperationItem,
+    IdempotencyKey,
+    LedgerEntry,
+    OutboxMessage,
+    Transaction,
+    TransactionTask,
+    Wallet,
+    WalletBalanceShard,
+)
+from wallets.services import (
+    credit_wallet,
+    credit_wallets,
+    debit_wallet,
+    deliver_outbox,
+    reserve_deposit,
+    schedule_withdrawal,
+    set_shard_count,
+    settle_due_withdrawals,
+)
+from wallets.services.outbox import _apply, _claim, _event_loop
+
+
+def create_wallet(balance=0, **kwargs):
+    user = get_user_model().objects.create(username=uuid.uuid4().hex)
+    return Wallet.objects.create(user=user, balance=balance, **kwargs)
+
+
+@override_settings(
+    IDEMPOTENCY={"RESPONSE_TIMEOUT": 60, "LOCK_TIMEOUT": 60, "WAIT_TIMEOUT": 0}
+)
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        self.wallet = create_wallet()
+        self.url = reverse("deposit", args=[self.wallet.uuid])
+        self.key = uuid.uuid4().hex
+
+    def deposit(self, amount):
+        return self.client.post(
+            self.url,
+            {"amount": amount},
+            content_type="application/json",
+            HTTP_IDEMPOTENCY_KEY=self.key,
+        )
+
+    def test_repeated_request_replays_the_response(self):
+        first = self.deposit(5)
+        second = self.deposit(5)
+
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(second.status_code, 202)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_key_reused_with_another_body_is_rejected(self):
+        self.deposit(5)
+
+        response = self.deposit(6)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_key_in_progress_answers_conflict(self):
+        IdempotencyKey.objects.create(
+            scope=f"CreateDepositView:{self.url}",
+            key=self.key,
+            request_hash="x",
+        )
+
+        response = self.deposit(5)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_stale_key_in_progress_is_taken_over(self):
+        IdempotencyKey.objects.create(
+            scope=f"CreateDepositView:{self.url}",
+            key=self.key,
+            request_hash="x",
+            started_at=timezone.now() - timedelta(seconds=61),
+        )
+
+        response = self.deposit(5)
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(Transaction.objects.count(), 1)
+        record = IdempotencyKey.objects.get(key=self.key)
+        self.assertEqual(record.response_status, 202)
+        self.assertEqual(self.deposit(5)["Idempotent-Replayed"], "true")
+
+
+class AuditLedgerTests(TestCase):
+    def test_consistent_ledger_passes(self):
+        create_wallet(balance=0)
+
+        call_command("audit_ledger", stdout=StringIO())
+
+    def test_drift_fails_the_command(self):
+        create_wallet(balance=100)
+
+        with self.assertRaisesMessage(CommandError, "1 wallet(s) disagree"):
+            call_command("audit_ledger", stdout=StringIO())
+
+
+class ShardCountTests(TestCase):
+    def test_credit_routed_by_a_stale_count_lands_on_the_wallet(self):
+        wallet = set_shard_count(create_wallet(), 2)
+        stale = Wallet.objects.get(pk=wallet.pk)
+        set_shard_count(wallet, 0)
+
+        credit_wallet(stale, 10)
+
+        wallet.refresh_from_db()
+        self.assertEqual(wallet.balance, 10)
+        self.assertEqual(wallet.total_balance, 10)
+        self.assertFalse(
+            WalletBalanceShard.objects.filter(
+                wallet=wallet, balance__gt=0
+            ).exists()
+        )
+
+
+class BalanceCacheTests(TestCase):
+    def test_read_falls_back_to_the_database_without_redis(self):
+        wallet = create_wallet(balance=25)
+
+        with mock.patch.object(
+            balance_cache.cache, "get", side_effect=ConnectionError
+        ):
+            balance = Wallet.get_cached_balance(wallet.uuid)
+
+        self.assertEqual(balance, 25)
+
+    def test_write_commits_without_redis(self):
+        wallet = create_wallet()
+
+        with mock.patch.object(
+            balance_cache.cache, "set", side_effect=ConnectionError
+        ), self.captureOnCommitCallbacks(execute=True):
+            credit_wallet(wallet, 10)
+
+        wallet.refresh_from_db()
+        self.assertEqual(wallet.balance, 10)
+
+
+class CreditWalletsTests(TestCase):
+    def test_credits_every_wallet_whatever_the_order(self):
+        first, second = create_wallet(), create_wallet()
+        sharded = set_shard_count(create_wallet(), 2)
+        transactions = [
+            Transaction.objects.create(
+                wallet=wallet,
+                type=Transaction.TypeChoices.DEPOSIT,
+                status=Transaction.StatusChoices.SUCCESS,
+                amount=amount,
+            )
+            for wallet, amount in (
+                (sharded, 7),
+                (second, 5),
+                (first, 3),
+                (second, 2),
+            )
+        ]
+
+        with self.assertNumQueries(4):
+            credit_wallets(transactions)
+
+        for wallet, balance in ((first, 3), (second, 7), (sharded, 7)):
+            wallet.refresh_from_db()
+            self.assertEqual(wallet.total_balance, balance)
+            self.assertEqual(
+                LedgerEntry.objects.filter(
+                    wallet=wallet, account=LedgerEntry.AccountChoices.WALLET
+                ).count(),
+                2 if wallet == second else 1,
+            )
+
+
+class CheckQueryPlansTests(TestCase):
+    def test_seeded_data_is_checked_and_removed(self):
+        out = StringIO()
+
+        call_command(
+            "check_query_plans", seed=200, wallets=5, cleanup=True, stdout=out
+        )
+
+        self.assertIn("Seeded 5 wallets", out.getvalue())
+        self.assertIn("Removed synthetic data", out.getvalue())
+        self.assertFalse(Wallet.objects.exists())
+
+    def test_cleanup_leaves_seed_wallets_data_alone(self):
+        call_command(
+            "seed_wallets", wallets=2, transactions=3, stdout=StringIO()
+        )
+
+        call_command(
+            "check_query_plans",
+            seed=100,
+            wallets=5,
+            cleanup=True,
+            stdout=StringIO(),
+        )
+
+        self.assertEqual(Wallet.objects.count(), 2)
+
+
+class CircuitBreakerTests(TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker(
+            name=uuid.uuid4().hex,
+            failure_rate=0.5,
+            min_calls=2,
+            window=10,
+            reset_timeout=0.1,
+            probe_timeout=10,
+        )
+
+    def tearDown(self):
+        keys = get_redis_connection("default").keys(f"{self.breaker.prefix}:*")
+        if keys:
+            get_redis_connection("default").delete(*keys)
+
+    def trip(self):
+        for _ in range(2):
+            self.breaker.before_call()
+            self.breaker.record(False)
+
+    def test_successful_probe_closes_the_breaker(self):
+        self.trip()
+        self.assertEqual(self.breaker.state(), CircuitBreaker.OPEN)
+        with self.assertRaises(ProviderUnavailableError):
+            self.breaker.before_call()
+
+        time.sleep(0.2)
+        self.assertEqual(self.breaker.state(), CircuitBreaker.HALF_OPEN)
+        probe = self.breaker.before_call()
+        self.assertTrue(probe)
+        with self.assertRaises(ProviderUnavailableError):
+            self.breaker.before_call()
+
+        self.breaker.record(True, probe)
+        self.assertEqual(self.breaker.state(), CircuitBreaker.CLOSED)
+        self.assertFalse(self.breaker.before_call())
+
+    def test_success_of_a_call_in_flight_leaves_the_breaker_open(self):
+        self.trip()
+
+        self.breaker.record(True)
+
+        self.assertEqual(self.breaker.state(), CircuitBreaker.OPEN)
+        with self.assertRaises(ProviderUnavailableError):
+            self.breaker.before_call()
+
+    def test_success_while_half_open_waits_for_the_probe(self):
+        self.trip()
+        time.sleep(0.2)
+        probe = self.breaker.before_call()
+
+        self.breaker.record(True)
+        self.assertEqual(self.breaker.state(), CircuitBreaker.HALF_OPEN)
+
+        self.breaker.record(False, probe)
+        self.assertEqual(self.breaker.state(), CircuitBreaker.OPEN)
+
+
+class OutboxMessageAdminTests(TestCase):
+    def setUp(self):
+        self.client.force_login(
+            get_user_model().objects.create_superuser(
+                username="admin", password="admin"
+            )
+        )
+        self.wallet = create_wallet()
+
+    def message(self, transaction_status, status):
+        return OutboxMessage.objects.create(
+            transaction=Transaction.objects.create(
+                wallet=self.wallet,
+                type=Transaction.TypeChoices.WITHDRAWAL,
+                status=transaction_status,
+                amount=10,
+            ),
+            status=status,
+            attempts=8,
+            next_attempt_at=timezone.now() + timedelta(hours=1),
+        )
+
+    def retry_now(self, *messages):
+        return self.client.post(
+            reverse("admin:wallets_outboxmessage_changelist"),
+            {
+                "action": "retry_now",
+                "_selected_action": [message.pk for message in messages],
+            },
+        )
+
+    def test_open_transaction_is_queued_again(self):
+        message = self.message(
+            Transaction.StatusChoices.PROCESSING,
+            OutboxMessage.StatusChoices.DEAD,
+        )
+
+        self.retry_now(message)
+
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboxMessage.StatusChoices.PENDING)
+        self.assertEqual(message.attempts, 0)
+
+    def test_dead_letter_of_a_finalized_transaction_stays_dead(self):
+        message = self.message(
+            Transaction.StatusChoices.FAILED,
+            OutboxMessage.StatusChoices.DEAD,
+        )
+
+        self.retry_now(message)
+
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboxMessage.StatusChoices.DEAD)
+        self.assertEqual(message.attempts, 8)
+
+
+class LargeTableAdminTests(TestCase):
+    def test_search_without_an_override_matches_nothing(self):
+        create_wallet().transactions.create(
+            type=Transaction.TypeChoices.DEPOSIT, amount=10
+        )
+        model_admin = LargeTableAdmin(Transaction, admin.site)
+        request = RequestFactory().get("/", {"q": "10"})
+
+        queryset, _ = model_admin.get_search_results(
+            request, Transaction.objects.all(), "10"
+        )
+
+        with self.assertNumQueries(0):
+            self.assertEqual(list(queryset), [])
+
+
+class OutboxEventLoopTests(TestCase):
+    def test_batches_share_one_provider_client(self):
+        async def client():
+            return get_async_third_party_client()
+
+        first = _event_loop().run_until_complete(client())
+        second = _event_loop().run_until_complete(client())
+
+        self.assertIs(first, second)
+
+
+class OutboxDeliveryTests(TestCase):
+    def provider(self, status=200, error=None):
+        response = mock.Mock(**{"json.return_value": {"status": status}})
+        return mock.patch(
+            "wallets.services.outbox.arequest_third_party_transaction",
+            mock.AsyncMock(return_value=response, side_effect=error),
+        )
+
+    def assertWallet(self, wallet, balance, reserved_amount):
+        wallet.refresh_from_db()
+        self.assertEqual(wallet.balance, balance)
+        self.assertEqual(wallet.reserved_amount, reserved_amount)
+
+    def assertLedger(self, transaction, amounts):
+        self.assertEqual(
+            list(
+                LedgerEntry.objects.filter(
+                    transaction=transaction,
+                    account=LedgerEntry.AccountChoices.WALLET,
+                )
+                .order_by("id")
+                .values_list("amount", flat=True)
+            ),
+            amounts,
+        )
+
+    def withdrawal(self, wallet, amount):
+        return schedule_withdrawal(
+            wallet, amount, timezone.now() - timedelta(seconds=1)
+        )
+
+    def test_delivered_deposit_is_credited(self):
+        wallet = create_wallet()
+        deposit = reserve_deposit(wallet, 100)
+
+        with self.provider(200):
+            deliver_outbox()
+
+        deposit.refresh_from_db()
+        self.assertEqual(deposit.status, Transaction.StatusChoices.SUCCESS)
+        self.assertWallet(wallet, 100, 0)
+        self.assertLedger(deposit, [100])
+
+    def test_rejected_deposit_is_not_credited(self):
+        wallet = create_wallet()
+        deposit = reserve_deposit(wallet, 100)
+
+        with self.provider(400):
+            deliver_outbox()
+
+        deposit.refresh_from_db()
+        self.assertEqual(deposit.status, Transaction.StatusChoices.FAILED)
+        self.assertWallet(wallet, 0, 0)
+        self.assertLedger(deposit, [])
+
+    def test_settled_withdrawal_consumes_its_reservation(self):
+        wallet = create_wallet(balance=100)
+        withdrawal = self.withdrawal(wallet, 40)
+        self.assertWallet(wallet, 100, 40)
+
+        with self.provider(200):
+            settle_due_withdrawals()
+
+        withdrawal.refresh_from_db()
+        self.assertEqual(withdrawal.status, Transaction.StatusChoices.SUCCESS)
+        self.assertWallet(wallet, 60, 0)
+        self.assertLedger(withdrawal, [-40])
+
+    def test_rejected_withdrawal_is_refunded(self):
+        wallet = create_wallet(balance=100)
+        withdrawal = self.withdrawal(wallet, 40)
+
+        with self.provider(400):
+            settle_due_withdrawals()
+
+        withdrawal.refresh_from_db()
+        self.assertEqual(withdrawal.status, Transaction.StatusChoices.FAILED)
+        self.assertWallet(wallet, 100, 0)
+        self.assertLedger(withdrawal, [-40, 40])
+
+    @override_settings(OUTBOX={**settings.OUTBOX, "MAX_ATTEMPTS": 1})
+    def test_dead_withdrawal_is_refunded(self):
+        wallet = create_wallet(balance=100)
+        withdrawal = self.withdrawal(wallet, 40)
+
+        with self.provider(error=ConnectionError):
+            settle_due_withdrawals()
+
+        withdrawal.refresh_from_db()
+        self.assertEqual(withdrawal.status, Transaction.StatusChoices.FAILED)
+        self.assertEqual(
+            withdrawal.outbox_message.status,
+            OutboxMessage.StatusChoices.DEAD,
+        )
+        self.assertWallet(wallet, 100, 0)
+        self.assertLedger(withdrawal, [-40, 40])
+
+    def test_unaffordable_withdrawal_releases_its_reservation(self):
+        wallet = create_wallet(balance=100)
+        withdrawal = self.withdrawal(wallet, 40)
+        debit_wallet(wallet, 80)
+
+        with self.provider(200) as provider:
+            settle_due_withdrawals()
+
+        provider.assert_not_called()
+        withdrawal.refresh_from_db()
+        self.assertEqual(withdrawal.status, Transaction.StatusChoices.FAILED)
+        self.assertWallet(wallet, 20, 0)
+        self.assertLedger(withdrawal, [])
+
+    def test_result_of_an_expired_lease_is_ignored(self):
+        wallet = create_wallet()
+        deposit = reserve_deposit(wallet, 100)
+        messages = _claim(10)
+        # Another dispatcher claimed the message again once the lease ran
+        # out; the first call's result no longer settles it.
+        OutboxMessage.objects.filter(transaction=deposit).update(
+            attempts=F("attempts") + 1
+        )
+
+        _apply(messages, [(OutboxMessage.StatusChoices.DELIVERED, "")])
+
+        deposit.refresh_from_db()
+        self.assertEqual(deposit.status, Transaction.StatusChoices.PENDING)
+        self.assertEqual(
+            deposit.outbox_message.status,
+            OutboxMessage.StatusChoices.PENDING,
+        )
+        self.assertWallet(wallet, 0, 0)
+        self.assertLedger(deposit, [])
+
+
+class WalletTransactionExportTests(TestCase):
+    def setUp(self):
+        self.wallet = create_wallet()
+        Transaction.objects.create(
+            wallet=self.wallet,
+            type=Transaction.TypeChoices.DEPOSIT,
+            status=Transaction.StatusChoices.SUCCESS,
+            amount=10,
+        )
+        self.url = reverse(
+            "wallet-transactions-export", args=[self.wallet.uuid, "csv"]
+        )
+
+    def test_export_streams_under_wsgi(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(
+            lines[0], "uuid,type,status,amount,scheduled_for,created_at"
+        )
+        self.assertEqual(len(lines), 2)
+
+    async def test_export_is_refused_under_asgi(self):
+        response = await AsyncClient().get(self.url)
+
+        self.assertEqual(response.status_code, 421)
+
+
+class QueryBudgetTests(TestCase):
+    # Every page is requested with ROWS rows on it; a query per row would
+    # show up as ROWS extra queries. Admin pages include the session and
+    # user lookups.
+    ROWS = 20
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser(
+            "admin", password=None
+        )
+        for _ in range(cls.ROWS - 1):
+            create_wallet(balance=1000)
+        cls.wallet = set_shard_count(create_wallet(balance=1000), 2)
+        transactions = Transaction.objects.bulk_create(
+            [
+                Transaction(
+                    wallet=cls.wallet,
+                    type=Transaction.TypeChoices.DEPOSIT,
+                    amount=1,
+                )
+                for _ in range(cls.ROWS)
+            ]
+        )
+        cls.transaction = transactions[0]
+        TransactionTask.objects.bulk_create(
+            [
+                TransactionTask(transaction=row, task_id=f"task-{row.pk}")
+                for row in transactions
+            ]
+        )
+        OutboxMessage.objects.bulk_create(
+            [
+                OutboxMessage(transaction=row, next_attempt_at=timezone.now())
+                for row in transactions
+            ]
+        )
+        LedgerEntry.objects.bulk_create(
+            [
+                LedgerEntry(
+                    wallet=cls.wallet,
+                    transaction=row,
+                    account=LedgerEntry.AccountChoices.WALLET,
+                    amount=row.amount,
+                )
+                for row in transactions
+            ]
+        )
+        cls.operation = BulkOperation.objects.create(
+            type=Transaction.TypeChoices.DEPOSIT, total_items=cls.ROWS
+        )
+        BulkOperationItem.objects.bulk_create(
+            [
+                BulkOperationItem(
+                    operation=cls.operation,
+                    index=i,
+                    wallet_uuid=cls.wallet.uuid,
+                    amount=row.amount,
+                    transaction=row,
+                )
+                for i, row in enumerate(transactions)
+            ]
+        )
+
+    def assertQueries(self, count, url):
+        with self.assertNumQueries(count):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_retrieve_wallet(self):
+        self.assertQueries(
+            2, reverse("retrieve-wallet", args=[self.wallet.uuid])
+        )
+
+    def test_wallet_balance(self):
+        # A cache miss, so the balance is read once.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.wallet.invalidate_balance_cache()
+        self.assertQueries(
+            1, reverse("wallet-balance", args=[self.wallet.uuid])
+        )
+
+    def test_wallet_transactions(self):
+        self.assertQueries(
+            2, reverse("wallet-transactions", args=[self.wallet.uuid])
+        )
+
+    def test_retrieve_transaction(self):
+        self.assertQueries(
+            1, reverse("retrieve-transaction", args=[self.transaction.uuid])
+        )
+
+    def test_retrieve_bulk_operation(self):
+        self.assertQueries(
+            1, reverse("retrieve-bulk-operation", args=[self.operation.uuid])
+        )
+
+    def test_bulk_operation_items(self):
+        self.assertQueries(
+            2, reverse("bulk-operation-items", args=[self.operation.uuid])
+        )
+
+    def test_admin_changelists(self):
+        self.client.force_login(self.admin)
+        for model in (
+            "wallet",
+            "transactiontask",
+            "outboxmessage",
+            "bulkoperation",
+            "bulkoperationitem",
+        ):
+            with self.subTest(model=model):
+                self.assertQueries(
+                    5, reverse(f"admin:wallets_{model}_changelist")
+                )
+
+    def test_large_table_changelists(self):
+        # The transaction changelist's date hierarchy adds two queries.
+        self.client.force_login(self.admin)
+        for model, count, query in (
+            ("transaction", 6, ""),
+            ("transaction", 6, f"?q={self.wallet.uuid}"),
+            ("ledgerentry", 5, ""),
+            ("ledgerentry", 4, f"?q={self.wallet.uuid}"),
+        ):
+            with self.subTest(model=model, query=query):
+                self.assertQueries(
+                    count, reverse(f"admin:wallets_{model}_changelist") + query
+                )
@@ -4,11 +4,22 @@ from django.urls import include, path
 from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework.permissions import AllowAny
+from wallets.async_views import (
+    create_deposit,
+    retrieve_wallet,
+    schedule_withdrawal_view,
+)
+from wallets.routers import read_from_replica
 from wallets.views import (
-    CreateDepositView,
+    BulkDepositView,
+    BulkOperationItemListView,
+    BulkWithdrawView,
     CreateWalletView,
-    RetrieveWalletView,
-    ScheduleWithdrawView,
+    RetrieveBulkOperationView,
+    RetrieveTransactionView,
+    WalletBalanceView,
+    WalletTransactionExportView,
+    WalletTransactionListView,
     WithdrawalCancellationView,
 )
 
@@ -24,15 +35,34 @@ schema_view = get_schema_view(
 
 api_urlpatterns = [
     path("create/", CreateWalletView.as_view(), name="create-wallet"),
-    path("<uuid:uuid>/", RetrieveWalletView.as_view(), name="retrieve-wallet"),
+    path(
+        "<uuid:uuid>/",
+        read_from_replica(retrieve_wallet),
+        name="retrieve-wallet",
+    ),
+    path(
+        "<uuid:uuid>/balance/",
+        WalletBalanceView.as_view(),
+        name="wallet-balance",
+    ),
+    path(
+        "<uuid:uuid>/transactions/",
+        read_from_replica(WalletTransactionListView.as_view()),
+        name="wallet-transactions",
+    ),
+    path(
+        "<uuid:uuid>/transactions/export.<str:export_format>",
+        read_from_replica(WalletTransactionExportView.as_view()),
+        name="wallet-transactions-export",
+    ),
     path(
         "<uuid:wallet_uuid>/deposit",
-        CreateDepositView.as_view(),
+        create_deposit,
         name="deposit",
     ),
     path(
         "<uuid:wallet_uuid>/withdrawl",
-        ScheduleWithdrawView.as_view(),
+        schedule_withdrawal_view,
         name="withdraw",
     ),
     path(
@@ -40,6 +70,23 @@ api_urlpatterns = [
         WithdrawalCancellationView.as_view(),
         name="cancel-withdrawal",
     ),
+    path("bulk/deposit", BulkDepositView.as_view(), name="bulk-deposit"),
+    path("bulk/withdrawl", BulkWithdrawView.as_view(), name="bulk-withdraw"),
+    path(
+        "bulk/<uuid:uuid>/",
+        read_from_replica(RetrieveBulkOperationView.as_view()),
+        name="retrieve-bulk-operation",
+    ),
+    path(
+        "bulk/<uuid:uuid>/items/",
+        read_from_replica(BulkOperationItemListView.as_view()),
+        name="bulk-operation-items",
+    ),
+    path(
+        "transactions/<uuid:uuid>/",
+        read_from_replica(RetrieveTransactionView.as_view()),
+        name="retrieve-transaction",
+    ),
 ]
 
 swagger_urlpatterns = [
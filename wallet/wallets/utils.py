@@ -1,46 +1,206 @@
 import logging
 
-import requests
+import httpx
 from requests.exceptions import HTTPError, Timeout
 
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+from wallets.clients import (
+    ProviderUnavailableError,
+    get_async_third_party_client,
+    get_third_party_client,
 )
 
+logger = logging.getLogger(__name__)
+
+
+def _log_fields(wallet, amount, transaction_type, reference, **fields):
+    return {
+        "wallet_id": str(wallet.uuid),
+        "transaction_id": str(reference) if reference else None,
+        "transaction_type": transaction_type,
+        "amount": amount,
+        **fields,
+    }
+
 
 def request_third_party_transaction(
     wallet,
     amount,
     transaction_type,
-    api_url="http://third_party_service:8010",
-    timeout=10,
+    api_url=None,
+    timeout=None,
+    reference=None,
 ):
 
-    data = {
-        "wallet_uuid": str(wallet.uuid),
-        "amount": amount,
-        "type": transaction_type,
-    }
+    client = get_third_party_client()
+    api_url = api_url or client.url
+    timeout = timeout or client.timeout
     try:
-        response = requests.post(api_url, json=data, timeout=timeout)
-        response.raise_for_status()
-        logging.info(
-            "Successful "
-            + transaction_type
-            + " transaction for wallet "
-            + str(wallet.uuid)
-            + " of amount "
-            + str(amount)
+        response = client.request_transaction(
+            wallet.uuid,
+            amount,
+            transaction_type,
+            api_url,
+            timeout,
+            reference=reference,
+        )
+        logger.info(
+            "Successful %s transaction for wallet %s of amount %s",
+            transaction_type,
+            wallet.uuid,
+            amount,
+            extra=_log_fields(
+                wallet,
+                amount,
+                transaction_type,
+                reference,
+                event="provider_call_succeeded",
+                sampled=True,
+            ),
         )
         return response
+    except ProviderUnavailableError as e:
+        logger.warning(
+            "Provider call refused: %s",
+            e,
+            extra=_log_fields(
+                wallet,
+                amount,
+                transaction_type,
+                reference,
+                event="provider_call_refused",
+            ),
+        )
+        raise
     except Timeout as e:
-        logging.error(f"Timeout occurred: {e}")
+        logger.error(
+            "Timeout occurred: %s",
+            e,
+            extra=_log_fields(
+                wallet,
+                amount,
+                transaction_type,
+                reference,
+                event="provider_call_timed_out",
+            ),
+        )
         raise Timeout(
             f"Request to {api_url} timed out after {timeout} seconds."
         )
     except HTTPError as e:
-        logging.error(f"HTTP error occurred: {e}")
+        logger.error(
+            "HTTP error occurred: %s",
+            e,
+            extra=_log_fields(
+                wallet,
+                amount,
+                transaction_type,
+                reference,
+                event="provider_call_failed",
+            ),
+        )
         raise HTTPError(f"Failed due to HTTP error: {e}")
     except Exception as e:
-        logging.error(f"An error occurred: {e}")
+        logger.error(
+            "An error occurred: %s",
+            e,
+            extra=_log_fields(
+                wallet,
+                amount,
+                transaction_type,
+                reference,
+                event="provider_call_failed",
+            ),
+        )
+        raise Exception(f"An unexpected error occurred: {e}")
+
+
+async def arequest_third_party_transaction(
+    wallet,
+    amount,
+    transaction_type,
+    api_url=None,
+    timeout=None,
+    reference=None,
+):
+
+    client = get_async_third_party_client()
+    api_url = api_url or client.url
+    timeout = timeout or client.timeout
+    try:
+        response = await client.request_transaction(
+            wallet.uuid,
+            amount,
+            transaction_type,
+            api_url,
+            timeout,
+            reference=reference,
+        )
+        logger.info(
+            "Successful %s transaction for wallet %s of amount %s",
+            transaction_type,
+            wallet.uuid,
+            amount,
+            extra=_log_fields(
+                wallet,
+                amount,
+                transaction_type,
+                reference,
+                event="provider_call_succeeded",
+                sampled=True,
+            ),
+        )
+        return response
+    except ProviderUnavailableError as e:
+        logger.warning(
+            "Provider call refused: %s",
+            e,
+            extra=_log_fields(
+                wallet,
+                amount,
+                transaction_type,
+                reference,
+                event="provider_call_refused",
+            ),
+        )
+        raise
+    except httpx.TimeoutException as e:
+        logger.error(
+            "Timeout occurred: %s",
+            e,
+            extra=_log_fields(
+                wallet,
+                amount,
+                transaction_type,
+                reference,
+                event="provider_call_timed_out",
+            ),
+        )
+        raise Timeout(
+            f"Request to {api_url} timed out after {timeout} seconds."
+        )
+    except httpx.HTTPStatusError as e:
+        logger.error(
+            "HTTP error occurred: %s",
+            e,
+            extra=_log_fields(
+                wallet,
+                amount,
+                transaction_type,
+                reference,
+                event="provider_call_failed",
+            ),
+        )
+        raise HTTPError(f"Failed due to HTTP error: {e}")
+    except Exception as e:
+        logger.error(
+            "An error occurred: %s",
+            e,
+            extra=_log_fields(
+                wallet,
+                amount,
+                transaction_type,
+                reference,
+                event="provider_call_failed",
+            ),
+        )
         raise Exception(f"An unexpected error occurred: {e}")
@@ -1,22 +1,34 @@
 from typing import Any
 
-from celery import current_app
-from celery.exceptions import WorkerLostError
-from django.db import transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from rest_framework import serializers, status
-from rest_framework.generics import CreateAPIView, RetrieveAPIView
+from rest_framework import status
+from rest_framework.generics import (
+    CreateAPIView,
+    ListAPIView,
+    RetrieveAPIView,
+)
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from wallets.models import Transaction, TransactionTask, Wallet
+from wallets.exports import EXPORT_FORMATS, transaction_rows
+from wallets.idempotency import idempotent
+from wallets.models import BulkOperation, Transaction, Wallet
+from wallets.pagination import (
+    BulkOperationItemPagination,
+    TransactionKeysetPagination,
+)
 from wallets.serializers import (
-    DepositTransactionSerializer,
+    BulkOperationItemSerializer,
+    BulkOperationRequestSerializer,
+    BulkOperationSerializer,
+    TransactionFilterSerializer,
+    TransactionSerializer,
     WalletSerializer,
-    WithdrawalSerializer,
 )
-from wallets.services import schedule_withdrawal
+from wallets.services import cancel_withdrawal, create_bulk_operation
 
 
 class CreateWalletView(CreateAPIView):
@@ -30,108 +42,137 @@ class CreateWalletView(CreateAPIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class RetrieveWalletView(RetrieveAPIView):
-    serializer_class = WalletSerializer
-    queryset = Wallet.objects.all()
+class WalletBalanceView(APIView):
+    def get(self, request, *args, **kwargs):
+        wallet_uuid = kwargs.get("uuid")
+        balance = Wallet.get_cached_balance(wallet_uuid)
+        if balance is None:
+            raise Http404("Wallet not found")
+        return Response({"uuid": wallet_uuid, "balance": balance})
+
+
+class WalletTransactionListView(ListAPIView):
+    serializer_class = TransactionSerializer
+    pagination_class = TransactionKeysetPagination
+
+    def get_queryset(self):
+        filters = TransactionFilterSerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+        wallet = get_object_or_404(Wallet, uuid=self.kwargs.get("uuid"))
+
+        queryset = Transaction.objects.filter(wallet_id=wallet.id)
+        if "type" in filters.validated_data:
+            queryset = queryset.filter(type=filters.validated_data["type"])
+        if "status" in filters.validated_data:
+            queryset = queryset.filter(status=filters.validated_data["status"])
+        if "created_after" in filters.validated_data:
+            queryset = queryset.filter(
+                created_at__gte=filters.validated_data["created_after"]
+            )
+        if "created_before" in filters.validated_data:
+            queryset = queryset.filter(
+                created_at__lt=filters.validated_data["created_before"]
+            )
+        return queryset
+
+
+class WalletTransactionExportView(APIView):
+    # WSGI only: Django 3.2's ASGI handler iterates a streaming response on
+    # the event loop, where the rows can't be read from the database.
+    def get(self, request, *args, **kwargs):
+        if isinstance(request._request, ASGIRequest):
+            return Response(
+                {"detail": "Exports are served by the WSGI service."},
+                status=status.HTTP_421_MISDIRECTED_REQUEST,
+            )
+        export_format = kwargs.get("export_format")
+        if export_format not in EXPORT_FORMATS:
+            raise Http404("Unsupported export format")
+        wallet = get_object_or_404(Wallet, uuid=kwargs.get("uuid"))
+
+        render, content_type = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(
+            render(transaction_rows(wallet)), content_type=content_type
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="wallet-{wallet.uuid}.{export_format}"'
+        )
+        return response
+
+
+class RetrieveTransactionView(RetrieveAPIView):
+    serializer_class = TransactionSerializer
+    queryset = Transaction.objects.all()
     lookup_field = "uuid"
 
 
-class CreateDepositView(CreateAPIView):
-    serializer_class = DepositTransactionSerializer
+class WithdrawalCancellationView(APIView):
+    def post(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        transaction_uuid = request.data.get("transaction_uuid")
 
-    def get_serializer_context(self):
-        context = super().get_serializer_context()
-        context["wallet_uuid"] = self.kwargs.get("wallet_uuid")
-        return context
+        if not transaction_uuid:
+            return Response(
+                {"error": "Transaction ID is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-    def create(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data)
         try:
-            serializer.is_valid(raise_exception=True)
-            result = serializer.save()
-            return Response(result, status=status.HTTP_201_CREATED)
-        except serializers.ValidationError as e:
+            cancel_withdrawal(transaction_uuid)
+        except Transaction.DoesNotExist:
             return Response(
-                {"errors": e.detail}, status=status.HTTP_400_BAD_REQUEST
+                {"error": "Transaction not found"},
+                status=status.HTTP_404_NOT_FOUND,
             )
-        except Exception as e:
+        except ValueError as e:
             return Response(
-                {"errors": str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                {"error": str(e)}, status=status.HTTP_400_BAD_REQUEST
             )
 
+        return Response({"message": "Withdrawal successfully cancelled"})
+
+
+class CreateBulkOperationView(APIView):
+    operation_type = None
 
-class ScheduleWithdrawView(APIView):
+    @idempotent
     def post(self, request, *args, **kwargs):
-        serializer = WithdrawalSerializer(data=request.data)
-        if serializer.is_valid():
-            wallet_uuid = kwargs.get("wallet_uuid")
-            wallet = get_object_or_404(Wallet, uuid=wallet_uuid)
-            try:
-                schedule_withdrawal(wallet, **serializer.validated_data)
-                return Response(
-                    {"message": "Withdrawal scheduled successfully"}
-                )
-            except serializers.ValidationError as e:
-                return Response(
-                    {"error": e.detail}, status=status.HTTP_400_BAD_REQUEST
-                )
-            except ValueError as e:
-                return Response(
-                    {"error": str(e)}, status=status.HTTP_400_BAD_REQUEST
-                )
-        else:
+        serializer = BulkOperationRequestSerializer(data=request.data)
+        if not serializer.is_valid():
             return Response(
                 serializer.errors, status=status.HTTP_400_BAD_REQUEST
             )
 
+        operation = create_bulk_operation(
+            self.operation_type, serializer.validated_data["items"]
+        )
+        return Response(
+            BulkOperationSerializer(operation).data,
+            status=status.HTTP_202_ACCEPTED,
+        )
 
-class WithdrawalCancellationView(APIView):
-    def post(self, request: Request, *args: Any, **kwargs: Any) -> Response:
-        transaction_uuid = request.data.get("transaction_uuid")
 
-        if not transaction_uuid:
-            return Response(
-                {"error": "Transaction ID is required."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+class BulkDepositView(CreateBulkOperationView):
+    operation_type = Transaction.TypeChoices.DEPOSIT
 
-        with transaction.atomic():
-            transaction_to_cancel = (
-                Transaction.objects.select_for_update()
-                .filter(uuid=transaction_uuid)
-                .first()
-            )
 
-            if not transaction_to_cancel:
-                return Response(
-                    {"error": "Transaction not found"},
-                    status=status.HTTP_404_NOT_FOUND,
-                )
-
-            if (
-                transaction_to_cancel.status
-                != Transaction.StatusChoices.PENDING
-            ):
-                return Response(
-                    {"error": "Only pending transactions can be cancelled"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            if transaction_to_cancel.task:
-                try:
-                    current_app.control.revoke(
-                        transaction_to_cancel.task.task_id, terminate=True
-                    )
-                except WorkerLostError:
-                    pass
-
-                transaction_to_cancel.task.status = (
-                    TransactionTask.StatusChoices.FAILED
-                )
-                transaction_to_cancel.task.save()
-
-            transaction_to_cancel.status = Transaction.StatusChoices.CANCELED
-            transaction_to_cancel.save()
+class BulkWithdrawView(CreateBulkOperationView):
+    operation_type = Transaction.TypeChoices.WITHDRAWAL
 
-        return Response({"message": "Withdrawal successfully cancelled"})
+
+class RetrieveBulkOperationView(RetrieveAPIView):
+    serializer_class = BulkOperationSerializer
+    queryset = BulkOperation.objects.all()
+    lookup_field = "uuid"
+
+
+class BulkOperationItemListView(ListAPIView):
+    serializer_class = BulkOperationItemSerializer
+    pagination_class = BulkOperationItemPagination
+
+    def get_queryset(self):
+        operation = get_object_or_404(BulkOperation, uuid=self.kwargs["uuid"])
+        queryset = operation.items.select_related("transaction")
+        item_status = self.request.query_params.get("status")
+        if item_status:
+            queryset = queryset.filter(status=item_status)
+        return queryset